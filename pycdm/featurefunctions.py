@@ -0,0 +1,150 @@
+"""
+Compact columnar binary encoding of feature collections.  Everything is little-endian and every buffer
+starts on an 8 byte boundary (padded with zero bytes) so it can be mapped straight onto typed arrays by
+clients.  The layout is:
+
+header (32 bytes)
+	char[8]    magic 'PCDMFEAT'
+	uint32     format version (1)
+	uint32     geometry type, 1 for Point and 3 for Polygon (as in WKB)
+	uint32     nfeatures
+	uint32     nvertices, the total number of coordinate pairs
+	uint32     nrings, 0 for points and one ring per polygon feature for grids
+	uint32     ncolumns, the number of property columns
+
+float32[nvertices*2]    coordinates as interleaved longitude, latitude pairs
+uint32[nrings+1]        ring offsets, ring i holds vertices ring_offsets[i] up to ring_offsets[i+1]
+uint32[nfeatures]       feature ids
+
+followed by ncolumns columns, each with a column header (12 bytes)
+	uint32     column type, 1 for float32 values and 2 for utf-8 strings
+	uint32     ncomponents, values per feature (for example one per time step)
+	uint32     name length in bytes
+char[name length]       utf-8 column name
+
+and then for float32 columns
+float32[nfeatures*ncomponents]    values, feature major, missing values are NaN
+
+or for string columns
+uint32[nfeatures+1]     offsets of each string into the bytes buffer
+char[offsets[-1]]       utf-8 string bytes
+"""
+import struct
+
+import numpy
+
+MAGIC = 'PCDMFEAT'
+VERSION = 1
+
+POINT = 1
+POLYGON = 3
+
+FLOAT32 = 1
+STRING = 2
+
+
+def _padding(size):
+	return '\0' * (-size % 8)
+
+
+def _buffer(array, dtype):
+	"""
+	Little-endian bytes of an array followed by padding to the next 8 byte boundary
+	"""
+
+	data = numpy.ascontiguousarray(array, dtype=numpy.dtype(dtype).newbyteorder('<')).tobytes()
+	return data + _padding(len(data))
+
+
+def _string(value):
+	"""
+	utf-8 bytes of a string column value, missing values are empty strings
+	"""
+
+	if value is None:
+		return ''
+	elif isinstance(value, unicode):
+		return value.encode('utf-8')
+	elif isinstance(value, str):
+		return value
+	else:
+		return unicode(value).encode('utf-8')
+
+
+def encode_features(geometry, coordinates, ring_offsets, ids, columns):
+	"""
+	Generator over the successive byte strings of a binary feature collection.  coordinates is an (nvertices, 2) array of
+	longitude, latitude pairs, ring_offsets an array of nrings+1 vertex offsets (empty for points), ids an array of nfeatures
+	feature ids and columns a list of (name, values) tuples where values is either an (nfeatures, ncomponents) numeric (possibly
+	masked) array or a 1D array of strings (including object arrays of strings).
+	"""
+
+	coordinates = numpy.asarray(coordinates).reshape((-1, 2))
+	ring_offsets = numpy.asarray(ring_offsets)
+	ids = numpy.asarray(ids)
+
+	yield struct.pack('<8sIIIIII', MAGIC, VERSION, geometry, len(ids), len(coordinates), max(0, len(ring_offsets) - 1), len(columns))
+	yield _buffer(coordinates, numpy.float32)
+	yield _buffer(ring_offsets, numpy.uint32)
+	yield _buffer(ids, numpy.uint32)
+
+	for name, values in columns:
+
+		name = name.encode('utf-8') if isinstance(name, unicode) else name
+		values = numpy.ma.asarray(values)
+
+		# Object arrays (such as netCDF4 variable length strings) are string columns too
+		if values.dtype.kind in 'SUO':
+			missing = numpy.ma.getmaskarray(values).ravel().tolist()
+			strings = [_string(None if masked else value) for value, masked in zip(numpy.ma.getdata(values).ravel().tolist(), missing)]
+			offsets = numpy.concatenate(([0], numpy.cumsum([len(string) for string in strings])))
+			yield struct.pack('<III', STRING, 1, len(name)) + name + _padding(12 + len(name))
+			yield _buffer(offsets, numpy.uint32)
+			data = ''.join(strings)
+			yield data + _padding(len(data))
+
+		else:
+			values = values.reshape((len(ids), -1))
+			yield struct.pack('<III', FLOAT32, values.shape[1], len(name)) + name + _padding(12 + len(name))
+			yield _buffer(numpy.ma.filled(values.astype(numpy.float32), numpy.nan), numpy.float32)
+
+
+def decode_features(data):
+	"""
+	Decode a binary feature collection string into a dict of numpy arrays with 'geometry', 'coordinates', 'ring_offsets', 'ids'
+	and 'columns' (a list of (name, values) tuples) keys
+	"""
+
+	magic, version, geometry, nfeatures, nvertices, nrings, ncolumns = struct.unpack_from('<8sIIIIII', data, 0)
+
+	if magic != MAGIC:
+		raise ValueError('not a binary feature collection')
+
+	position = [32]
+
+	def take(dtype, count):
+		array = numpy.frombuffer(data, dtype=numpy.dtype(dtype).newbyteorder('<'), count=count, offset=position[0])
+		position[0] += array.nbytes + (-array.nbytes % 8)
+		return array
+
+	result = {'geometry': geometry}
+	result['coordinates'] = take(numpy.float32, nvertices*2).reshape((nvertices, 2))
+	result['ring_offsets'] = take(numpy.uint32, nrings + 1 if nrings else 0)
+	result['ids'] = take(numpy.uint32, nfeatures)
+
+	columns = []
+	for column in range(ncolumns):
+		kind, ncomponents, length = struct.unpack_from('<III', data, position[0])
+		name = data[position[0]+12:position[0]+12+length].decode('utf-8')
+		position[0] += 12 + length + (-(12 + length) % 8)
+
+		if kind == STRING:
+			offsets = take(numpy.uint32, nfeatures + 1)
+			strings = data[position[0]:position[0]+int(offsets[-1])]
+			position[0] += int(offsets[-1]) + (-int(offsets[-1]) % 8)
+			columns.append((name, [strings[offsets[i]:offsets[i+1]].decode('utf-8') for i in range(nfeatures)]))
+		else:
+			columns.append((name, take(numpy.float32, nfeatures*ncomponents).reshape((nfeatures, ncomponents))))
+
+	result['columns'] = columns
+	return result
@@ -0,0 +1,134 @@
+"""
+Implements the LRUCache class
+"""
+import sys
+from collections import OrderedDict
+
+import numpy
+
+
+def selection_key(selection):
+	"""
+	Convert an array selection (slices, integers, index lists/arrays or tuples of these) into a hashable key
+	"""
+
+	if selection is None:
+		return None
+	elif isinstance(selection, slice):
+		return ('slice', selection.start, selection.stop, selection.step)
+	elif isinstance(selection, (tuple, list)):
+		return tuple([selection_key(item) for item in selection])
+	elif isinstance(selection, numpy.ndarray):
+		return ('array',) + tuple(selection.ravel().tolist())
+	else:
+		return selection
+
+
+class LRUCache(object):
+	"""
+	A least recently used cache.  Entries are evicted, least recently used first, once the total size of the
+	cached values exceeds max_bytes or the number of entries exceeds max_items.  Either limit can be None for
+	no limit.  The size of numpy array values is their nbytes (including the mask for masked arrays) and of 
+	strings their length.  Other objects with an nbytes attribute (such as interpolation weights) count that, 
+	containers (tuples, lists and dicts, such as feature collections) count their own size plus the sizes of their
+	items and any other values their sys.getsizeof size, unless a size is given when they are added.
+
+	>>> cache = LRUCache(max_bytes=1000)
+	>>> cache['a'] = numpy.zeros(100)
+	>>> cache['b'] = numpy.zeros(100)
+	>>> 'a' in cache, 'b' in cache
+	(False, True)
+	"""
+
+	def __init__(self, max_bytes=None, max_items=None):
+
+		self.max_bytes = max_bytes
+		self.max_items = max_items
+
+		self._entries = OrderedDict()
+		self._sizes = {}
+		self.nbytes = 0
+
+	def __contains__(self, key):
+		return key in self._entries
+
+	def __len__(self):
+		return len(self._entries)
+
+	def __getitem__(self, key):
+
+		# Move the entry to the most recently used end
+		value = self._entries.pop(key)
+		self._entries[key] = value
+		return value
+
+	def __setitem__(self, key, value):
+		self.set(key, value)
+
+	def get(self, key, default=None):
+
+		if key in self._entries:
+			return self[key]
+		else:
+			return default
+
+	def set(self, key, value, nbytes=None):
+		"""
+		Add a value to the cache.  Values larger than the whole byte budget are not cached.
+		"""
+
+		if nbytes is None:
+			nbytes = self.sizeof(value)
+
+		self.remove(key)
+
+		if self.max_bytes is not None and nbytes > self.max_bytes:
+			return
+
+		self._entries[key] = value
+		self._sizes[key] = nbytes
+		self.nbytes += nbytes
+
+		self._evict()
+
+	def remove(self, key):
+
+		if key in self._entries:
+			del self._entries[key]
+			self.nbytes -= self._sizes.pop(key)
+
+	def clear(self):
+
+		self._entries.clear()
+		self._sizes.clear()
+		self.nbytes = 0
+
+	def _evict(self):
+
+		while self._entries and (self._over(self.nbytes, self.max_bytes) or self._over(len(self._entries), self.max_items)):
+			self.remove(next(iter(self._entries)))
+
+	@staticmethod
+	def _over(value, limit):
+		return limit is not None and value > limit
+
+	@staticmethod
+	def sizeof(value):
+
+		if isinstance(value, numpy.ma.MaskedArray):
+			return value.data.nbytes + numpy.ma.getmask(value).nbytes
+		elif isinstance(value, numpy.ndarray):
+			return value.nbytes
+		elif isinstance(value, basestring):
+			return len(value)
+		elif hasattr(value, 'nbytes'):
+			return value.nbytes
+		elif isinstance(value, (tuple, list)):
+			return sys.getsizeof(value) + sum([LRUCache.sizeof(item) for item in value])
+		elif isinstance(value, dict):
+			return sys.getsizeof(value) + sum([LRUCache.sizeof(key) + LRUCache.sizeof(item) for key, item in value.iteritems()])
+		else:
+			return sys.getsizeof(value)
+
+	def __repr__(self):
+		return "<CDM %s: %d entries, %d bytes>" % (self.__class__.__name__, len(self._entries), self.nbytes)
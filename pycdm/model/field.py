@@ -1,44 +1,31 @@
 """
 Implements the Field class
 """
+import sys
+import copy
+import pickle
+import threading
+import multiprocessing
+import multiprocessing.pool
 import numpy
-import calendar
-import datetime
 import json
+import hashlib
+import weakref
 import shapely
 
-import netCDF4
-
 from dimension import Dimension
 from error import CDMError
+from cache import selection_key, LRUCache
+
+from ..timefunctions import time_slices, time_aggregation, CalendarIndex
+from ..spatialfunctions import SpatialIndex, nearest_brute_force, nearest_sorted, monotonic
+from ..spatialfunctions import bilinear_rectilinear, bilinear_curvilinear, inverse_distance, cell_corners, bounds_corners
+from ..slicefunctions import compose_slice, compose_index, compose_key, expand_key, slice_length
+from ..reducefunctions import STATISTICS, grouped_reduce, statistic_name, window_bounds, window_blocks, window_pieces
+from ..reducefunctions import grouped_partials, labelled_partials, empty_partials, merge_partials, finalise
+from .. import featurefunctions
+from ..standards import cf
 
-from ..timefunctions import time_slices, time_aggregation
-
-# This and the cf_units2coordinates function needs to be replaced with 
-# a more general cf standards mapping function
-cf_dimensions = {'degree_east': 'longitude',
-'degree east': 'longitude',
-'degrees_east': 'longitude',
-'degree_north': 'latitude',
-'degrees_north': 'latitude',
-'degree north': 'latitude',
-'millibars':'level',
-'Pa':'level'}
-
-def cf_units2coordinates(units):
-	
-	# For spatial coordinates
-	if units in cf_dimensions:
-		return cf_dimensions[units]
-	
-	# Time coordinates
-	try:
-		netCDF4.num2date(0,units)
-	except:
-		return None
-	
-	return 'time'
-	
 
 class Field(object):
 	"""
@@ -67,9 +54,11 @@ class Field(object):
 		# and their dimension mappings
 		self.coordinates_mapping = {}
 		
-		# Cache features and times
-		self._features = None
-		self._realtimes = None
+		# Cache latitudes/longitudes, calendar indices and features are cached by the group
+		self._latlons = None
+		
+		# Cache the monotonic direction of 1D coordinate variables
+		self._monotonic = {}
 
 		# Build the coordinated mapping dict
 		self.build_coordinates_map()
@@ -77,6 +66,9 @@ class Field(object):
 		# Initialise the current subset to the default subset
 		self._subset = self.default_subset()
 		#self._subset = False
+		
+		# Views keep a reference to the field they were derived from
+		self.parent = None
 
 
 	def default_subset(self):
@@ -125,9 +117,8 @@ class Field(object):
 				self.coordinates_variables.append(coord_variable)
 				mapped.append(dim_name)
 				
-				# See if we can use the units to find out what spatial/temporal variable this is from 
-				# the CF conventions
-				coordinate_name = cf_units2coordinates(coord_variable.get_attribute('units'))
+				# See if we can use the CF conventions to find out what spatial/temporal variable this is
+				coordinate_name = self.variable.group.coordinate_type(coord_variable)
 				
 				# If we can't we just default to the dimension name
 				if not coordinate_name:
@@ -149,12 +140,17 @@ class Field(object):
 					self.coordinates_variables.append(coord_variable)
 
 					#print 'got coordinate variable ', coord_variable, coord_variable.dimensions
-					# See if we can find out what spatial/temporal variable this is
-					try:
-						coordinate_name = cf_dimensions[self.variable.group.variables[name].get_attribute('units')]
-					except:
+					# See if we can find out what spatial variable this is
+					coordinate_name = self.variable.group.coordinate_type(coord_variable)
+					if coordinate_name in [None, 'time']:
 						coordinate_name = name
 
+					# Auxiliary levels are only recognised by pressure units and never replace a level dimension, so
+					# scalar heights (such as the 2 m height of near surface fields) keep their own name
+					elif coordinate_name == 'level':
+						if 'level' in self.coordinates_mapping or cf.classify({'units': coord_variable.get_attribute('units')}) != 'level':
+							coordinate_name = name
+
 					# Create the coordinates_mapping entry but with an empty dimensions map for now
 					self.coordinates_mapping[coordinate_name] = {'variable':name, 'map':[], 'coordinates': self.coordinates_names}
 						
@@ -198,8 +194,7 @@ class Field(object):
 		"""
 		Returns the shape of the current subset
 		"""
-		return self.variable.shape
-		#return tuple([s.stop-s.start-1 for s in self._subset])
+		return tuple([slice_length(s, length) for s, length in zip(self._subset, self.variable.shape)])
 
 
 	@property
@@ -248,7 +243,19 @@ class Field(object):
 	def latlons(self):
 		"""
 		Returns a 2D numpy array of latitudes.  If the latitude coordinate variable is 1D then 
-		it is extended to 2D.
+		it is extended to 2D.  The extension is a read only broadcast view of the 1D coordinates so
+		no grid sized arrays are allocated.  The result is cached for the current subset.
+		"""
+		
+		key = selection_key(self._subset)
+		if self._latlons is None or self._latlons[0] != key:
+			self._latlons = (key, self._read_latlons())
+		
+		return self._latlons[1]
+	
+	def _read_latlons(self):
+		"""
+		Reads the latitudes and longitudes of the current subset, see latlons
 		"""
 		
 		# First check we have a grid feature type
@@ -271,25 +278,26 @@ class Field(object):
 
 			# Then check if latitude and longitude variables are 1D
 			if len(latvar.shape) == 1 and len(lonvar.shape) == 1:
-				latvar_2d = latvar[lat_subset].reshape((-1,1)).repeat(lonvar.shape[0], axis=1)
-				lonvar_2d = lonvar[lon_subset].reshape((-1,1)).transpose().repeat(latvar.shape[0], axis=0)
-				return (latvar_2d, lonvar_2d)
+				latitudes = self.read_coordinates(latvar, tuple(lat_subset))
+				longitudes = self.read_coordinates(lonvar, tuple(lon_subset))
+				shape = (latitudes.shape[0], longitudes.shape[0])
+				return (_broadcast(latitudes.reshape((-1,1)), shape), _broadcast(longitudes.reshape((1,-1)), shape))
 			
 			# for 2D variables its easy, just return the variable data
 			elif len(latvar.shape) >= 2 and len(lonvar.shape) >= 2:
 				
 				# Handle the WRF case where lat/lon variables are 3D with time as first dimension
 				if len(latvar.shape) == 3 and len(lonvar.shape) == 3:
-					return (latvar[0,lat_subset], lonvar[0,lon_subset])
+					return (self.read_coordinates(latvar, (0,) + tuple(lat_subset[-2:])), self.read_coordinates(lonvar, (0,) + tuple(lon_subset[-2:])))
 				else:
-					return (latvar[lat_subset], lonvar[lon_subset])
+					return (self.read_coordinates(latvar, tuple(lat_subset)), self.read_coordinates(lonvar, tuple(lon_subset)))
 			
 			# otherwise, we can't do it!
 			else:
 				return (None, None)
 		
 		elif self.featuretype == 'PointSeries':
-			return (self.latitude_variable[:], self.longitude_variable[:])
+			return (self.read_coordinates(self.latitude_variable), self.read_coordinates(self.longitude_variable))
 	
 	@property
 	def latitudes(self):
@@ -299,6 +307,86 @@ class Field(object):
 	def longitudes(self):
 		return self.latlons()[1]
 		
+	def read_coordinates(self, variable, selection=None):
+		"""
+		Read coordinate variable values through the group coordinate cache, keyed by variable and selection, so that fields
+		sharing coordinate variables only read them from the backing store once.  The returned arrays are shared and read only.
+		"""
+		
+		cache = self.group.coordinate_cache
+		key = (variable, selection_key(selection))
+		
+		if key in cache:
+			return cache[key]
+		
+		# Subsets can be taken from the cached full variable if we have it
+		full = cache.get((variable, None))
+		
+		if selection is None:
+			values = variable[:]
+		elif full is not None:
+			values = full[selection]
+		else:
+			values = variable[selection]
+		
+		if isinstance(values, numpy.ndarray):
+			values.flags.writeable = False
+		
+		cache[key] = values
+		return values
+	
+	def cell_bounds(self):
+		"""
+		Returns a tuple of (corner_latitudes, corner_longitudes) arrays of shape (ny+1, nx+1) holding the grid cell corners for
+		the current subset.  CF bounds variables referenced by the latitude and longitude coordinate variables are used when 
+		present, otherwise corners are interpolated from diagonal grid point locations and extrapolated on the edges.  Results
+		are cached on the group for each grid and subset and are read only.
+		"""
+		
+		if self.featuretype not in ['Grid', 'GridSeries']:
+			return (None, None)
+		
+		lat_subset = tuple([self._subset[dim] for dim in self.coordinates_mapping['latitude']['map']])
+		lon_subset = tuple([self._subset[dim] for dim in self.coordinates_mapping['longitude']['map']])
+		
+		cache = self.group.coordinate_cache
+		key = ('cell_bounds', self.latitude_variable, self.longitude_variable, selection_key(lat_subset + lon_subset))
+		
+		if key in cache:
+			return cache[key]
+		
+		lat_bounds = self._bounds_variable(self.latitude_variable)
+		lon_bounds = self._bounds_variable(self.longitude_variable)
+		
+		if lat_bounds and lon_bounds and len(self.latitude_variable.shape) <= 2:
+			corner_lats = bounds_corners(self.read_coordinates(lat_bounds, lat_subset + (slice(None),)))
+			corner_lons = bounds_corners(self.read_coordinates(lon_bounds, lon_subset + (slice(None),)))
+			
+			# 1D bounds give cell edges along each axis
+			if corner_lats.ndim == 1:
+				corner_lats, corner_lons = numpy.meshgrid(corner_lats, corner_lons, indexing='ij')
+		
+		else:
+			corner_lats, corner_lons = cell_corners(*self.latlons())
+		
+		corner_lats.flags.writeable = False
+		corner_lons.flags.writeable = False
+		
+		cache[key] = (corner_lats, corner_lons)
+		return cache[key]
+	
+	def _bounds_variable(self, variable):
+		"""
+		Returns the CF bounds variable of a coordinate variable or None if it doesn't have one
+		"""
+		
+		name = variable.get_attribute('bounds')
+		
+		if name and name in self.variable.group.variables:
+			return self.variable.group.variables[name]
+		else:
+			return None
+	
 	def coordinates(self, indices):
 		"""
 		Map dimension indices to coordinate variable values
@@ -327,14 +415,14 @@ class Field(object):
 			
 			# Only get coordinates where we had valid indices
 			if not failed:
-				coordinates[coordinate] = (coordinate_variable[slice_list].flatten()[0], coordinate_variable.get_attribute('units'))
+				coordinates[coordinate] = (self.read_coordinates(coordinate_variable)[tuple(slice_list)].flatten()[0], coordinate_variable.get_attribute('units'))
 
 		# Try and convert time coordinates to real datetimes
 		for name, coordinate in coordinates.items():
 
 			if name == 'time':
 				try:
-					date = netCDF4.num2date(*coordinate)
+					date = self.calendar_index(full=True).dates[indices[self.time_dim]]
 				except:
 					pass
 				else:
@@ -342,6 +430,53 @@ class Field(object):
 		
 		return coordinates
 		
+	def coordinates_batch(self, indices):
+		"""
+		Batch version of coordinates.  Maps an (n, ndims) array of dimension indices (such as the result of reversemap_batch)
+		to a dict of (values, units) tuples holding a length n masked array of values for each coordinate, gathered in one go
+		from the cached coordinate variable values.  Rows with masked or negative indices for any of the dimensions a
+		coordinate maps onto are masked for that coordinate.  Time values are converted to an object array of datetimes
+		as in coordinates.
+		"""
+
+		indices = numpy.ma.asarray(indices)
+		if indices.ndim == 1:
+			indices = indices.reshape((1, -1))
+
+		invalid = numpy.ma.getmaskarray(indices) | (numpy.ma.filled(indices, -1) < 0)
+		indices = numpy.ma.filled(indices, 0)
+
+		coordinates = {}
+		for coordinate in self.coordinates_mapping.keys():
+			coordinate_variable = self.variable.group.variables[self.coordinates_mapping[coordinate]['variable']]
+			coordinate_mapping = self.coordinates_mapping[coordinate]['map']
+
+			failed = numpy.zeros(len(indices), dtype=bool)
+			for dim in coordinate_mapping:
+				failed |= invalid[:,dim]
+
+			# Scalar coordinates (with an empty map) have the same value for every row
+			gather = tuple([numpy.where(failed, 0, indices[:,dim]) for dim in coordinate_mapping])
+			values = numpy.ma.resize(numpy.ma.asarray(self.read_coordinates(coordinate_variable)[gather]), (len(indices),))
+			values[failed] = numpy.ma.masked
+
+			coordinates[coordinate] = (values, coordinate_variable.get_attribute('units'))
+
+		# Try and convert time coordinates to real datetimes
+		if 'time' in coordinates:
+			values, units = coordinates['time']
+
+			try:
+				dates = self.calendar_index(full=True).dates[indices[:,self.time_dim][~numpy.ma.getmaskarray(values)]]
+			except:
+				pass
+			else:
+				result = numpy.ma.masked_all(len(values), dtype=object)
+				result[~numpy.ma.getmaskarray(values)] = dates
+				coordinates['time'] = (result, '')
+
+		return coordinates
+
 	def reversemap(self, method='nearest', min_distance=1e50, **kwargs):
 		"""
 		Reverse mapping involves determining the data array indices associated with the coordinates provided.  Clearly there is 
@@ -351,7 +486,9 @@ class Field(object):
 		likely these are only for string based coordinates.
 		
 		Nearest match is done by building up an n-dimensional distance(squared) array and then searching for indices of the minimum.  This
-		generalises nicely from 1 to n dimensions.
+		generalises nicely from 1 to n dimensions.  Latitude/longitude searches on grids with multi-dimensional coordinate variables (WRF,
+		CORDEX and other curvilinear grids) instead query a KD-tree spatial index which is built once and cached on the group (see 
+		spatial_index).  Monotonic 1D coordinate variables (regular grid latitudes/longitudes, levels, times) are searched by bisection.
 		
 		The index returned is either an integer in the range of the dimension length, numpy.nan if there was no coordinate constraint(s)
 		available for the dimension.  What currently isn't checked is is whether the target coordinate value is within the bounds of the
@@ -359,7 +496,13 @@ class Field(object):
 		to be passed and so avoid figuring out what this should be.  But min_distance could depend on which coordinate variable you are
 		searching.  We could allow coordinate target values to be tuples consisting of a target value and a minimum distance?
 		
-		However we end up doing this, a return value of -1 is expected for out of bounds responses.
+		However we end up doing this, a return value of -1 is expected for out of bounds responses.  At the moment min_distance is a single
+		distance in coordinate units, any target further than min_distance from its nearest coordinate value gets -1.  Setting
+		min_distance=0 requires an exact match.
+		
+		The method='greatcircle' option resolves latitude and longitude together on great circle distance rather than squared degree
+		differences, which picks the right cell near the poles and across the dateline.  It needs both latitude and longitude targets
+		and min_distance is then in kilometres (other coordinates are still matched to their nearest value).
 		
 		For string based coordinate variables, a -1 should be returned if no string match was found.
 				
@@ -401,155 +544,411 @@ class Field(object):
 		
 		"""
 		
+		# Resolve as a single point batch and convert to slices
+		indices = self.reversemap_batch(method=method, min_distance=min_distance, **kwargs)[0]
+		
+		slice_list = []
+		for index in indices:
+			if index is numpy.ma.masked:
+				slice_list.append(slice(None))
+			elif index < 0:
+				slice_list.append(slice(-1,-1))
+			else:
+				slice_list.append(slice(int(index),int(index)+1))
+		
+		return tuple(slice_list)
+	
+	def reversemap_batch(self, method='nearest', min_distance=1e50, **kwargs):
+		"""
+		Vectorised version of reversemap for many target points in a single pass.  Each coordinate argument is an array (or list)
+		of target values, one per point, scalar arguments are broadcast against the others.  Coordinate variables are read once
+		per call and latitude/longitude searches go through the cached spatial index.
+		
+		Returns an integer masked array of shape (npoints, ndims) holding the index of each point along each of the variables 
+		dimensions.  Dimensions without a coordinate constraint are masked, -1 is returned where no match was found within
+		min_distance.
+		
+		>>> indices = field.reversemap_batch(latitude=station_lats, longitude=station_lons)
+		>>> indices.shape
+		(3000, 3)
+		"""
+		
 		restricted = ['min_distance', 'method']
-		indices = []
 		
-		# remove restricted arguments
-		kwargs_filtered = {key: value for key, value in kwargs.items() if value not in restricted}
+		# remove restricted arguments and convert targets to broadcast 1D arrays of coordinate values
+		kwargs_filtered = {key: value for key, value in kwargs.items() if key not in restricted}
+		keys = kwargs_filtered.keys()
+		arrays = numpy.broadcast_arrays(*[self._coerce_targets(kwargs_filtered[key]) for key in keys])
+		targets = dict(zip(keys, [array.ravel() for array in arrays]))
+		
+		if targets:
+			npoints = len(targets[keys[0]])
+		else:
+			npoints = 1
+		
+		indices = numpy.ma.masked_all((npoints, len(self.variable.dimensions)), dtype=numpy.int64)
+		
+		# Great circle searches resolve latitude and longitude together through a unit vector spatial index
+		if method == 'greatcircle':
+			
+			if 'latitude' not in targets or 'longitude' not in targets:
+				raise CDMError("greatcircle method needs both latitude and longitude targets")
+			
+			closest, distances = self.spatial_index(greatcircle=True).query(targets.pop('latitude'), targets.pop('longitude'), max_distance=min_distance)
+			for dim_index, index in zip(self._spatial_dims(), closest):
+				indices[:,dim_index] = numpy.where(distances <= min_distance, index, -1)
+			
+			# min_distance is in kilometres so it doesn't apply to the other coordinates
+			min_distance = 1e50
+		
+		elif method != 'nearest':
+			raise CDMError("Unknown reversemap method {}".format(method))
+		
+		# Coordinate searches can span several dimensions so we keep the result for each set of map keys
+		searched = {}
 		
 		# We need to find each dimension index in order
 		for dim_index in range(len(self.variable.dimensions)):
 			
-			#print "indices: ", indices
-			#print "dim_index: ", dim_index
-			
 			# Find all coordinate mapping keys that relate to this index
 			map_keys = []
-			fail = False
 			for map_key in self.coordinates_mapping:
 								
 				# Check if the index is in this map and we have a constraint argument for the variable
-				if dim_index in self.coordinates_mapping[map_key]['map'] and map_key in kwargs_filtered:
+				if dim_index in self.coordinates_mapping[map_key]['map'] and map_key in targets:
 					
 					# All the maps should be identical so lets keep a copy for later
 					mapping = self.coordinates_mapping[map_key]['map']
 					map_keys.append(map_key)
-
-					#print "mapping: ", mapping
 									
-			# If we have no map_keys then we have to abort
+			# If we have no map_keys then the dimension stays masked
 			if not map_keys:
-				indices.append(numpy.nan)
 				continue
 			
-			#print 'map_keys: ', map_keys			
-			#print 'reversemap: map_keys(dim_index=%d) = ' % (dim_index), map_keys
-					
+			map_keys.sort()
+			
 			# Check all the coordinate variables are the same shape!
-			first = True
 			shape = None
 			for map_key in map_keys:
 				coord_variable = self.variable.group.variables[self.coordinates_mapping[map_key]['variable']]
-				#print coord_variable.shape
-				if first:
+				if shape is None:
 					shape = coord_variable.shape
-				else:
-					if coord_variable.shape() != shape:
-						raise CDMError("Linked coordinate variables must all be the same shape")
+				elif coord_variable.shape != shape:
+					raise CDMError("Linked coordinate variables must all be the same shape")
 						
 			# We need at least as many map keys as the dimensionality of the coordinate variables
 			if len(map_keys) < len(shape):
-				indices.append(numpy.nan)
 				continue
 	
-			# Now we search the coordinate space for the closest feature
-			# Find the associated coordinate variables			
-			coordinate_variables = []
-			for key in map_keys:
-			#	print "adding coordinate variable: ", self.variable.group.variables[self.coordinates_mapping[key]['variable']]
-				coordinate_variables.append(self.variable.group.variables[self.coordinates_mapping[key]['variable']])
-				
-			#print 'reversemap: coordinate_variables(dim_index=%d) = ' % (dim_index), coordinate_variables
+			if tuple(map_keys) not in searched:
+				searched[tuple(map_keys)] = self._nearest(map_keys, [targets[key] for key in map_keys])
 			
-			# Get the target arguments for each coordinate variable
+			closest, distances = searched[tuple(map_keys)]
+			indices[:,dim_index] = numpy.where(distances <= min_distance, closest[mapping.index(dim_index)], -1)
+		
+		return indices
+	
+	def _coerce_targets(self, values):
+		"""
+		Convert reversemap target arguments into an array of values comparable with coordinate variable values
+		"""
+		
+		values = numpy.atleast_1d(numpy.ma.getdata(values))
+		
+		# Check if we have datetime arguments, convert to dataset time coordinate
+		if values.dtype == object and values.size and hasattr(values.flat[0], 'timetuple'):
 			try:
-				target_args = [kwargs_filtered[key] for key in map_keys]
+				return self.calendar_index(full=True).date2num(values.ravel()).reshape(values.shape)
 			except:
-				indices.append(numpy.nan)
-				continue
-				
-			# See if we can coerce target arguments to floats, otherwise assume they are strings...
-			targets = []
-			#print "target_args: ", target_args
-			for arg in target_args:
-								
-				# Check if we have a datetime argument, convert to dataset time coordinate
-				if type(arg) == datetime.datetime:
-					try:
-						timevar = self.variable.group.variables[self.coordinates_mapping['time']['variable']]
-						timeunits = timevar.get_attribute('units')
-						calendar = timevar.get_attribute('calendar')
-						if not calendar:
-							calendar = 'standard'
-						target = netCDF4.date2num(arg, timeunits, calendar=calendar)
-					except:
-						raise CDMError("Cannot coerce datetime argument into time value")
+				raise CDMError("Cannot coerce datetime argument into time value")
+		
+		# See if we can coerce target arguments to floats, otherwise assume they are strings...
+		try:
+			return values.astype(numpy.float64)
+		except (TypeError, ValueError):
+			return values.astype(unicode)
+	
+	def _nearest(self, map_keys, targets):
+		"""
+		Find the coordinate variable indices closest to the target arrays given for each of the (sorted) map keys.  Returns a tuple
+		of (indices, distances) where indices is a tuple of index arrays, one per coordinate variable dimension.
+		
+		Latitude/longitude searches over multi-dimensional coordinate variables go through the cached spatial index and monotonic
+		1D coordinate variables are bisected.  String targets need an exact match.  Anything else falls back to a vectorised search
+		of the n-dimensional distance(squared) array.
+		"""
+		
+		coordinate_variables = [self.variable.group.variables[self.coordinates_mapping[key]['variable']] for key in map_keys]
+		shape = coordinate_variables[0].shape
+		
+		if map_keys == ['latitude', 'longitude'] and len(shape) >= 2:
+			return self.spatial_index().query(targets[0], targets[1])
+		
+		# Monotonic 1D coordinates can be bisected
+		if len(shape) == 1 and targets[0].dtype.kind == 'f':
+			name = coordinate_variables[0].name
+			values = self.read_coordinates(coordinate_variables[0])
+			if name not in self._monotonic:
+				self._monotonic[name] = monotonic(values)
+			
+			if self._monotonic[name]:
+				closest, distances = nearest_sorted(values, targets[0], self._monotonic[name])
+				return (closest,), distances
+		
+		# String coordinates need an exact match
+		if targets[0].dtype.kind in 'SU':
+			values = numpy.asarray(self.read_coordinates(coordinate_variables[0])).ravel()
+			lookup = {}
+			for index in range(len(values) - 1, -1, -1):
+				lookup[unicode(values[index])] = index
+			flat = numpy.array([lookup.get(target, -1) for target in targets[0]], dtype=numpy.int64)
+			distances = numpy.where(flat < 0, numpy.inf, 0.0)
+			return numpy.unravel_index(numpy.maximum(flat, 0), shape), distances
+		
+		points = numpy.column_stack([numpy.ma.filled(numpy.ma.asarray(self.read_coordinates(v), dtype=numpy.float64), numpy.nan).ravel() for v in coordinate_variables])
+		flat, distances = nearest_brute_force(points, numpy.column_stack(targets))
+		
+		return numpy.unravel_index(flat, shape), distances
+	
+	def spatial_index(self, greatcircle=False):
+		"""
+		Returns a SpatialIndex over the latitude and longitude coordinate variables.  The index is only built on first use and
+		is cached on the group (in a least recently used cache with a byte budget) so that all fields sharing the same 
+		coordinate variables share the same index.  Separate 1D latitude and longitude coordinate variables are indexed over 
+		the full grid of latitude/longitude pairs.
+		
+		With greatcircle=True the index searches on great circle distances (in kilometres) between unit vectors.
+		"""
+		
+		if self.latitude_variable is None or self.longitude_variable is None:
+			return None
+		
+		cache = self.group._spatial_indices
+		key = (self.latitude_variable, self.longitude_variable, greatcircle)
+		
+		if key in cache:
+			return cache[key]
+		
+		latitudes = self.read_coordinates(self.latitude_variable)
+		longitudes = self.read_coordinates(self.longitude_variable)
+		
+		if self.coordinates_mapping['latitude']['map'] != self.coordinates_mapping['longitude']['map']:
+			latitudes, longitudes = numpy.meshgrid(latitudes, longitudes, indexing='ij')
+		
+		index = SpatialIndex(latitudes, longitudes, greatcircle=greatcircle)
+		cache[key] = index
+		
+		return index
+	
+	def _spatial_dims(self):
+		"""
+		Returns the list of variable dimensions that map onto the spatial index grid
+		"""
+		
+		latitude_map = self.coordinates_mapping['latitude']['map']
+		longitude_map = self.coordinates_mapping['longitude']['map']
+		
+		if latitude_map == longitude_map:
+			return list(latitude_map)
+		else:
+			return list(latitude_map) + list(longitude_map)
+		
+	def _grid_dims(self):
+		"""
+		Returns the list of variable dimensions the horizontal grid maps onto.  Leading dimensions of higher dimensional coordinate
+		variables (the WRF case where latitude and longitude have time as the first dimension) are dropped.
+		"""
+		
+		latitude_map = self.coordinates_mapping['latitude']['map']
+		longitude_map = self.coordinates_mapping['longitude']['map']
+		
+		if len(latitude_map) > 2:
+			return list(latitude_map[-2:])
+		elif latitude_map == longitude_map:
+			return list(latitude_map)
+		else:
+			return list(latitude_map) + list(longitude_map)
+	
+	def _interpolation_grid(self):
+		"""
+		Returns a tuple of (latitudes, longitudes, dims) describing the horizontal grid used for interpolation, dims are the 
+		variable dimensions the grid maps onto (see _grid_dims).
+		"""
+		
+		latitudes = self.read_coordinates(self.latitude_variable)
+		longitudes = self.read_coordinates(self.longitude_variable)
+		
+		if len(latitudes.shape) > 2:
+			leading = (0,)*(len(latitudes.shape) - 2)
+			latitudes, longitudes = latitudes[leading], longitudes[leading]
+		
+		return (latitudes, longitudes, self._grid_dims())
+	
+	def interpolation_weights(self, latitudes, longitudes, method='bilinear', neighbours=4, power=2, max_distance=numpy.inf):
+		"""
+		Returns the PointWeights needed to interpolate the field to the target latitudes and longitudes.  Weights are built once
+		per set of targets and cached on the group (in a least recently used cache with a byte budget) so they are reused by 
+		every field sharing the same coordinate variables.
+		
+		method='bilinear' interpolates within the grid cell containing each target, on rectilinear grids (1D latitude and longitude)
+		and curvilinear grids (2D latitude and longitude).  Targets outside the grid get no value.  Longitudes wrap around, on 
+		global rectilinear grids targets between the last and first longitudes are interpolated across the wrap (see 
+		spatialfunctions.bilinear_rectilinear and bilinear_curvilinear).
+		
+		method='idw' does inverse distance weighting of the nearest neighbours grid points (or point features) by great circle
+		distance, neighbours further than max_distance (km) are ignored.
+		"""
+		
+		latitudes = numpy.ravel(numpy.asarray(latitudes, dtype=numpy.float64))
+		longitudes = numpy.ravel(numpy.asarray(longitudes, dtype=numpy.float64))
+		
+		targets = hashlib.sha1(latitudes.tobytes() + longitudes.tobytes()).hexdigest()
+		key = (self.latitude_variable, self.longitude_variable, method, neighbours, power, max_distance, targets)
+		
+		if key in self.group._interpolation_weights:
+			return self.group._interpolation_weights[key]
+		
+		grid_latitudes, grid_longitudes, dims = self._interpolation_grid()
+		
+		if method == 'bilinear':
+			
+			if len(dims) != 2:
+				raise CDMError("Bilinear interpolation needs a grid, use idw for point features")
+			
+			if len(grid_latitudes.shape) == 1:
+				weights = bilinear_rectilinear(grid_latitudes, grid_longitudes, latitudes, longitudes)
+			else:
+				weights = bilinear_curvilinear(grid_latitudes, grid_longitudes, SpatialIndex(grid_latitudes, grid_longitudes), latitudes, longitudes)
 				
-				else:
-					try:
-						target = numpy.float32(arg)
-					except:
-						target = "%s" % (repr(arg))
-					
-				# Check target type agrees with coordinate variables
-				#for coordinate_variable in coordinate_variables:
-				#	if type(target) != coordinate_variable.dtype:
-				#		raise CDMError("Mismatched target type %s and coordinate variable type %s" % (type(target),coordinate_variable.dtype) )
-						
-				targets.append(target)
-			
-			# For float targets and coordinate variables
-			#print "targets: ", targets
-			for target in targets:
-				if type(target) in [numpy.float32, numpy.float64, float]:
-					# Intialiase our distance array
-					d2 = numpy.zeros(shape)					
-					for k in range(0,len(map_keys)):
-						d2 += numpy.power(coordinate_variables[k][:] - targets[k], 2)
-											
-			closest = numpy.unravel_index(d2.argmin(),shape)
-			indices.append(closest[mapping.index(dim_index)])
-		
-			#print "indices: ", indices
-		
-		# Convert to slices
-		slice_list = []
-		for index in indices:
-			if numpy.isnan(index):
-				slice_list.append(slice(None))
+		elif method == 'idw':
+			
+			if dims == self._spatial_dims():
+				index = self.spatial_index(greatcircle=True)
 			else:
-				slice_list.append(slice(index,index+1))
+				index = SpatialIndex(grid_latitudes, grid_longitudes, greatcircle=True)
+			
+			weights = inverse_distance(index, latitudes, longitudes, neighbours=neighbours, power=power, max_distance=max_distance)
 		
-		return tuple(slice_list)
+		else:
+			raise CDMError("Unknown interpolation method {}".format(method))
+		
+		weights.dims = dims
+		self.group._interpolation_weights[key] = weights
+		
+		return weights
+	
+	def extract_points(self, latitudes, longitudes, method='bilinear', neighbours=4, power=2, max_distance=numpy.inf):
+		"""
+		Extract values interpolated to the target latitudes and longitudes across all the other dimensions (times, levels, etc.) of
+		the current subset.  See interpolation_weights for the methods available.
+		
+		Returns a masked array shaped like the field with the horizontal dimensions replaced by a trailing points dimension, so for 
+		a (time, lat, lon) field the result is (time, npoints).  Only the block of the grid covering the interpolation stencils is read.
+		
+		>>> values = field.extract_points(station_lats, station_lons, method='bilinear')
+		>>> values.shape
+		(48, 500)
+		"""
 		
+		weights = self.interpolation_weights(latitudes, longitudes, method=method, neighbours=neighbours, power=power, max_distance=max_distance)
+		
+		selection = list(self._subset)
+		for dim, bounds in zip(weights.dims, weights.bounds):
+			selection[dim] = slice(*bounds)
+		
+		values = numpy.ma.asarray(self.variable[tuple(selection)])
+		
+		# Move the grid dimensions to the end
+		order = [dim for dim in range(len(values.shape)) if dim not in weights.dims] + weights.dims
+		values = values.transpose(order)
+		
+		return weights.apply(values, offset=[bounds[0] for bounds in weights.bounds])
+	
 	@property
 	def times(self):
 		
 		if self.time_variable:
 			if self._subset:
-				return self.time_variable[self._subset[self.time_dim]][:]
+				return self.read_coordinates(self.time_variable, (self._subset[self.time_dim],))
 			else:
-				return self.time_variable[:]
+				return self.read_coordinates(self.time_variable)
 		else:
 			return []
 			
+	def calendar_index(self, full=False):
+		"""
+		Returns the timefunctions.CalendarIndex of the times of the current subset (or of the whole time variable if full is 
+		True), or None if the field has no time coordinate.  The index of each time variable is built once, in the calendar
+		given by its calendar attribute, and shared by all the fields of the group.
+		"""
+		
+		if not self.time_variable:
+			return None
+		
+		indices = self.group._calendar_indices
+		variable = self.time_variable
+		
+		if variable not in indices:
+			indices[variable] = CalendarIndex(self.read_coordinates(variable), variable.get_attribute('units'), 
+				variable.get_attribute('calendar') or 'standard')
+		
+		if full or not self._subset:
+			return indices[variable]
+		else:
+			return indices[variable][self._subset[self.time_dim]]
+	
 	@property
 	def realtimes(self):
-		if type(self._realtimes) != list:
-			if self.time_variable:
-				self._realtimes = netCDF4.num2date(self.times, self.time_variable.get_attribute('units'))
-				return self._realtimes
-		else:
-			return self._realtimes
+		if self.time_variable:
+			return self.calendar_index().dates
 			
 	def time_slices(self, start={}, length='1 month', after=None, before=None):
 		
-		return time_slices(self.times, self.time_variable.get_attribute('units'), start, length, after=after, before=before)
+		return time_slices(self.times, self.time_variable.get_attribute('units'), start, length, after=after, before=before, 
+			index=self.calendar_index())
 
 
+	def _view(self, subset):
+		"""
+		Create a view of this field with the given subset.  The view shares the variable, coordinates mapping and all
+		cached coordinate information with this field, only the subset and subset dependent caches are its own.  No
+		data is read until values are requested.
+		"""
+		
+		view = copy.copy(self)
+		view._subset = list(subset)
+		view.parent = self
+		
+		view._latlons = None
+		
+		return view
+	
+	@property
+	def view(self):
+		"""
+		Index the field to create a view of a subset, indices are relative to the current subset and
+		integer indices keep their dimension (with length 1):
+		
+		>>> window = field.view[0:12, 10:20, 30:40]
+		>>> window.shape
+		(12, 10, 10)
+		>>> first = window.view[0]
+		>>> first.shape
+		(1, 10, 10)
+		"""
+		return _ViewIndexer(self)
+	
 	def subset(self, **kwargs):
-
-		#print "_subset = ", self._subset
+		"""
+		Returns a view of the field restricted to the given coordinate ranges.  Each keyword argument is a coordinate
+		name with either a single target value or a (start, end) tuple of target values which are reverse mapped onto
+		dimension indices.  The field itself is unchanged so several subsets can be branched from the same field.
+		
+		>>> cape_town = field.subset(latitude=(-35, -33), longitude=(18, 19.5))
+		"""
+		
+		subset = list(self._subset)
+		
 		for arg, value in kwargs.items():
 
 			# Reverse map each argument
@@ -569,261 +968,498 @@ class Field(object):
 					stop[i] = start[i] + 1
 					start[i] = tmp - 1
 				
-				if start[i] and start[i] > self._subset[i].start:
+				if start[i] is not None and start[i] < 0:
+					raise CDMError("Subset {} is outside the field domain".format(arg))
+				
+				if start[i] and start[i] > subset[i].start:
 					newstart = start[i]
 				else:
-					newstart = self._subset[i].start
+					newstart = subset[i].start
 
-				if stop[i] and stop[i] < self._subset[i].stop:
+				if stop[i] and stop[i] < subset[i].stop:
 					newstop = stop[i]
 				else:
-					newstop = self._subset[i].stop
+					newstop = subset[i].stop
 
-				self._subset[i] = slice(newstart, newstop)
-		#print "_subset = ", self._subset
+				subset[i] = slice(newstart, newstop, subset[i].step)
+		
+		return self._view(subset)
 
 
 	def __getitem__(self, slices):
-#		print "__getitem__", slices
-#		print self._subset
-#		print self.variable[self._subset][slices].shape
-		if self._subset:
-			return self.variable[tuple(self._subset)][slices]
-		else:
+		"""
+		Read values from the current subset.  The slices (which may include integer, negative and index array indices as well
+		as steps) are composed with the subset first so only the requested hyperslab is read from the variable.  Results 
+		follow numpy indexing semantics.  Variables (netCDF4 in particular) index arrays orthogonally, so keys with more than 
+		one index array, or index arrays together with integers, read the hyperslab bounding the selection and apply the 
+		index arrays to it in memory.
+		"""
+		
+		if not self._subset:
 			return self.variable[slices]
 		
-
-
-	def time_aggregation(self, func, start={}, length='1 month', mask_less=numpy.nan, mask_greater=numpy.nan):
+		key = compose_key(self._subset, slices, self.variable.shape)
 		
-		times = self.times
-		slices = time_slices(times, self.time_variable.get_attribute('units'), start, length)
+		arrays = [item for item in key if isinstance(item, numpy.ndarray)]
+		integers = [item for item in key if isinstance(item, (int, long))]
 		
-		shape = self.shape
+		if len(arrays) <= 1 and not (arrays and integers):
+			return self.variable[key]
 		
-		time_dim = self.coordinates_mapping['time']['map'][0]
-
-		new_shape = list(shape)
-		new_shape[time_dim] = len(slices)
-		new_shape = tuple(new_shape)
+		bounds = []
+		local = []
+		for item in key:
+			if isinstance(item, slice):
+				bounds.append(item)
+				local.append(slice(None))
+			elif isinstance(item, (int, long)):
+				bounds.append(slice(item, item+1))
+				local.append(0)
+			elif item.size:
+				bounds.append(slice(int(item.min()), int(item.max())+1))
+				local.append(item - item.min())
+			else:
+				bounds.append(slice(0, 0))
+				local.append(item)
 		
-		source = self.variable[:]
-		result = numpy.ma.empty(new_shape, dtype=numpy.float32)
-
-		result_selection = []
-		source_selection = []
-		for d in shape:
-			source_selection.append(slice(None))
-			result_selection.append(slice(None))
+		return numpy.ma.asanyarray(self.variable[tuple(bounds)])[tuple(local)]
 		
-		for i in range(len(slices)):
-			source_selection[time_dim] = slices[i]
-			result_selection[time_dim] = i
-			#print source_selection, result_selection
-			#print self.variable[source_selection].shape
-			
-	#		tmp = numpy.ma.masked_array(self.variable[source_selection])
-			tmp = source[source_selection]
-			#print type(tmp)
-			#print numpy.ma.min(tmp), numpy.ma.max(tmp)
-			
-			if not numpy.isnan(mask_less):
-				tmp = numpy.ma.masked_less(tmp, mask_less)
-
-			if not numpy.isnan(mask_greater):
-				tmp = numpy.ma.masked_greater(tmp, mask_greater)
-			
-			
-			result[tuple(result_selection)] = func(tmp, axis=time_dim)
-			#print i, source[source_selection][:,77], result[tuple(result_selection)][77]
-
-			
-		result_times = [times[s.stop-1] for s in slices]
 
-		return result, netCDF4.num2date(result_times, self.time_variable.get_attribute('units'))
 
-	def features(self, mask=None, propnames=None):
+	def time_aggregation(self, func, start={}, length='1 month', mask_less=numpy.nan, mask_greater=numpy.nan, block_size=None, workers=None, executor='process'):
 		"""
-		Produces a geoJSON structured dict that represents the feature collection of the field.  At the moment the following assumptions
-		are made:
-		Point type feature collections are represented as unconnected collections of points.
-		Rectangular/cartesian grid feature collections are represented as a collection of rectangular polygons centered on the
-		lat/lon location of a the grid point.
-		Rectangular/non-cartesian grids are presented as rectangles centered on the lat/lon location.  Corners are interpolated from
-		diagonal grid point locations and extrapolated on the edges.  This may not be perfect but is a good working start.
+		Aggregate the field over the time windows given by time_slices (see time_slices for start and length) with func.  Values
+		less than mask_less or greater than mask_greater are masked first.  The common reductions (sum, mean, min, max, count 
+		and std, given either by name or as the equivalent numpy functions) are computed for all windows in a single pass by 
+		reducefunctions.grouped_reduce, any other func is called for each window in turn as func(values, axis=time_dim).
 		
-		The optional mask parameter specifies a masking field that needn't be congruent as the mask values will be extracted based on
-		the nearest lat/lon search.
+		If block_size is given the time axis is read and reduced in blocks of whole windows spanning at most block_size time
+		steps, so memory use is bounded by the block rather than the field size.  Windows longer than block_size are split
+		into pieces whose partial statistics are merged (see _aggregate_statistics), except for funcs other than the common
+		reductions which need a whole window at a time.  Otherwise the whole subset is read in one go.
 		
-		The optional propnames parameter specifies a list of property labels that correspond to data values.  This allows multiple
-		properties to be added to each feature if the field has other dimensions such as time.  Each property name corresponds to successive data values
-		after the grid point data array has been flattened.
+		With workers set the field is split into that many tiles along its longest non time dimension and each tile is read and
+		reduced by a pool of worker processes (executor='process') or threads (executor='thread').  Worker processes reopen 
+		the dataset from its uri so they are only used for datasets with a uri, root group variables and picklable funcs, 
+		otherwise threads are used.  Tiles are assembled in order so the result is the same as without workers.
+		
+		func can also be a list of the common reductions, in which case they are all computed in a single pass over the data 
+		(see _aggregate_statistics) and a dict of aggregated arrays keyed by statistic name is returned in place of the array.
+		
+		Returns the aggregated (float32 masked) array and the datetimes at the end of each window.
 		"""
 		
-		# See if we have a cached result
-		if self._features:
-			return self._features
+		if executor not in ['process', 'thread']:
+			raise ValueError("executor must be 'process' or 'thread', not {!r}".format(executor))
 		
-		result = {'type': 'FeatureCollection', 'features':[]}
-		features = []
-										
-		# We can dealt with grid type collections first
-		if self.featuretype in ['Grid', 'GridSeries']:
+		slices = self.time_slices(start, length)
+		
+		shape = self.shape
+		
+		time_dim = self.coordinates_mapping['time']['map'][0]
+		
+		# Several statistics are computed together
+		if isinstance(func, (list, tuple)):
+			statistic = [statistic_name(item) for item in func]
+			if None in statistic:
+				raise CDMError("only the statistics {} can be combined".format(', '.join(STATISTICS)))
+		else:
+			statistic = statistic_name(func)
+		
+		starts, stops = window_bounds(slices, shape[time_dim])
+		
+		if workers and workers > 1:
+			result = self._aggregate_tiles(starts, stops, func, statistic, time_dim, mask_less, mask_greater, block_size, workers, executor)
+		else:
+			result = self._aggregate_blocks(starts, stops, func, statistic, time_dim, mask_less, mask_greater, block_size)
+		
+		return result, self.calendar_index().dates[[s.stop-1 for s in slices]]
+	
+	def _aggregate_blocks(self, starts, stops, func, statistic, time_dim, mask_less, mask_greater, block_size, lock=None):
+		"""
+		Aggregate the current subset over the windows given by arrays of start and stop time indices, reading and reducing 
+		blocks of at most block_size time steps in turn (see time_aggregation).  Reads are serialised through lock if given.
+		"""
+		
+		if isinstance(statistic, list):
+			return self._aggregate_statistics(starts, stops, statistic, time_dim, mask_less, mask_greater, block_size, lock=lock)
+		
+		# Windows longer than a block are split into pieces whose partials are merged
+		if statistic and block_size is not None and len(starts) and (stops - starts).max() > block_size:
+			return self._aggregate_statistics(starts, stops, [statistic], time_dim, mask_less, mask_greater, block_size, lock=lock)[statistic]
+		
+		shape = list(self.shape)
+		shape[time_dim] = len(starts)
+		
+		result = numpy.ma.empty(shape, dtype=numpy.float32)
+		
+		source_selection = [slice(None)]*len(shape)
+		result_selection = [slice(None)]*len(shape)
+		
+		for span, windows in window_blocks(starts, stops, block_size):
 			
-			# Get center point latitudes and longitudes
-			latitudes = self.latitudes
-			longitudes = self.longitudes
-			shape = latitudes.shape
+			source_selection[time_dim] = span
+			result_selection[time_dim] = windows
 			
-			# How do we slice the data to get grid point values?
-			index = 0
-			for dim in self.variable.dimensions:
-				print dim, dim.length, len(self.times)
-				if dim.length == shape[0]:
-					y_index = index
-				if dim.length == shape[1]:
-					x_index = index
-				if dim.length == len(self.times):
-					t_index = index
-				index += 1
+			if lock:
+				with lock:
+					source = self[tuple(source_selection)]
+			else:
+				source = self[tuple(source_selection)]
 			
+			block_slices = [slice(starts[i] - span.start, stops[i] - span.start) for i in windows]
 			
-			# Create the initial slices with indices defaulting to 0
-			slices = [0]*len(self.variable.dimensions)
-			slices[t_index] = slice(0,len(self.times))
+			result[tuple(result_selection)] = self._reduce_windows(source, block_slices, func, statistic, time_dim, mask_less, mask_greater)
+		
+		return result
+	
+	def _aggregate_tiles(self, starts, stops, func, statistic, time_dim, mask_less, mask_greater, block_size, workers, executor):
+		"""
+		Aggregate spatial tiles of the current subset in a pool of workers and assemble the tiles into the result, see 
+		time_aggregation
+		"""
+		
+		shape = list(self.shape)
+		
+		# Split the longest non time dimension into contiguous tiles
+		dims = [dim for dim in range(len(shape)) if dim != time_dim]
+		if not dims:
+			return self._aggregate_blocks(starts, stops, func, statistic, time_dim, mask_less, mask_greater, block_size)
+		
+		tile_dim = max(dims, key=lambda dim: shape[dim])
+		edges = numpy.linspace(0, shape[tile_dim], min(workers, shape[tile_dim]) + 1).astype(int)
+		
+		tiles = []
+		for first, last in zip(edges[:-1], edges[1:]):
+			selection = [slice(None)]*len(shape)
+			selection[tile_dim] = slice(first, last)
+			tiles.append(tuple(selection))
+		
+		reduction = statistic if statistic else func
+		
+		if executor == 'process' and self._reopenable(reduction):
+			tasks = [(self.group.dataset.__class__, self.group.dataset.uri, self.variable.name, self.view[tile]._subset, 
+				starts, stops, reduction, time_dim, mask_less, mask_greater, block_size) for tile in tiles]
+			pool = multiprocessing.Pool(workers)
+			try:
+				results = pool.map(_aggregate_tile, tasks)
+			finally:
+				pool.close()
+				pool.join()
+		
+		else:
+			lock = threading.Lock()
+			aggregate = lambda tile: self.view[tile]._aggregate_blocks(starts, stops, func, statistic, time_dim, mask_less, mask_greater, block_size, lock=lock)
+			pool = multiprocessing.pool.ThreadPool(workers)
+			try:
+				results = pool.map(aggregate, tiles)
+			finally:
+				pool.close()
+				pool.join()
+		
+		shape[time_dim] = len(starts)
+		
+		if isinstance(statistic, list):
+			result = dict([(name, numpy.ma.empty(shape, dtype=numpy.float32)) for name in statistic])
+			for tile, tile_result in zip(tiles, results):
+				for name in statistic:
+					result[name][tile] = tile_result[name]
+		
+		else:
+			result = numpy.ma.empty(shape, dtype=numpy.float32)
+			for tile, tile_result in zip(tiles, results):
+				result[tile] = tile_result
+		
+		return result
+	
+	def _aggregate_statistics(self, starts, stops, statistics, time_dim, mask_less, mask_greater, block_size, lock=None):
+		"""
+		Compute several statistics over the windows given by arrays of start and stop time indices in a single pass over 
+		blocks of at most block_size time steps.  Windows longer than a block are split over several blocks and their partial
+		counts, means and M2 sums are merged with the parallel variance update so the result doesn't depend on the blocks.
+		Returns a dict of (float32 masked) arrays keyed by statistic.
+		"""
+		
+		shape = list(self.shape)
+		shape[time_dim] = len(starts)
+		
+		# Partials are kept with the windows along the first axis
+		partials_shape = [len(starts)] + [length for dim, length in enumerate(shape) if dim != time_dim]
+		extremes = bool(set(statistics) & set(['min', 'max']))
+		partials = empty_partials(partials_shape, extremes=extremes)
+		
+		source_selection = [slice(None)]*len(shape)
+		
+		for span, windows, piece_starts, piece_stops in window_pieces(starts, stops, block_size):
+			
+			source_selection[time_dim] = span
+			
+			if lock:
+				with lock:
+					source = self[tuple(source_selection)]
+			else:
+				source = self[tuple(source_selection)]
+			
+			block = grouped_partials(source, piece_starts, piece_stops, axis=time_dim, mask_less=mask_less, mask_greater=mask_greater, extremes=extremes)
+			merged = merge_partials(dict([(key, values[windows]) for key, values in partials.items()]), block)
+			
+			for key in partials:
+				partials[key][windows] = merged[key]
+		
+		result = {}
+		for statistic in statistics:
+			result[statistic] = numpy.ma.empty(shape, dtype=numpy.float32)
+			result[statistic][:] = numpy.ma.asarray(numpy.moveaxis(finalise(partials, statistic), 0, time_dim))
+		
+		return result
+	
+	def _reopenable(self, reduction):
+		"""
+		Can worker processes reopen the dataset of this field and receive the reduction
+		"""
+		
+		dataset = self.group.dataset
+		
+		if not getattr(dataset, 'uri', None) or not self.group._isroot:
+			return False
+		
+		try:
+			pickle.dumps(reduction, pickle.HIGHEST_PROTOCOL)
+		except Exception:
+			return False
+		
+		return True
+	
+	def _reduce_windows(self, source, slices, func, statistic, time_dim, mask_less, mask_greater):
+		"""
+		Reduce the source block over each of the windows given by slices along time_dim, with the grouped reduction engine if 
+		statistic is set and by calling func for each window otherwise
+		"""
+		
+		if statistic:
+			return grouped_reduce(source, slices, statistic, axis=time_dim, mask_less=mask_less, mask_greater=mask_greater)
+		
+		shape = list(source.shape)
+		shape[time_dim] = len(slices)
+		result = numpy.ma.empty(shape, dtype=numpy.float32)
+		
+		source_selection = [slice(None)]*len(shape)
+		result_selection = [slice(None)]*len(shape)
+		
+		for i in range(len(slices)):
+			source_selection[time_dim] = slices[i]
+			result_selection[time_dim] = i
+			
+			tmp = source[tuple(source_selection)]
+			
+			if not numpy.isnan(mask_less):
+				tmp = numpy.ma.masked_less(tmp, mask_less)
 
-						
-			# Create corner point latitude longitude arrays
-			corner_lats = numpy.zeros((shape[0]+1, shape[1]+1))
-			corner_lons = numpy.zeros((shape[0]+1, shape[1]+1))
-						
-			# Step through all the interior grid points
-			for y in range(1, shape[0]):
-				for x in range(1, shape[1]):
-					corner_lats[y,x] = (latitudes[y, x-1] + latitudes[y,x] + latitudes[y-1,x-1] + latitudes[y-1,x])/4
-					corner_lons[y,x] = (longitudes[y, x-1] + longitudes[y,x] + longitudes[y-1,x-1] + longitudes[y-1,x])/4
-					
-			# Left boundary
-			x = 0
-			for y in range(1,shape[0]):
-				tmp_lat = (latitudes[y,x] + latitudes[y-1,x])/2
-				tmp_lon = (longitudes[y,x] + longitudes[y-1,x])/2
-				corner_lats[y,x] = tmp_lat - (corner_lats[y,x+1] - tmp_lat)
-				corner_lons[y,x] = tmp_lon - (corner_lons[y,x+1] - tmp_lon)
-
-
-			# Right boundary
-			x = shape[1]
-			for y in range(1,shape[0]):
-				tmp_lat = (latitudes[y,x-1] + latitudes[y-1,x-1])/2
-				tmp_lon = (longitudes[y,x-1] + longitudes[y-1,x-1])/2
-				corner_lats[y,x] = tmp_lat - (corner_lats[y,x-1] - tmp_lat)
-				corner_lons[y,x] = tmp_lon - (corner_lons[y,x-1] - tmp_lon)
-
-
-			# Bottom boundary
-			y = 0
-			for x in range(1,shape[1]):
-				tmp_lat = (latitudes[y,x] + latitudes[y,x-1])/2
-				tmp_lon = (longitudes[y,x] + longitudes[y,x-1])/2
-				corner_lats[y,x] = tmp_lat - (corner_lats[y+1,x] - tmp_lat)
-				corner_lons[y,x] = tmp_lon - (corner_lons[y+1,x] - tmp_lon)
-
-			# Top boundary
-			y = shape[0]
-			for x in range(1,shape[1]):
-				tmp_lat = (latitudes[y-1,x] + latitudes[y-1,x-1])/2
-				tmp_lon = (longitudes[y-1,x] + longitudes[y-1,x-1])/2
-				corner_lats[y,x] = tmp_lat - (corner_lats[y-1,x] - tmp_lat)
-				corner_lons[y,x] = tmp_lon - (corner_lons[y-1,x] - tmp_lon)
-			
-			# Corners
-			corner_lats[0,0] = latitudes[0,0] - (corner_lats[1,1] - latitudes[0,0])
-			corner_lats[0,shape[1]] = latitudes[0,shape[1]-1] - (corner_lats[1,shape[1]-1] - latitudes[0,shape[1]-1])
-			corner_lats[shape[0],0] = latitudes[shape[0]-1,0] + (latitudes[shape[0]-1,0] - corner_lats[shape[0]-1,1])
-			corner_lats[shape[0],shape[1]] = latitudes[shape[0]-1,shape[1]-1] + (latitudes[shape[0]-1,shape[1]-1] - corner_lats[shape[0]-1,shape[1]-1])
-
-			corner_lons[0,0] = longitudes[0,0] - (corner_lons[1,1] - longitudes[0,0])
-			corner_lons[0,shape[1]] = longitudes[0,shape[1]-1] + (longitudes[0,shape[1]-1] - corner_lons[1,shape[1]-1])
-			corner_lons[shape[0],0] = longitudes[shape[0]-1,0] - (corner_lons[shape[0]-1,1] - longitudes[shape[0]-1,0])
-			corner_lons[shape[0],shape[1]] = longitudes[shape[0]-1,shape[1]-1] + (longitudes[shape[0]-1,shape[1]-1] - corner_lons[shape[0]-1,shape[1]-1])
-
-
-#			print corner_lats
+			if not numpy.isnan(mask_greater):
+				tmp = numpy.ma.masked_greater(tmp, mask_greater)
+			
+			result[tuple(result_selection)] = func(tmp, axis=time_dim)
+		
+		return result
+
+	def climatology(self, func='mean', group='month', mask_less=numpy.nan, mask_greater=numpy.nan, block_size=None):
+		"""
+		Multi-year climatology of the field grouped by 'month', 'season' or 'doy' (day of year) of each time in the field's 
+		calendar (see timefunctions.CalendarIndex.groups).  func is one of the common reductions (sum, mean, min, max, count
+		and std, by name or as the equivalent numpy function) or a list of them.  Values less than mask_less or greater than
+		mask_greater are masked first.
+		
+		All groups are reduced together in a single pass over the time axis, read in blocks of at most block_size time steps
+		if given (otherwise in one go), with the partials of each block merged as in time_aggregation.
+		
+		Returns the (float32 masked) climatology array, with the time dimension replaced by the groups, or a dict of them 
+		keyed by statistic if func is a list, and the array of group names.
+		"""
+		
+		index = self.calendar_index()
+		if index is None:
+			raise CDMError("Field has no time coordinate")
+		
+		try:
+			labels, groups = index.groups(group)
+		except ValueError as error:
+			raise CDMError(str(error))
+		
+		if isinstance(func, (list, tuple)):
+			statistics = [statistic_name(item) for item in func]
+		else:
+			statistics = [statistic_name(func)]
+		
+		if None in statistics:
+			raise CDMError("climatologies can only be computed with the statistics {}".format(', '.join(STATISTICS)))
+		
+		time_dim = self.time_dim
+		shape = list(self.shape)
+		shape[time_dim] = len(groups)
+		
+		# Partials are kept with the groups along the first axis
+		partials_shape = [len(groups)] + [length for dim, length in enumerate(shape) if dim != time_dim]
+		extremes = bool(set(statistics) & set(['min', 'max']))
+		partials = empty_partials(partials_shape, extremes=extremes)
+		
+		source_selection = [slice(None)]*len(shape)
+		
+		for span in self._time_blocks(block_size):
+			
+			source_selection[time_dim] = span
+			source = self[tuple(source_selection)]
+			
+			block = labelled_partials(source, labels[span], len(groups), axis=time_dim, mask_less=mask_less, mask_greater=mask_greater, extremes=extremes)
+			partials = merge_partials(partials, block)
+		
+		result = {}
+		for statistic in statistics:
+			result[statistic] = numpy.ma.empty(shape, dtype=numpy.float32)
+			result[statistic][:] = numpy.ma.asarray(numpy.moveaxis(finalise(partials, statistic), 0, time_dim))
+		
+		if isinstance(func, (list, tuple)):
+			return result, groups
+		else:
+			return result[statistics[0]], groups
+	
+	def iteranomalies(self, group='month', climatology=None, mask_less=numpy.nan, mask_greater=numpy.nan, block_size=None):
+		"""
+		Generator over the anomalies of the field relative to a climatology grouped by group (see climatology), yielding 
+		(span, anomalies) tuples for successive blocks of at most block_size time steps (or the whole subset), where span is 
+		the slice of the subset time dimension the block covers.  climatology defaults to the mean climatology of the field
+		itself, a climatology of another period or field on the same grid (with the same grouping) can be given instead.
+		Values less than mask_less or greater than mask_greater are masked.
+		"""
+		
+		index = self.calendar_index()
+		if index is None:
+			raise CDMError("Field has no time coordinate")
+		
+		try:
+			labels, groups = index.groups(group)
+		except ValueError as error:
+			raise CDMError(str(error))
+		
+		time_dim = self.time_dim
+		
+		if climatology is None:
+			climatology = self.climatology('mean', group, mask_less=mask_less, mask_greater=mask_greater, block_size=block_size)[0]
+		
+		shape = list(self.shape)
+		shape[time_dim] = len(groups)
+		
+		if list(numpy.shape(climatology)) != shape:
+			raise CDMError("climatology shape {} doesn't match the {} groups of the field, expected {}".format(numpy.shape(climatology), group, tuple(shape)))
+		
+		source_selection = [slice(None)]*len(shape)
+		
+		for span in self._time_blocks(block_size):
+			
+			source_selection[time_dim] = span
+			source = numpy.ma.asarray(self[tuple(source_selection)])
+			
+			if not numpy.isnan(mask_less):
+				source = numpy.ma.masked_less(source, mask_less)
+
+			if not numpy.isnan(mask_greater):
+				source = numpy.ma.masked_greater(source, mask_greater)
+			
+			yield span, (source - numpy.ma.take(climatology, labels[span], axis=time_dim)).astype(numpy.float32)
+	
+	def anomalies(self, group='month', climatology=None, mask_less=numpy.nan, mask_greater=numpy.nan, block_size=None):
+		"""
+		Returns the (float32 masked) array of the anomalies of the field relative to a climatology, see iteranomalies.  Use
+		iteranomalies to process the anomalies of large fields block by block.
+		"""
+		
+		result = numpy.ma.empty(self.shape, dtype=numpy.float32)
+		
+		result_selection = [slice(None)]*len(self.shape)
+		
+		for span, anomalies in self.iteranomalies(group, climatology, mask_less=mask_less, mask_greater=mask_greater, block_size=block_size):
+			result_selection[self.time_dim] = span
+			result[tuple(result_selection)] = anomalies
+		
+		return result
+	
+	def _time_blocks(self, block_size=None):
+		"""
+		Generator over slices of the subset time dimension of at most block_size time steps, a single slice covering the 
+		whole subset without a block_size
+		"""
+		
+		length = self.shape[self.time_dim]
+		step = block_size or max(length, 1)
+		
+		for first in range(0, length, step):
+			yield slice(first, min(first + step, length))
+
+	def features(self, mask=None, propnames=None, series=False):
+		"""
+		Produces a geoJSON structured dict that represents the feature collection of the field.  At the moment the following assumptions
+		are made:
+		Point type feature collections are represented as unconnected collections of points.
+		Rectangular/cartesian grid feature collections are represented as a collection of rectangular polygons centered on the
+		lat/lon location of a the grid point.
+		Rectangular/non-cartesian grids are presented as rectangles centered on the lat/lon location.  Corners are interpolated from
+		diagonal grid point locations and extrapolated on the edges.  This may not be perfect but is a good working start.
+		
+		The optional mask parameter specifies a masking field that needn't be congruent as the mask values will be extracted based on
+		the nearest lat/lon search.
+		
+		The optional propnames parameter specifies a list of property labels that correspond to data values.  This allows multiple
+		properties to be added to each feature if the field has other dimensions such as time.  Each property name corresponds to successive data values
+		after the grid point data array has been flattened.
+		
+		If series is True the flattened values of all the other dimensions (for example the full time series) are embedded in
+		each feature as a 'values' list property.
+		
+		Results are cached by the group keyed on the subset, mask and propnames so repeated requests are served from memory.
+		The cached dict itself is returned and shared between callers so it must be treated as read only, copy it before 
+		making changes.
+		"""
+		
+		build = lambda: self._build_features(mask=mask, propnames=propnames, series=series)
+		return self._cached_features('features', mask, propnames, build, series=series)
+	
+	def _build_features(self, mask=None, propnames=None, series=False):
+		"""
+		Builds the feature collection dict, see features
+		"""
+		
+		result = {'type': 'FeatureCollection', 'features':[]}
+		features = []
+										
+		# We can dealt with grid type collections first
+		if self.featuretype in ['Grid', 'GridSeries']:
+			
+			# Get the grid cell corners
+			corner_lats, corner_lons = self.cell_bounds()
 
 			# Now create all polygons
-			for y in range(0, shape[0]):
-				for x in range(0, shape[1]):
-
-					# Configure the slices
-					slices[x_index] = slice(x,x+1)
-					slices[y_index] = slice(y,y+1)
-
-					# Check if we are masking and if this point is masked
-					masked = False
-
-					if mask:
-						if mask[y, x] < 0.5:
-							masked = True
-											
-					if not masked:
-
-						vertices = []
-						vertices.append([corner_lons[y, x], corner_lats[y,x]])
-						vertices.append([corner_lons[y+1, x], corner_lats[y+1,x]])
-						vertices.append([corner_lons[y+1, x+1], corner_lats[y+1,x+1]])
-						vertices.append([corner_lons[y, x+1], corner_lats[y,x+1]])
-						vertices.append([corner_lons[y, x], corner_lats[y,x]])				
-
-						# Create the basic feature
-						feature = {'type': 'Feature', 'properties':{'id':x + y * shape[1]}, 'geometry': {'type': 'Polygon', 'coordinates': [vertices]}}
-						
-						# Now add the data					
-						#data = self.variable[slices].flatten()
-						
-						# If we have property names then extract data for each name
-						if propnames:
-							for name in propnames:
-								
-								feature['properties']['value'] = self.variable[slices].flatten()[1]
-	#							print self.variable[slices]
-								#feature['properties']['value'] = self.variable[slices].flatten()[propnames.index(name)]
-						
-						# else just set property 'value' to the first value of the flattened data array
-						else:
-								pass
-								#feature['properties']['value'] = float(self.variable[slices].flatten()[1])
-						
-						#print feature['properties']
-						#, 'value':float(values[y,x])
-						features.append(feature)
+			for (y, x), properties in self._feature_properties(mask=mask, propnames=propnames, series=series):
+
+				vertices = []
+				vertices.append([corner_lons[y, x], corner_lats[y,x]])
+				vertices.append([corner_lons[y+1, x], corner_lats[y+1,x]])
+				vertices.append([corner_lons[y+1, x+1], corner_lats[y+1,x+1]])
+				vertices.append([corner_lons[y, x+1], corner_lats[y,x+1]])
+				vertices.append([corner_lons[y, x], corner_lats[y,x]])				
+
+				# Create the basic feature
+				feature = {'type': 'Feature', 'properties':properties, 'geometry': {'type': 'Polygon', 'coordinates': [vertices]}}
+				features.append(feature)
 					
 			result['features'] = features
-						
-#			outfile = open('test.json', 'w')
-#			outfile.write(simplejson.dumps(result))
-#			outfile.close()
-			
 		
 		# Point type feature sets next
 		elif self.featuretype in ['Point', 'PointSeries']:
 			
-			result = {'type': 'FeatureCollection', 'features':[]}
-			features = []
-			
 			longitudes = self.longitudes
 			latitudes = self.latitudes
 			
-			count = len(longitudes)
-			for fid in range(0,count):
-				feature = {'type':'Feature', 'properties':{'_id':fid}, 'geometry': {'type':'Point', 'coordinates': [float(longitudes[fid]), float(latitudes[fid])]}}
-
-				# Add related variables to properties
-				for key in self.coordinates_mapping:
-					if key in self.variable.group.variables and key not in ['latitude', 'longitude']:
-						if self.coordinates_mapping[key]['map'] == self.coordinates_mapping['latitude']['map']:
-							feature['properties'][key] = self.variable.group.variables[key][fid]
-							
+			for fid, properties in self._feature_properties(mask=mask, propnames=propnames, series=series):
+				feature = {'type':'Feature', 'properties':properties, 'geometry': {'type':'Point', 'coordinates': [float(longitudes[fid]), float(latitudes[fid])]}}
 				features.append(feature)
 				
 			result['features'] = features
@@ -832,15 +1468,432 @@ class Field(object):
 		else:
 			return None
 
-		# Cache result
-		if not self._features:
-			self._features = result
-			
 		return result
+	
+	def _feature_cache_key(self, format, mask=None, propnames=None, series=False):
+		"""
+		Key for the group feature cache, the mask enters the key through a hash of the cells it keeps
+		"""
+		
+		keep = None
+		if self.featuretype in ['Grid', 'GridSeries']:
+			keep = self._feature_mask(mask)
+		
+		if keep is not None:
+			mask_key = (keep.shape, hashlib.sha1(numpy.packbits(keep).tobytes()).hexdigest())
+		else:
+			mask_key = None
+		
+		if propnames:
+			propnames = tuple(propnames)
+		
+		return (format, self.variable, selection_key(self._subset), mask_key, propnames, bool(series))
+	
+	def _cached_features(self, format, mask, propnames, build, series=False):
+		"""
+		Returns the cached feature collection in the given format or builds it with build() and caches it
+		"""
+		
+		cache = self.group.feature_cache
+		key = self._feature_cache_key(format, mask=mask, propnames=propnames, series=series)
+		
+		if key in cache:
+			return cache[key]
+		
+		result = build()
+		if result is not None:
+			if format == 'features':
+				cache.set(key, result, nbytes=_features_nbytes(result))
+			else:
+				cache[key] = result
+		
+		return result
+	
+	def _feature_properties(self, mask=None, propnames=None, series=False):
+		"""
+		Generator over the features of the field yielding (position, properties) tuples where position is the (y, x) grid cell 
+		for grids and the point index for points.  Masked grid cells are skipped.  Data values are read in a single block and 
+		attached by indexing, only the leading components propnames needs are read unless series is set and each feature's 
+		values are only converted to python values as it is visited.  See features for the mask, propnames and series 
+		parameters.
+		"""
+		
+		featuretype = self.featuretype
+		
+		# Read the values we need in one go
+		values = None
+		if series:
+			values = self._feature_values()
+		elif propnames:
+			values = self._feature_values(components=len(propnames))
+		
+		def attach(properties, fid):
+			if values is None:
+				return properties
+			row = numpy.ma.filled(values[fid].astype(object), None).tolist()
+			if propnames:
+				for i, name in enumerate(propnames):
+					properties[name] = row[i]
+			if series:
+				properties['values'] = row
+			return properties
+		
+		if featuretype in ['Grid', 'GridSeries']:
+			
+			shape = self.latitudes.shape
+			
+			keep = self._feature_mask(mask)
+			if keep is None:
+				keep = numpy.ones(shape, dtype=bool)
+			
+			# Only visit the grid cells that aren't masked
+			ys, xs = numpy.nonzero(keep)
+			
+			for y, x in zip(ys.tolist(), xs.tolist()):
+				fid = x + y * shape[1]
+				yield (y, x), attach({'id':fid}, fid)
+		
+		elif featuretype in ['Point', 'PointSeries']:
+			
+			related = self._related_variables()
+			
+			for fid in range(0, len(self.latitudes)):
+				properties = {'_id':fid}
+				for key, related_values in related.items():
+					properties[key] = related_values[fid]
+				
+				yield fid, attach(properties, fid)
+	
+	def _related_variables(self):
+		"""
+		Returns a dict of the values of point feature variables (other than latitude and longitude) that share the latitude 
+		mapping, such as station names or elevations, read once through the coordinate cache
+		"""
+		
+		related = {}
+		for key in self.coordinates_mapping:
+			if key in self.variable.group.variables and key not in ['latitude', 'longitude']:
+				if self.coordinates_mapping[key]['map'] == self.coordinates_mapping['latitude']['map']:
+					related[key] = self.read_coordinates(self.variable.group.variables[key])
+		
+		return related
+	
+	def _feature_mask(self, mask):
+		"""
+		Returns a boolean (y, x) array flagging the grid cells that are kept by the mask field (cells where the mask is
+		not less than 0.5) or None if there is no mask.  The mask field needn't be congruent, each grid point takes the
+		mask value of the nearest mask grid point found through the mask fields cached spatial index.  The mask is read in 
+		one go, taking the first index of any dimensions of the mask other than its grid dimensions.  Results are cached
+		in the group coordinate cache together with a weak reference to the mask variable, which is checked on lookup as the
+		id of a variable in the key can be reused once it has been garbage collected.
+		"""
+		
+		if not mask:
+			return None
+		
+		grid_dims = self._grid_dims()[-2:]
+		mask_dims = mask._grid_dims()[-2:]
+		
+		key = ('mask', id(mask.variable), selection_key(mask._subset),
+			self.latitude_variable, self.longitude_variable, selection_key([self._subset[dim] for dim in grid_dims]))
+		
+		cache = self.group.coordinate_cache
+		if key in cache:
+			variable, keep = cache[key]
+			if variable() is mask.variable:
+				return keep
+		
+		values = numpy.ma.asarray(mask[tuple([slice(None) if dim in mask_dims else 0 for dim in range(len(mask.shape))])])
+		keep = ~numpy.ma.filled(values < 0.5, False)
+		
+		same_grid = (mask.variable.group is self.group and 
+			mask.latitude_variable is self.latitude_variable and mask.longitude_variable is self.longitude_variable and
+			[mask._subset[dim] for dim in mask_dims] == [self._subset[dim] for dim in grid_dims])
+		
+		# Look up the nearest mask grid point of every grid point unless the grids are the same
+		if not same_grid:
+			latitudes, longitudes = self.latlons()
+			indices, distances = mask.spatial_index().query(latitudes.ravel(), longitudes.ravel())
+			
+			# Spatial index indices are against the whole mask grid so map them into the mask subset
+			found = numpy.isfinite(distances)
+			relative = []
+			for index, dim in zip(indices[-2:], mask_dims):
+				start, stop, step = mask._subset[dim].indices(mask.variable.shape[dim])
+				offset = index - start
+				found &= (offset % step == 0) & (offset // step >= 0) & (offset // step < mask.shape[dim])
+				relative.append(numpy.where(found, offset // step, 0))
+			
+			keep = (keep[tuple(relative)] & found).reshape(latitudes.shape)
+		
+		keep.setflags(write=False)
+		cache[key] = (weakref.ref(mask.variable), keep)
+		
+		return keep
+	
+	def _feature_values(self, components=None):
+		"""
+		Reads the data values of the current subset in one go and returns them as a masked (nfeatures, ncomponents) array, 
+		one row per grid cell (in id order) or point holding the flattened values of all the other dimensions.  If components
+		is given only the leading components are returned and only as much of the outermost other dimension as they need is
+		read.
+		"""
+		
+		shape = self.shape
+		
+		if self.featuretype in ['Grid', 'GridSeries']:
+			dims = self._grid_dims()[-2:]
+		else:
+			dims = list(self.coordinates_mapping['latitude']['map'][:1])
+		
+		others = [dim for dim in range(len(shape)) if dim not in dims]
+		
+		selection = [slice(None)]*len(shape)
+		if components is not None and others:
+			inner = 1
+			for dim in others[1:]:
+				inner *= shape[dim]
+			selection[others[0]] = slice(0, max(1, -(-components // max(inner, 1))))
+		
+		data = numpy.ma.asarray(self[tuple(selection)])
+		data = data.transpose(others + dims)
+		
+		features = 1
+		for dim in dims:
+			features *= shape[dim]
+		
+		values = data.reshape((-1, features)).transpose()
+		
+		if components is not None:
+			values = values[:,:components]
+		
+		return values
+	
+	def asBinary(self, outfile=None, mask=None, propnames=None):
+		"""
+		Encode the field feature collection in the compact columnar binary layout described in pycdm.featurefunctions.  
+		Coordinates, ring offsets and property columns are produced directly from the coordinate and data arrays.  Grid cells
+		become single ring polygons with five vertices and points single vertices.  Data values are stored in a 'value' column 
+		holding the flattened values of all other dimensions (for example the time series) for each feature or, if propnames
+		is given, as one single component column per name taken from successive flattened values.  Point features also get a 
+		column for each related variable.  If a file like outfile is given the encoding is written into it, otherwise the 
+		encoded string is returned.  Encodings are cached by the group like features.
+		"""
+		
+		result = self._cached_features('binary', mask, propnames, lambda: self._build_binary(mask=mask, propnames=propnames))
+		
+		if outfile is None:
+			return result
+		elif result is not None:
+			outfile.write(result)
+	
+	def _build_binary(self, mask=None, propnames=None):
+		"""
+		Builds the binary encoded feature collection string, see asBinary
+		"""
+		
+		featuretype = self.featuretype
+		
+		if featuretype in ['Grid', 'GridSeries']:
+			
+			corner_lats, corner_lons = self.cell_bounds()
+			nx = corner_lats.shape[1] - 1
+			
+			keep = self._feature_mask(mask)
+			if keep is None:
+				keep = numpy.ones((corner_lats.shape[0] - 1, nx), dtype=bool)
+			
+			ys, xs = numpy.nonzero(keep)
+			ids = xs + ys * nx
+			
+			# Ring of cell corners in the same order as the geojson features, closed back on the first corner.  This runs
+			# clockwise in longitude/latitude space for ascending latitudes and longitudes
+			ring_ys = ys[:,numpy.newaxis] + numpy.array([0, 1, 1, 0, 0])
+			ring_xs = xs[:,numpy.newaxis] + numpy.array([0, 0, 1, 1, 0])
+			
+			coordinates = numpy.dstack((corner_lons[ring_ys, ring_xs], corner_lats[ring_ys, ring_xs]))
+			ring_offsets = numpy.arange(len(ids) + 1) * 5
+			geometry = featurefunctions.POLYGON
+			columns = []
+		
+		elif featuretype in ['Point', 'PointSeries']:
+			
+			latitudes, longitudes = self.latlons()
+			
+			ids = numpy.arange(len(latitudes))
+			coordinates = numpy.column_stack((longitudes, latitudes))
+			ring_offsets = []
+			geometry = featurefunctions.POINT
+			
+			columns = sorted(self._related_variables().items())
+		
+		else:
+			return None
+		
+		if propnames:
+			values = self._feature_values(components=len(propnames))[ids]
+		else:
+			values = self._feature_values()[ids]
+		
+		if propnames:
+			columns.extend([(name, values[:,i]) for i, name in enumerate(propnames)])
+		else:
+			columns.append(('value', values))
+		
+		return ''.join(featurefunctions.encode_features(geometry, coordinates, ring_offsets, ids, columns))
+	
+	def iterjson(self, mask=None, propnames=None, series=False):
+		"""
+		Generator over successive pieces of the GeoJSON text for the field feature collection (see features).  Features are 
+		encoded one at a time with coordinates formatted straight from the cell corner (or point) arrays, so memory use stays
+		bounded however large the grid is.
+		"""
+		
+		featuretype = self.featuretype
+		if featuretype not in ['Grid', 'GridSeries', 'Point', 'PointSeries']:
+			return
+		
+		yield '{"type": "FeatureCollection", "features": ['
+		
+		separator = ''
+		
+		if featuretype in ['Grid', 'GridSeries']:
+			
+			corner_lats, corner_lons = self.cell_bounds()
+			row = None
+			
+			for (y, x), properties in self._feature_properties(mask=mask, propnames=propnames, series=series):
+				
+				# Convert corner rows to python floats as we get to them
+				if y != row:
+					row = y
+					lons0, lats0 = corner_lons[y].tolist(), corner_lats[y].tolist()
+					lons1, lats1 = corner_lons[y+1].tolist(), corner_lats[y+1].tolist()
+				
+				ring = '[[%s, %s], [%s, %s], [%s, %s], [%s, %s], [%s, %s]]' % tuple(map(_json_float, (lons0[x], lats0[x], lons1[x], lats1[x], lons1[x+1], lats1[x+1], lons0[x+1], lats0[x+1], lons0[x], lats0[x])))
+				yield '%s{"type": "Feature", "properties": %s, "geometry": {"type": "Polygon", "coordinates": [%s]}}' % (separator, json.dumps(properties, default=_json_default), ring)
+				separator = ', '
+		
+		else:
+			
+			longitudes = numpy.asarray(self.longitudes, dtype=numpy.float64).tolist()
+			latitudes = numpy.asarray(self.latitudes, dtype=numpy.float64).tolist()
+			
+			for fid, properties in self._feature_properties(mask=mask, propnames=propnames, series=series):
+				yield '%s{"type": "Feature", "properties": %s, "geometry": {"type": "Point", "coordinates": [%s, %s]}}' % (separator, json.dumps(properties, default=_json_default), _json_float(longitudes[fid]), _json_float(latitudes[fid]))
+				separator = ', '
+		
+		yield ']}'
+
+	def asJSON(self, outfile=None, mask=None, propnames=None, series=False):
+		"""
+		Encode the field feature collection as GeoJSON.  If a file like outfile is given the GeoJSON is streamed into it feature
+		by feature, otherwise the GeoJSON string is returned.  Returned strings are cached by the group like features, streamed
+		output is only written from the cache if it is already there.
+		"""
+		
+		if outfile is None:
+			build = lambda: ''.join(self.iterjson(mask=mask, propnames=propnames, series=series))
+			return self._cached_features('json', mask, propnames, build, series=series)
+		
+		key = self._feature_cache_key('json', mask=mask, propnames=propnames, series=series)
+		if key in self.group.feature_cache:
+			outfile.write(self.group.feature_cache[key])
+			return
+		
+		for chunk in self.iterjson(mask=mask, propnames=propnames, series=series):
+			outfile.write(chunk)
+
+
+def _features_nbytes(collection):
+	"""
+	Estimate of the memory held by a feature collection dict, from the size of its first feature rather than a walk over
+	every feature
+	"""
+	
+	features = collection['features']
+	if not features:
+		return LRUCache.sizeof(collection)
+	
+	return LRUCache.sizeof(dict(collection, features=[])) + sys.getsizeof(features) + len(features) * LRUCache.sizeof(features[0])
+
+
+def _aggregate_tile(task):
+	"""
+	Worker process side of Field.time_aggregation, reopens the dataset and aggregates a tile (an absolute subset) of the
+	variable
+	"""
+	
+	dataset_class, uri, name, subset, starts, stops, reduction, time_dim, mask_less, mask_greater, block_size = task
+	
+	dataset = dataset_class(uri=uri)
+	field = Field(dataset.root.variables[name])._view(subset)
+	
+	if isinstance(reduction, list):
+		statistic = reduction
+	else:
+		statistic = statistic_name(reduction)
+	
+	return field._aggregate_blocks(starts, stops, reduction, statistic, time_dim, mask_less, mask_greater, block_size)
+
+
+def _broadcast(values, shape):
+	"""
+	Broadcast a (possibly masked) array to shape as a read only view without copying the data or mask
+	"""
+	
+	data = numpy.broadcast_to(numpy.ma.getdata(values), shape)
+	
+	if numpy.ma.getmask(values) is numpy.ma.nomask:
+		return numpy.ma.MaskedArray(data, copy=False)
+	else:
+		return numpy.ma.MaskedArray(data, mask=numpy.broadcast_to(numpy.ma.getmaskarray(values), shape), copy=False)
 
 
-	def asJSON(self):
-		print self.features()
-		return json.dumps(self.features())
+def _json_float(value):
+	"""
+	Format a float as json.dumps does, including NaN and Infinity for non finite values
+	"""
+	
+	if value != value or value in (numpy.inf, -numpy.inf):
+		return json.dumps(value)
+	else:
+		return repr(value)
 
+
+def _json_default(value):
+	"""
+	Encode numpy values that the json module doesn't handle
+	"""
 	
+	if value is numpy.ma.masked:
+		return None
+	elif isinstance(value, numpy.ndarray):
+		return numpy.ma.filled(numpy.ma.asarray(value).astype(object), None).tolist()
+	elif isinstance(value, numpy.generic):
+		return value.item()
+	else:
+		raise TypeError("{} is not JSON serializable".format(repr(value)))
+
+
+class _ViewIndexer(object):
+	"""
+	Helper behind Field.view that turns index expressions into field views
+	"""
+	
+	def __init__(self, field):
+		self.field = field
+	
+	def __getitem__(self, slices):
+		
+		slices = expand_key(slices, len(self.field._subset))
+		
+		subset = []
+		for parent, child, length in zip(self.field._subset, slices, self.field.variable.shape):
+			if isinstance(child, slice):
+				subset.append(compose_slice(parent, child, length))
+			else:
+				index = compose_index(parent, int(child), length)
+				subset.append(slice(index, index+1))
+		
+		return self.field._view(subset)
@@ -1,16 +1,42 @@
+import collections
+import weakref
+
 from attribute import AttributeList
 from dimension import Dimension
 
 from field import Field
+from cache import LRUCache
+
+from ..standards import cf
+
+# Default byte budget for the cache of coordinate variable values shared by a groups fields
+COORDINATE_CACHE_SIZE = 256*1024*1024
+
+# Default limits for the cache of encoded feature collections shared by a groups fields
+FEATURE_CACHE_ITEMS = 32
+FEATURE_CACHE_SIZE = 64*1024*1024
+
+# Default byte budget for the cache of interpolation weights shared by a groups fields
+INTERPOLATION_CACHE_SIZE = 64*1024*1024
+
+# Default byte budget for the cache of spatial indices shared by a groups fields
+SPATIAL_INDEX_CACHE_SIZE = 256*1024*1024
 
 class Group(object):
 	
-	def __init__(self, name='', dataset=None, parent=None, dimensions=[], attributes={}, variables={}):
+	def __init__(self, name='', dataset=None, parent=None, dimensions=[], attributes={}, variables={}, coordinate_cache_size=COORDINATE_CACHE_SIZE, feature_cache_items=FEATURE_CACHE_ITEMS, interpolation_cache_size=INTERPOLATION_CACHE_SIZE, spatial_index_cache_size=SPATIAL_INDEX_CACHE_SIZE):
 		"""
 		A Group is a container for Attributes, Dimensions, EnumTypedefs, Variables, and nested 
 		Groups. The Groups in a Dataset form a hierarchical tree, like directories on a disk.
 		There is always at least one Group in a Dataset, the root Group, whose name is the empty string.
 		
+		Coordinate variable values read by the groups fields are cached in a least recently used cache
+		limited to coordinate_cache_size bytes so fields sharing a grid only read coordinates once.  Feature
+		collections built by the fields are kept in a similar cache of at most feature_cache_items entries and
+		FEATURE_CACHE_SIZE bytes, interpolation weights in one of interpolation_cache_size bytes and spatial
+		indices in one of spatial_index_cache_size bytes.  Cache entries are keyed on the variable instances
+		rather than their names so replacing a variable in the group never serves values of the old one.
+		
 		>>> print Group()
 		<CDM Group: [root]>
 		>>> group = Group()
@@ -34,6 +60,18 @@ class Group(object):
 		
 		self.children = []
 		
+		# Coordinate variable values shared by all the fields in the group
+		self.coordinate_cache = LRUCache(max_bytes=coordinate_cache_size)
+		
+		# Feature collections keyed by variable, subset, mask, property names and output format
+		self.feature_cache = LRUCache(max_bytes=FEATURE_CACHE_SIZE, max_items=feature_cache_items)
+		
+		# Spatial indices are shared between all fields using the same coordinate variables
+		self._spatial_indices = LRUCache(max_bytes=spatial_index_cache_size)
+		
+		# Interpolation weights are shared the same way, keyed by coordinate variables and target points
+		self._interpolation_weights = LRUCache(max_bytes=interpolation_cache_size)
+		
 		# If there is no parent then this must be a root group which must have an empty 
 		# string as the name
 		if (not parent or name == ''):
@@ -50,26 +88,28 @@ class Group(object):
 	def make_fields(self):
 		"""
 		Identify spatial fields within the group and collate variables with the same 
-		spatial fields into the same group field.
+		spatial fields into the same group field.  Fields are only built when they are
+		first accessed through the variable_fields mapping.
 		"""
 		
-		self.variable_fields = {}
+		self.variable_fields = FieldMapping(self)
 		
-		for varname, variable in self.variables.items():
-			#print varname, variable
-			field = Field(variable)
-			#print field.variables
-			#print field.coordinates_mapping
-			self.variable_fields[field.variables[0].name] = field
+		# Coordinate types of the groups variables, shared by all the fields and dropped with the variables
+		self._coordinate_types = weakref.WeakKeyDictionary()
 		
-		#self.fields = []
-		#done = 0
-		#for i in range(0, len(fields)):
-			
-			
-			
-			
+		# Calendar indices of the groups time variables, see Field.calendar_index
+		self._calendar_indices = weakref.WeakKeyDictionary()
+	
+	def coordinate_type(self, variable):
+		"""
+		Returns the coordinate (latitude, longitude, level or time) the variable holds values of, going by 
+		the CF standard rules, or None.  The classification is only done once per variable.
+		"""
 		
+		if variable not in self._coordinate_types:
+			self._coordinate_types[variable] = cf.classify_variable(variable)
+		
+		return self._coordinate_types[variable]
 			
 	@property
 	def dimensions(self):
@@ -114,4 +154,33 @@ class Group(object):
 			return "<CDM %s: %s>" % (self.__class__.__name__, '[root]')
 		else:
 			return "<CDM %s: %s>" % (self.__class__.__name__, self.name)
-			
+
+
+class FieldMapping(collections.Mapping):
+	"""
+	A read only mapping of variable names to the Field of each variable in a group.  Fields
+	are built on first access and then kept.
+	"""
+	
+	def __init__(self, group):
+		self.group = group
+		self._fields = {}
+	
+	def __getitem__(self, name):
+		
+		variable = self.group.variables[name]
+		
+		# Rebuild if the group variable has been replaced
+		if name not in self._fields or self._fields[name].variable is not variable:
+			self._fields[name] = Field(variable)
+		
+		return self._fields[name]
+	
+	def __iter__(self):
+		return iter(self.group.variables)
+	
+	def __len__(self):
+		return len(self.group.variables)
+	
+	def __repr__(self):
+		return "<CDM %s: %d variables, %d fields built>" % (self.__class__.__name__, len(self), len(self._fields))
@@ -11,7 +11,6 @@ import numpy
 
 from pycdm import Group
 from pycdm import Variable
-from pycdm import Field
 from pycdm import Dataset
 from pycdm import Dimension
 
@@ -123,7 +122,7 @@ class netCDF4Dataset(Dataset):
 		# Figure out the full set of coordinates variables
 		coordinates_variables = set([])
 		for name, variable in dataset.root.variables.items():
-			field = Field(variable)
+			field = dataset.root.variable_fields[name]
 			names = [v.name for v in field.coordinates_variables]
 			coordinates_variables = coordinates_variables.union(names)
 		
@@ -145,18 +144,13 @@ class netCDF4Dataset(Dataset):
 
 		#	print name, variable
 
-			field = Field(variable)
+			field = dataset.root.variable_fields[name]
 
 			# Sort out time subsetting
-			realtimes = field.realtimes
+			index = field.calendar_index()
 
-			if type(realtimes) == numpy.ndarray:
-				if start == None or start < realtimes[0]:
-					start = realtimes[0]
-				if end == None or end > realtimes[-1]:
-					end = realtimes[-1]
-
-				time_select = numpy.where(numpy.logical_and(realtimes >= start,realtimes <= end))[0]
+			if index is not None:
+				time_select = index.between(start, end)
 				#print time_select
 
 				data_slice = [slice(None)]*len(variable.shape)
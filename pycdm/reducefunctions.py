@@ -0,0 +1,421 @@
+"""
+Grouped reductions along an axis.  Groups are (possibly overlapping or empty) index windows along the axis, given as
+slices such as those returned by time_slices, and all groups are reduced in a single vectorised pass using cumulative
+sums (sum, mean, count, std) or ufunc reduceat (min, max).
+"""
+import numpy as np
+
+# Reductions the grouped engine implements
+STATISTICS = ['sum', 'mean', 'min', 'max', 'count', 'std']
+
+# Sums of squares are accumulated in extended precision (where the platform has it) so that differences of running
+# sums keep the spread of short windows in long series
+EXTENDED = np.longdouble
+
+# Functions that are recognised as one of the STATISTICS
+_functions = {np.sum:'sum', np.ma.sum:'sum', np.mean:'mean', np.ma.mean:'mean', np.amin:'min', np.ma.min:'min',
+	np.amax:'max', np.ma.max:'max', np.ma.count:'count', np.std:'std', np.ma.std:'std'}
+
+
+def statistic_name(func):
+	"""
+	Returns the name of the statistic func computes if it is one of STATISTICS (either by name or as one of the
+	equivalent numpy functions), otherwise None
+	"""
+
+	if isinstance(func, basestring):
+		if func in STATISTICS:
+			return func
+		else:
+			return None
+
+	try:
+		return _functions.get(func)
+	except TypeError:
+		return None
+
+
+def prepare(data, mask_less=np.nan, mask_greater=np.nan):
+	"""
+	Split (masked) data into a float64 array of values (zero where invalid) and a boolean array flagging the valid values,
+	masking values less than mask_less and greater than mask_greater unless these are NaN
+	"""
+
+	values = np.ma.getdata(data).astype(np.float64)
+	valid = ~np.ma.getmaskarray(data)
+
+	if not np.isnan(mask_less):
+		valid &= ~(values < mask_less)
+
+	if not np.isnan(mask_greater):
+		valid &= ~(values > mask_greater)
+
+	values[~valid] = 0.0
+
+	return values, valid
+
+
+def window_bounds(slices, length):
+	"""
+	Returns arrays of normalised start and stop indices of the windows given by slices into an axis of the given length.
+	Steps are ignored.
+	"""
+
+	bounds = np.array([s.indices(length)[:2] for s in slices], dtype=np.int64).reshape((-1, 2))
+	return bounds[:,0], np.maximum(bounds[:,0], bounds[:,1])
+
+
+def window_blocks(starts, stops, block_size=None):
+	"""
+	Generator over blocks of windows (given by arrays of start and stop indices) yielding (span, windows) tuples where 
+	span is a slice covering all the windows in the block and windows is an array of the indices of those windows.  
+	Windows are taken in order of their start and a block is closed before its span would exceed block_size, so blocks
+	always hold whole windows and only a single window longer than block_size can make a longer span.  Without a 
+	block_size all the windows are in a single block.
+	"""
+
+	order = np.argsort(starts, kind='mergesort')
+
+	if not len(order):
+		return
+
+	if block_size is None:
+		yield slice(int(starts.min()), int(stops.max())), order
+		return
+
+	first = 0
+	block_start, block_stop = starts[order[0]], stops[order[0]]
+
+	for position in range(1, len(order)):
+		window = order[position]
+		if max(block_stop, stops[window]) - block_start > block_size:
+			yield slice(int(block_start), int(block_stop)), order[first:position]
+			first = position
+			block_start, block_stop = starts[window], stops[window]
+		else:
+			block_stop = max(block_stop, stops[window])
+
+	yield slice(int(block_start), int(block_stop)), order[first:]
+
+
+def _window_sums(values, starts, stops):
+	"""
+	Sums of values (along the first axis) over each window using differences of the cumulative sum, accumulated in 
+	float64 or in EXTENDED precision for EXTENDED values
+
+	>>> _window_sums(np.arange(10.0), np.array([0, 2, 5, 9]), np.array([3, 9, 5, 10]))
+	array([ 3., 35.,  0.,  9.])
+	"""
+
+	cumulative = np.zeros((values.shape[0] + 1,) + values.shape[1:], dtype=EXTENDED if values.dtype == EXTENDED else np.float64)
+	np.cumsum(values, axis=0, out=cumulative[1:])
+
+	return cumulative[stops] - cumulative[starts]
+
+
+def _window_extreme(values, valid, starts, stops, ufunc, fill):
+	"""
+	Minimum or maximum (by ufunc) of the valid values (along the first axis) over each window, computed with reduceat on
+	interleaved start and stop indices so that windows can overlap.  Empty windows give fill.
+
+	>>> values = np.array([3.0, 1.0, 4.0, 1.0, 5.0, 9.0])
+	>>> valid = np.array([True, False, True, True, True, True])
+	>>> _window_extreme(values, valid, np.array([0, 1, 3, 6]), np.array([2, 5, 6, 6]), np.minimum, np.inf)
+	array([ 3.,  1.,  1., inf])
+	"""
+
+	filled = np.where(valid, values, fill)
+
+	# Pad so that a stop at the end of the axis is a valid reduceat index
+	padded = np.concatenate((filled, np.full((1,) + filled.shape[1:], fill)), axis=0)
+
+	indices = np.column_stack((starts, stops)).ravel()
+	result = ufunc.reduceat(padded, indices, axis=0)[::2]
+
+	return np.where((stops > starts).reshape((-1,) + (1,)*(values.ndim - 1)), result, fill)
+
+
+def grouped_reduce(data, slices, statistic, axis=0, mask_less=np.nan, mask_greater=np.nan):
+	"""
+	Reduce (masked) data over each of the windows given by slices along axis with one of STATISTICS.  Returns a masked
+	float64 array with the axis replaced by one entry per window.  Masked values (and values less than mask_less or greater
+	than mask_greater) are ignored.  Windows without any valid values are masked, as are windows holding NaN values 
+	(numpy.ma.mean masks these as invalid results too).  std is the population standard deviation (ddof=0), computed from sums of
+	values shifted by the mean of each series (accumulated in EXTENDED precision) to avoid cancellation.
+
+	The results match reducing each window with numpy.ma, for overlapping, reversed and empty windows alike
+
+	>>> data = np.ma.masked_greater(np.random.RandomState(1).normal(1e4, 1.0, (50, 3, 4)), 1e4 + 1.5)
+	>>> slices = [slice(0, 10), slice(5, 30), slice(20, 21), slice(30, 50), slice(40, 60), slice(12, 12), slice(9, 3)]
+	>>> functions = {'sum': np.ma.sum, 'mean': np.ma.mean, 'min': np.ma.min, 'max': np.ma.max, 'count': np.ma.count, 'std': np.ma.std}
+	>>> for statistic in STATISTICS:
+	...     result = grouped_reduce(data, slices, statistic)
+	...     expected = [functions[statistic](data[s], axis=0) for s in slices[:5]]
+	...     print statistic, np.allclose(result[:5], expected, rtol=1e-9, atol=1e-9), np.ma.getmaskarray(result[5:]).all() or statistic == 'count'
+	sum True True
+	mean True True
+	min True True
+	max True True
+	count True True
+	std True True
+
+	A single value has no spread, and windows without valid values or holding NaN are masked
+
+	>>> grouped_reduce(np.array([1e8, 1e8 + 1, np.nan, 2.0]), [slice(0, 1), slice(0, 2), slice(1, 3), slice(4, 4)], 'std')
+	masked_array(data=[0.0, 0.5, --, --],
+	             mask=[False, False,  True,  True],
+	       fill_value=1e+20)
+	"""
+
+	if statistic not in STATISTICS:
+		raise ValueError('unknown statistic {}'.format(statistic))
+
+	values, valid = prepare(np.ma.asanyarray(data), mask_less=mask_less, mask_greater=mask_greater)
+
+	values = np.moveaxis(values, axis, 0)
+	valid = np.moveaxis(valid, axis, 0)
+
+	starts, stops = window_bounds(slices, values.shape[0])
+
+	# NaN values are excluded from the sums and mask their windows
+	nans = np.isnan(values)
+	values = np.where(nans, 0.0, values)
+
+	counts = _window_sums(valid.astype(np.float64), starts, stops)
+	nan_counts = _window_sums(nans.astype(np.float64), starts, stops)
+
+	if statistic == 'count':
+		result = counts
+
+	elif statistic in ['sum', 'mean']:
+		result = _window_sums(values, starts, stops)
+		if statistic == 'mean':
+			result = result / np.maximum(counts, 1)
+
+	elif statistic == 'std':
+		shift = values.sum(axis=0) / np.maximum(valid.sum(axis=0), 1)
+		shifted = np.where(valid, values.astype(EXTENDED) - shift, 0.0)
+		sums = _window_sums(shifted, starts, stops)
+		squares = _window_sums(shifted * shifted, starts, stops)
+		variance = (squares - sums * sums / np.maximum(counts, 1)) / np.maximum(counts, 1)
+
+		# Differences of cumulative sums carry rounding noise relative to the whole series, treat anything below it as zero
+		noise = 16 * np.finfo(EXTENDED).eps * (shifted * shifted).sum(axis=0) / np.maximum(counts, 1)
+		result = np.sqrt(np.where(variance > noise, variance, 0.0)).astype(np.float64)
+
+	elif statistic == 'min':
+		result = _window_extreme(values, valid, starts, stops, np.minimum, np.inf)
+
+	else:
+		result = _window_extreme(values, valid, starts, stops, np.maximum, -np.inf)
+
+	if statistic != 'count':
+		result = np.ma.masked_where((counts == 0) | (nan_counts > 0), result)
+
+	return np.moveaxis(np.ma.asarray(result), 0, axis)
+
+
+def window_pieces(starts, stops, block_size=None):
+	"""
+	Generator over blocks of windows like window_blocks, except that a window longer than block_size is split over as many 
+	blocks as it takes.  Yields (span, windows, piece_starts, piece_stops) tuples where piece_starts and piece_stops are the
+	parts of the windows inside the span, relative to the start of the span.  The partial results of pieces of the same
+	window can be combined with merge_partials.
+
+	>>> starts, stops = np.array([0, 3, 5]), np.array([3, 5, 15])
+	>>> for span, windows, piece_starts, piece_stops in window_pieces(starts, stops, block_size=4):
+	...     print span, windows, piece_starts, piece_stops
+	slice(0, 3, None) [0] [0] [3]
+	slice(3, 5, None) [1] [0] [2]
+	slice(5, 9, None) [2] [0] [4]
+	slice(9, 13, None) [2] [0] [4]
+	slice(13, 15, None) [2] [0] [2]
+	"""
+
+	for span, windows in window_blocks(starts, stops, block_size):
+
+		if block_size is None or span.stop - span.start <= block_size:
+			yield span, windows, starts[windows] - span.start, stops[windows] - span.start
+			continue
+
+		# A single long window, split it into block_size pieces
+		for first in range(span.start, span.stop, block_size):
+			last = min(first + block_size, span.stop)
+			yield slice(first, last), windows, np.zeros(len(windows), dtype=np.int64), np.full(len(windows), last - first, dtype=np.int64)
+
+
+def grouped_partials(data, starts, stops, axis=0, mask_less=np.nan, mask_greater=np.nan, extremes=True):
+	"""
+	Partial statistics of (masked) data over each of the windows given by arrays of start and stop indices along axis.  Returns 
+	a dict of float64 arrays with the windows along the first axis holding the count of valid values, the count of NaN values, 
+	the mean and M2 (the sum of squared differences from the mean) of the valid values and, if extremes is True, their minimum 
+	and maximum.  Partials of different parts of the same windows can be combined with merge_partials and turned into any 
+	of the STATISTICS with finalise.
+	"""
+
+	values, valid = prepare(np.ma.asanyarray(data), mask_less=mask_less, mask_greater=mask_greater)
+
+	values = np.moveaxis(values, axis, 0)
+	valid = np.moveaxis(valid, axis, 0)
+
+	nans = np.isnan(values)
+	values = np.where(nans, 0.0, values)
+
+	counts = _window_sums(valid.astype(np.float64), starts, stops)
+	divisor = np.maximum(counts, 1)
+
+	# Shift by the mean of each series to avoid cancellation in M2
+	shift = values.sum(axis=0) / np.maximum(valid.sum(axis=0), 1)
+	shifted = np.where(valid, values.astype(EXTENDED) - shift, 0.0)
+	sums = _window_sums(shifted, starts, stops)
+	squares = _window_sums(shifted * shifted, starts, stops)
+
+	m2 = squares - sums * sums / divisor
+	noise = 16 * np.finfo(EXTENDED).eps * (shifted * shifted).sum(axis=0)
+
+	partials = {'count': counts, 'nans': _window_sums(nans.astype(np.float64), starts, stops)}
+	partials['mean'] = (shift + sums / divisor).astype(np.float64)
+	partials['m2'] = np.where(m2 > noise, m2, 0.0).astype(np.float64)
+
+	if extremes:
+		partials['min'] = _window_extreme(values, valid, starts, stops, np.minimum, np.inf)
+		partials['max'] = _window_extreme(values, valid, starts, stops, np.maximum, -np.inf)
+
+	return partials
+
+
+def label_windows(labels, ngroups):
+	"""
+	Returns the order that sorts an array of integer group labels (from 0 to ngroups-1) and arrays of the start and stop 
+	index of each group in that order, so that groups of labelled values can be reduced as windows
+	"""
+
+	labels = np.asarray(labels, dtype=np.int64)
+	order = np.argsort(labels, kind='mergesort')
+	counts = np.bincount(labels, minlength=ngroups)[:ngroups]
+
+	stops = np.cumsum(counts)
+	return order, stops - counts, stops
+
+
+def labelled_partials(data, labels, ngroups, axis=0, mask_less=np.nan, mask_greater=np.nan, extremes=True):
+	"""
+	Partial statistics (see grouped_partials) of (masked) data over each of ngroups groups of values along axis, where
+	labels gives the group of each value along the axis.  The values are reordered so that each group is a window and 
+	reduced in a single pass, groups without values give empty partials.
+
+	>>> data = np.random.RandomState(4).normal(0.0, 1.0, (20, 3))
+	>>> labels = np.arange(20) % 4
+	>>> partials = labelled_partials(data, labels, 5)
+	>>> np.allclose(finalise(partials, 'std')[:4], [data[labels == label].std(axis=0) for label in range(4)])
+	True
+	>>> finalise(partials, 'mean').mask[4].all()
+	True
+	"""
+
+	order, starts, stops = label_windows(labels, ngroups)
+
+	return grouped_partials(np.ma.asanyarray(data).take(order, axis=axis), starts, stops, axis=axis, mask_less=mask_less,
+		mask_greater=mask_greater, extremes=extremes)
+
+
+def empty_partials(shape, extremes=True):
+	"""
+	Partials of empty windows with the given shape (windows first), the identity for merge_partials
+	"""
+
+	partials = {'count': np.zeros(shape), 'nans': np.zeros(shape), 'mean': np.zeros(shape), 'm2': np.zeros(shape)}
+
+	if extremes:
+		partials['min'] = np.full(shape, np.inf)
+		partials['max'] = np.full(shape, -np.inf)
+
+	return partials
+
+
+def merge_partials(a, b):
+	"""
+	Combine the partials of two disjoint parts of the same windows using the parallel (Chan et al.) update of the mean and M2
+
+	Merging the partials of the pieces of windows gives the statistics of the whole windows
+
+	>>> data = np.ma.masked_less(np.random.RandomState(2).normal(280.0, 5.0, (60, 4)), 272.0)
+	>>> starts, stops = np.array([0, 10, 30]), np.array([25, 60, 31])
+	>>> merged = empty_partials((3, 4))
+	>>> for first, last in [(0, 17), (17, 40), (40, 60)]:
+	...     piece_starts = np.clip(starts, first, last) - first
+	...     piece_stops = np.clip(stops, first, last) - first
+	...     merged = merge_partials(merged, grouped_partials(data[first:last], piece_starts, piece_stops))
+	>>> whole = grouped_partials(data, starts, stops)
+	>>> all([np.allclose(merged[key], whole[key], rtol=1e-12) for key in whole])
+	True
+	>>> np.allclose(finalise(merged, 'std'), [np.ma.std(data[start:stop], axis=0) for start, stop in zip(starts, stops)], rtol=1e-12)
+	True
+	"""
+
+	count = a['count'] + b['count']
+	delta = b['mean'] - a['mean']
+	weight = np.where(count > 0, b['count'] / np.maximum(count, 1), 0.0)
+
+	merged = {'count': count, 'nans': a['nans'] + b['nans']}
+	merged['mean'] = a['mean'] + delta * weight
+	merged['m2'] = a['m2'] + b['m2'] + delta * delta * a['count'] * weight
+
+	if 'min' in a:
+		merged['min'] = np.minimum(a['min'], b['min'])
+		merged['max'] = np.maximum(a['max'], b['max'])
+
+	return merged
+
+
+def finalise(partials, statistic):
+	"""
+	Turn partials into one of the STATISTICS, as a masked array masked where grouped_reduce would mask
+
+	>>> data = np.ma.masked_invalid([[1.0, np.nan], [2.0, 3.0], [4.0, np.nan], [np.inf, 5.0]])
+	>>> partials = grouped_partials(data, np.array([0, 1, 2]), np.array([3, 3, 2]))
+	>>> print finalise(partials, 'mean'), finalise(partials, 'count')
+	[[2.3333333333333335 3.0]
+	 [3.0 3.0]
+	 [-- --]] [[3. 1.]
+	 [2. 1.]
+	 [0. 0.]]
+	"""
+
+	counts = partials['count']
+
+	if statistic == 'count':
+		return np.ma.asarray(counts)
+	elif statistic == 'sum':
+		result = partials['mean'] * counts
+	elif statistic == 'mean':
+		result = partials['mean']
+	elif statistic == 'std':
+		result = np.sqrt(partials['m2'] / np.maximum(counts, 1))
+	elif statistic in ['min', 'max']:
+		result = partials[statistic]
+	else:
+		raise ValueError('unknown statistic {}'.format(statistic))
+
+	return np.ma.masked_where((counts == 0) | (partials['nans'] > 0), result)
+
+
+def grouped_statistics(data, slices, statistics, axis=0, mask_less=np.nan, mask_greater=np.nan):
+	"""
+	Compute several of the STATISTICS over each of the windows given by slices along axis in a single pass.  Returns a dict 
+	of masked arrays keyed by statistic, see grouped_reduce.
+
+	>>> data = np.random.RandomState(3).gamma(0.5, 2.0, (30, 2, 3))
+	>>> slices = [slice(0, 7), slice(7, 14), slice(3, 30)]
+	>>> result = grouped_statistics(data, slices, STATISTICS, axis=0)
+	>>> all([np.allclose(result[statistic], grouped_reduce(data, slices, statistic, axis=0), rtol=1e-10) for statistic in STATISTICS])
+	True
+	"""
+
+	data = np.ma.asanyarray(data)
+	starts, stops = window_bounds(slices, data.shape[axis])
+
+	partials = grouped_partials(data, starts, stops, axis=axis, mask_less=mask_less, mask_greater=mask_greater, 
+		extremes=bool(set(statistics) & set(['min', 'max'])))
+
+	return dict([(statistic, np.moveaxis(finalise(partials, statistic), 0, axis)) for statistic in statistics])
@@ -0,0 +1,149 @@
+"""
+Helpers for composing array selections so that selections made on a subset can be expressed against the
+full variable
+"""
+import numpy
+
+
+def slice_length(s, length):
+	"""
+	Returns the number of elements slice s selects from a dimension of the given length
+	"""
+
+	return _count(*s.indices(length))
+
+
+def _count(start, stop, step):
+	"""
+	Number of elements in the range given by normalised (non-negative) start, stop and step values
+	"""
+
+	if step > 0:
+		return max(0, (stop - start + step - 1) // step)
+	else:
+		return max(0, (start - stop - step - 1) // -step)
+
+
+def compose_slice(parent, child, length):
+	"""
+	Compose slice child, taken relative to the elements selected by slice parent from a dimension of the
+	given length, into a single slice relative to the whole dimension.
+
+	>>> compose_slice(slice(10, 20), slice(2, 5), 100)
+	slice(12, 15, 1)
+	>>> compose_slice(slice(10, 20, 2), slice(None, None, -1), 100)
+	slice(18, 8, -2)
+	"""
+
+	start, stop, step = parent.indices(length)
+	child_start, child_stop, child_step = child.indices(slice_length(parent, length))
+
+	count = _count(child_start, child_stop, child_step)
+
+	# Empty selections are all the same
+	if count == 0:
+		return slice(0, 0, 1)
+
+	new_start = start + child_start * step
+	new_step = step * child_step
+	new_stop = new_start + count * new_step
+
+	# A negative stop would wrap around so we stop at the beginning instead
+	if new_stop < 0:
+		new_stop = None
+
+	return slice(new_start, new_stop, new_step)
+
+
+def compose_index(parent, index, length):
+	"""
+	Map integer index, taken relative to the elements selected by slice parent from a dimension of the given
+	length, to an index into the whole dimension.  Negative indices count back from the end of the parent
+	selection.
+	"""
+
+	start, stop, step = parent.indices(length)
+	count = slice_length(parent, length)
+
+	if index < 0:
+		index += count
+
+	if index < 0 or index >= count:
+		raise IndexError('index {} is out of bounds for a selection of length {}'.format(index, count))
+
+	return start + index * step
+
+
+def compose_indices(parent, indices, length):
+	"""
+	Map an integer (or boolean) index array, taken relative to the elements selected by slice parent from a
+	dimension of the given length, to an index array into the whole dimension.
+	"""
+
+	start, stop, step = parent.indices(length)
+	count = slice_length(parent, length)
+
+	indices = numpy.asarray(indices)
+
+	if indices.dtype == bool:
+		if indices.shape != (count,):
+			raise IndexError('boolean index of shape {} does not match selection of length {}'.format(indices.shape, count))
+		indices = numpy.nonzero(indices)[0]
+
+	indices = numpy.where(indices < 0, indices + count, indices)
+
+	if indices.size and (indices.min() < 0 or indices.max() >= count):
+		raise IndexError('index array is out of bounds for a selection of length {}'.format(count))
+
+	return start + indices * step
+
+
+def expand_key(key, ndims):
+	"""
+	Normalise an index expression to a tuple with one entry per dimension, expanding any Ellipsis and padding
+	missing trailing dimensions with full slices
+	"""
+
+	if type(key) != tuple:
+		key = (key,)
+
+	ellipses = [position for position, item in enumerate(key) if item is Ellipsis]
+
+	if len(ellipses) > 1:
+		raise IndexError('an index can only have a single ellipsis')
+	elif ellipses:
+		position = ellipses[0]
+		key = key[:position] + (slice(None),)*(ndims - len(key) + 1) + key[position+1:]
+
+	if len(key) > ndims:
+		raise IndexError('too many indices')
+
+	return key + (slice(None),)*(ndims - len(key))
+
+
+def compose_key(subset, key, shape):
+	"""
+	Compose an index expression key, taken relative to a subset (a list of slices, one per dimension of an 
+	array with the given shape), into a single key against the whole array.  Slices, integers (including 
+	negative indices), steps and integer or boolean index arrays are supported.  Integers drop their dimension 
+	as usual.
+
+	>>> compose_key([slice(10, 20), slice(0, 50, 2)], (-1, [0, 2, 4]), (100, 100))
+	(19, array([0, 4, 8]))
+	"""
+
+	key = expand_key(key, len(subset))
+
+	composed = []
+	for parent, child, length in zip(subset, key, shape):
+
+		if isinstance(child, slice):
+			composed.append(compose_slice(parent, child, length))
+		elif child is None:
+			raise IndexError('new axes are not supported')
+		elif isinstance(child, (int, long, numpy.integer)):
+			composed.append(compose_index(parent, int(child), length))
+		else:
+			composed.append(compose_indices(parent, child, length))
+
+	return tuple(composed)
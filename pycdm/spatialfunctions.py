@@ -0,0 +1,523 @@
+"""
+Search structures used to map coordinate targets (latitude/longitude, time, levels) onto array indices
+"""
+import numpy
+
+# scipy is optional, without it we fall back to a chunked brute force search
+try:
+	from scipy.spatial import cKDTree
+except ImportError:
+	cKDTree = None
+
+# Maximum number of target/point pairs held in memory at once by brute force searches
+CHUNK_SIZE = 10000000
+
+# Mean earth radius in kilometres used for great circle distances
+EARTH_RADIUS = 6371.0
+
+
+def nearest_brute_force(points, targets, k=1):
+	"""
+	Find the nearest of points (npoints, ndims) to each of targets (ntargets, ndims) without a tree.  The
+	search is vectorised over chunks of targets to bound memory use.  Non-finite point coordinates never
+	match.  Returns a tuple of (nearest, distances) arrays, these are (ntargets, k) for k > 1 neighbours.  Like
+	cKDTree, missing neighbours (when k is more than the number of points) have index npoints and infinite distance.
+	"""
+
+	points = numpy.where(numpy.isfinite(points), points, numpy.inf)
+
+	nearest = numpy.full((len(targets), k), len(points), dtype=numpy.intp)
+	distances = numpy.full((len(targets), k), numpy.inf, dtype=numpy.float64)
+	found = min(k, len(points))
+
+	step = max(1, CHUNK_SIZE // max(1, len(points)))
+	for start in range(0, len(targets), step):
+		chunk = targets[start:start+step]
+		d2 = numpy.zeros((len(chunk), len(points)))
+		for dim in range(points.shape[1]):
+			d2 += (chunk[:,dim,numpy.newaxis] - points[numpy.newaxis,:,dim])**2
+
+		if not found:
+			continue
+		elif found == 1:
+			closest = d2.argmin(axis=1)[:,numpy.newaxis]
+		else:
+			closest = numpy.argpartition(d2, found - 1, axis=1)[:,:found]
+
+		rows = numpy.arange(len(chunk))[:,numpy.newaxis]
+		order = d2[rows, closest].argsort(axis=1)
+		nearest[start:start+step,:found] = closest[rows, order]
+		distances[start:start+step,:found] = numpy.sqrt(d2[rows, closest[rows, order]])
+
+	if k == 1:
+		return nearest[:,0], distances[:,0]
+	else:
+		return nearest, distances
+
+
+def monotonic(values):
+	"""
+	Returns 1 if values is a strictly increasing 1D array, -1 if strictly decreasing and 0 otherwise
+	"""
+
+	values = numpy.ma.asarray(values)
+
+	if values.ndim != 1 or numpy.ma.count_masked(values) or values.dtype.kind not in 'iuf':
+		return 0
+
+	differences = numpy.diff(values)
+	if numpy.all(differences > 0):
+		return 1
+	elif numpy.all(differences < 0):
+		return -1
+	else:
+		return 0
+
+
+def nearest_sorted(values, targets, direction=1):
+	"""
+	Find the nearest of monotonic 1D values to each of targets by bisection, direction is 1 for increasing
+	and -1 for decreasing values as returned by monotonic.  Ties resolve to the lower index.  Returns a
+	tuple of (nearest, distances) arrays.
+	"""
+
+	values = numpy.asarray(values, dtype=numpy.float64)
+	targets = numpy.asarray(targets, dtype=numpy.float64)
+	n = len(values)
+
+	if direction < 0:
+		values = values[::-1]
+
+	right = numpy.clip(numpy.searchsorted(values, targets), 0, n-1)
+	left = numpy.clip(right - 1, 0, n-1)
+
+	left_distances = numpy.abs(targets - values[left])
+	right_distances = numpy.abs(values[right] - targets)
+
+	if direction < 0:
+		nearest = numpy.where(right_distances <= left_distances, right, left)
+		distances = numpy.minimum(left_distances, right_distances)
+		nearest = n - 1 - nearest
+	else:
+		nearest = numpy.where(left_distances <= right_distances, left, right)
+		distances = numpy.minimum(left_distances, right_distances)
+
+	return nearest, distances
+
+
+def unit_vectors(latitudes, longitudes):
+	"""
+	Convert latitudes and longitudes in degrees to an (n, 3) array of points on the unit sphere
+	"""
+
+	latitudes = numpy.radians(numpy.asarray(latitudes, dtype=numpy.float64).ravel())
+	longitudes = numpy.radians(numpy.asarray(longitudes, dtype=numpy.float64).ravel())
+
+	return numpy.column_stack((numpy.cos(latitudes) * numpy.cos(longitudes),
+							   numpy.cos(latitudes) * numpy.sin(longitudes),
+							   numpy.sin(latitudes)))
+
+
+def chord2km(chord):
+	"""
+	Convert straight line distances between unit vectors into great circle distances in kilometres
+	"""
+
+	return 2 * EARTH_RADIUS * numpy.arcsin(numpy.minimum(numpy.asarray(chord) / 2, 1.0))
+
+
+def km2chord(distance):
+	"""
+	Convert great circle distances in kilometres into straight line distances between unit vectors
+	"""
+
+	return 2 * numpy.sin(numpy.minimum(numpy.asarray(distance, dtype=numpy.float64) / (2 * EARTH_RADIUS), numpy.pi / 2))
+
+
+class SpatialIndex(object):
+	"""
+	A nearest neighbour index over a pair of latitude and longitude coordinate arrays of the same
+	shape, typically the 2D coordinate variables of a curvilinear (WRF, CORDEX, etc.) grid.  The
+	index is built once and then each lookup costs O(log n) rather than a full scan of the grid.
+
+	By default distances are planar distances in degrees.  With greatcircle=True the coordinates are
+	converted once to 3D unit vectors and distances are great circle distances in kilometres, which
+	stay correct near the poles and across the dateline.
+	"""
+
+	def __init__(self, latitudes, longitudes, greatcircle=False):
+		"""
+		Build the index from latitude and longitude arrays.  Masked or non-finite coordinate values
+		are excluded from the index.
+		"""
+
+		latitudes = numpy.ma.filled(numpy.ma.asarray(latitudes, dtype=numpy.float64), numpy.nan)
+		longitudes = numpy.ma.filled(numpy.ma.asarray(longitudes, dtype=numpy.float64), numpy.nan)
+
+		if latitudes.shape != longitudes.shape:
+			raise ValueError('latitude shape {} and longitude shape {} differ'.format(latitudes.shape, longitudes.shape))
+
+		self.shape = latitudes.shape
+		self.greatcircle = greatcircle
+
+		# Keep track of the flat grid indices of the valid points
+		valid = numpy.logical_and(numpy.isfinite(latitudes), numpy.isfinite(longitudes)).ravel()
+		self._flat = numpy.nonzero(valid)[0]
+		self.points = self._points(latitudes.ravel()[self._flat], longitudes.ravel()[self._flat])
+
+		if cKDTree is not None:
+			self._tree = cKDTree(self.points)
+		else:
+			self._tree = None
+
+	@property
+	def nbytes(self):
+		"""
+		Approximate memory held by the index, the tree keeps its own copy of the points and an array of point indices
+		"""
+
+		nbytes = self.points.nbytes + self._flat.nbytes
+		if self._tree is not None:
+			nbytes += self.points.nbytes + self._tree.indices.nbytes
+
+		return nbytes
+
+	def _points(self, latitudes, longitudes):
+		"""
+		Convert latitudes and longitudes into the space the index searches
+		"""
+
+		if self.greatcircle:
+			return unit_vectors(latitudes, longitudes)
+		else:
+			return numpy.column_stack((numpy.asarray(latitudes, dtype=numpy.float64).ravel(),
+									   numpy.asarray(longitudes, dtype=numpy.float64).ravel()))
+
+	def query(self, latitudes, longitudes, max_distance=numpy.inf, k=1):
+		"""
+		Find the nearest grid points to the target latitudes and longitudes.  Returns a tuple of
+		(indices, distances) where indices is a tuple of index arrays, one per grid dimension, and
+		distances are in degrees, or kilometres for great circle indices.  With k > 1 the k nearest
+		grid points are returned and the arrays are (ntargets, k).
+
+		Targets with no grid point within max_distance get an infinite distance, the tree search can 
+		stop early for these so out of domain targets are rejected cheaply.
+		"""
+
+		targets = self._points(latitudes, longitudes)
+
+		if self.greatcircle:
+			bound = km2chord(max_distance) if numpy.isfinite(max_distance) else numpy.inf
+		else:
+			bound = max_distance
+
+		if self._tree is not None:
+			distances, nearest = self._tree.query(targets, k=k, distance_upper_bound=bound * (1 + 1e-9))
+		else:
+			nearest, distances = nearest_brute_force(self.points, targets, k=k)
+
+		# Misses are flagged with an infinite distance, and with an index past the points when there are fewer points than k
+		missed = numpy.logical_or(numpy.logical_not(distances <= bound), nearest >= len(self._flat))
+		nearest = numpy.where(missed, 0, nearest)
+
+		if self.greatcircle:
+			distances = chord2km(numpy.where(missed, 0, distances))
+
+		distances = numpy.where(missed, numpy.inf, distances)
+
+		return numpy.unravel_index(self._flat[nearest], self.shape), distances
+
+
+def cell_corners(latitudes, longitudes):
+	"""
+	Estimate grid cell corner latitudes and longitudes from 2D arrays of cell centre latitudes and longitudes.
+	Interior corners are the average of the four surrounding centres, edge and outer corners are extrapolated
+	from the neighbouring interior corners.  Returns a tuple of (ny+1, nx+1) corner latitude and longitude arrays.
+	"""
+
+	return (_corners(numpy.asarray(latitudes), False), _corners(numpy.asarray(longitudes), True))
+
+
+def _corners(centres, longitude):
+	"""
+	Corner estimation for one of the coordinates, the outer corners are extrapolated in slightly different ways for
+	latitudes and longitudes
+	"""
+
+	ny, nx = centres.shape
+	corners = numpy.zeros((ny+1, nx+1))
+
+	# Interior grid points
+	corners[1:ny,1:nx] = (centres[1:,:-1] + centres[1:,1:] + centres[:-1,:-1] + centres[:-1,1:])/4
+
+	# Left and right boundaries
+	tmp = (centres[1:,0] + centres[:-1,0])/2
+	corners[1:ny,0] = tmp - (corners[1:ny,1] - tmp)
+	tmp = (centres[1:,nx-1] + centres[:-1,nx-1])/2
+	corners[1:ny,nx] = tmp - (corners[1:ny,nx-1] - tmp)
+
+	# Bottom and top boundaries
+	tmp = (centres[0,1:] + centres[0,:-1])/2
+	corners[0,1:nx] = tmp - (corners[1,1:nx] - tmp)
+	tmp = (centres[ny-1,1:] + centres[ny-1,:-1])/2
+	corners[ny,1:nx] = tmp - (corners[ny-1,1:nx] - tmp)
+
+	# Corners
+	corners[0,0] = centres[0,0] - (corners[1,1] - centres[0,0])
+	corners[ny,nx] = centres[ny-1,nx-1] + (centres[ny-1,nx-1] - corners[ny-1,nx-1])
+
+	if longitude:
+		corners[0,nx] = centres[0,nx-1] + (centres[0,nx-1] - corners[1,nx-1])
+		corners[ny,0] = centres[ny-1,0] - (corners[ny-1,1] - centres[ny-1,0])
+	else:
+		corners[0,nx] = centres[0,nx-1] - (corners[1,nx-1] - centres[0,nx-1])
+		corners[ny,0] = centres[ny-1,0] + (centres[ny-1,0] - corners[ny-1,1])
+
+	return corners
+
+
+def bounds_corners(bounds):
+	"""
+	Convert CF cell bounds into (ny+1, nx+1) corner arrays.  Bounds are either (n, 2) for a 1D coordinate, returned
+	as a 1D array of n+1 edges, or (ny, nx, 4) for a 2D coordinate with vertices ordered counterclockwise starting
+	from the (j-1/2, i-1/2) corner.  Neighbouring cells are assumed to share their corners.
+	"""
+
+	bounds = numpy.asarray(bounds, dtype=numpy.float64)
+
+	if bounds.ndim == 2:
+		return numpy.concatenate((bounds[:,0], bounds[-1:,1]))
+
+	ny, nx = bounds.shape[:2]
+	corners = numpy.empty((ny+1, nx+1))
+	corners[:ny,:nx] = bounds[:,:,0]
+	corners[:ny,nx] = bounds[:,-1,1]
+	corners[ny,:nx] = bounds[-1,:,3]
+	corners[ny,nx] = bounds[-1,-1,2]
+
+	return corners
+
+
+class PointWeights(object):
+	"""
+	Interpolation stencils and weights for a set of target points on a grid.  Each target point has k
+	stencil grid points given by indices (a tuple of (npoints, k) index arrays, one per grid dimension)
+	and weights (npoints, k).  Target points that can't be interpolated have all zero weights.  Once
+	built the weights can be applied to any number of time steps and variables sharing the grid.
+	"""
+
+	def __init__(self, indices, weights):
+
+		self.indices = tuple([numpy.asarray(index, dtype=numpy.intp) for index in indices])
+		self.weights = numpy.asarray(weights, dtype=numpy.float64)
+
+	@property
+	def nbytes(self):
+		"""
+		Memory held by the indices and weights
+		"""
+
+		return sum([index.nbytes for index in self.indices]) + self.weights.nbytes
+
+	@property
+	def bounds(self):
+		"""
+		Returns a list of (start, stop) tuples for each grid dimension covering all stencil points
+		"""
+
+		return [(int(index.min()), int(index.max()) + 1) for index in self.indices]
+
+	def apply(self, values, offset=None):
+		"""
+		Interpolate values whose trailing dimensions are the grid dimensions.  The offset gives the grid 
+		index of values[...,0,0] when values only holds a block of the grid, such as one described by
+		bounds.  Masked values are left out of the weighting.  Returns a masked array with the grid 
+		dimensions replaced by a trailing points dimension.
+		"""
+
+		if offset is None:
+			offset = [0]*len(self.indices)
+
+		selection = tuple([index - start for index, start in zip(self.indices, offset)])
+		gathered = numpy.ma.asarray(values)[(Ellipsis,) + selection]
+
+		weights = numpy.where(numpy.ma.getmaskarray(gathered), 0.0, self.weights)
+		total = weights.sum(axis=-1)
+
+		result = (numpy.ma.filled(gathered, 0) * weights).sum(axis=-1) / numpy.where(total > 0, total, 1.0)
+		return numpy.ma.masked_where(total <= 0, result)
+
+
+def bracket(values, targets):
+	"""
+	Find the grid interval of monotonic 1D values containing each target.  Returns a tuple of (lower, fraction,
+	inside) arrays where lower is the lower index of the interval, fraction the position of the target from 
+	values[lower] towards values[lower+1] and inside flags targets within the range of values.
+	"""
+
+	values = numpy.asarray(values, dtype=numpy.float64)
+	targets = numpy.asarray(targets, dtype=numpy.float64)
+	n = len(values)
+
+	direction = monotonic(values)
+	if not direction or n < 2:
+		raise ValueError('coordinate values are not monotonic')
+
+	if direction < 0:
+		values = values[::-1]
+
+	lower = numpy.clip(numpy.searchsorted(values, targets) - 1, 0, n-2)
+	fraction = (targets - values[lower]) / (values[lower+1] - values[lower])
+	inside = numpy.logical_and(fraction >= 0, fraction <= 1)
+
+	if direction < 0:
+		lower = n - 2 - lower
+		fraction = 1 - fraction
+
+	return lower, fraction, inside
+
+
+def periodic(longitudes):
+	"""
+	Do monotonic, regularly spaced 1D longitudes go all the way around the globe, so that the last longitude is
+	followed by the first one again (for example 0 to 359 or -180 to 179 in 1 degree steps)
+
+	>>> periodic(numpy.arange(0, 360, 2.5)), periodic(numpy.arange(-180, 180, 1.0)), periodic(numpy.arange(10, 40, 1.0))
+	(True, True, False)
+	"""
+
+	longitudes = numpy.asarray(longitudes, dtype=numpy.float64)
+
+	if len(longitudes) < 2:
+		return False
+
+	step = longitudes[1] - longitudes[0]
+	return bool(step != 0 and abs(abs(longitudes[-1] - longitudes[0] + step) - 360.0) < 1e-3 * abs(step))
+
+
+def bilinear_rectilinear(latitudes, longitudes, target_latitudes, target_longitudes):
+	"""
+	Bilinear interpolation PointWeights on a rectilinear grid defined by 1D latitudes and longitudes.  Target 
+	longitudes are taken modulo 360 into the range of the grid longitudes, so -180 to 180 targets work on 0 to 360 
+	grids and the other way round.  On periodic (global) grids targets between the last and the first longitude 
+	are interpolated across the wrap.
+	"""
+
+	longitudes = numpy.asarray(longitudes, dtype=numpy.float64)
+	target_longitudes = numpy.ravel(target_longitudes).astype(numpy.float64)
+
+	west = numpy.nanmin(longitudes)
+	target_longitudes = west + numpy.mod(target_longitudes - west, 360.0)
+
+	wrap = None
+	if periodic(longitudes):
+		wrap = len(longitudes)
+		longitudes = numpy.append(longitudes, longitudes[0] + numpy.sign(longitudes[1] - longitudes[0]) * 360.0)
+
+	y, ty, inside_y = bracket(latitudes, numpy.ravel(target_latitudes))
+	x, tx, inside_x = bracket(longitudes, target_longitudes)
+
+	return _bilinear(y, x, ty, tx, numpy.logical_and(inside_y, inside_x), wrap=wrap)
+
+
+def bilinear_curvilinear(latitudes, longitudes, index, target_latitudes, target_longitudes, iterations=20):
+	"""
+	Bilinear interpolation PointWeights on a curvilinear grid defined by 2D latitudes and longitudes.  The
+	nearest grid point is found through the (planar) spatial index and the (s, t) position of the target
+	within each of the four surrounding cells is found by Newton iteration of the inverse bilinear mapping.  
+	The first cell containing the target is used, targets outside all of them get zero weights.  Cell corner 
+	longitudes are unwrapped to within 180 degrees of the target so cells crossing the dateline or the prime 
+	meridian work, but the seam between the last and first columns of a global curvilinear grid isn't a cell 
+	so targets in it get zero weights too.
+	"""
+
+	latitudes = numpy.asarray(latitudes, dtype=numpy.float64)
+	longitudes = numpy.asarray(longitudes, dtype=numpy.float64)
+	target_latitudes = numpy.ravel(target_latitudes).astype(numpy.float64)[:,numpy.newaxis]
+	target_longitudes = numpy.ravel(target_longitudes).astype(numpy.float64)[:,numpy.newaxis]
+	ny, nx = latitudes.shape
+
+	(yn, xn), distances = index.query(target_latitudes, target_longitudes)
+
+	# Lower left corners of the four candidate cells around the nearest grid point
+	y = numpy.clip(yn[:,numpy.newaxis] + numpy.array([-1, -1, 0, 0]), 0, ny-2)
+	x = numpy.clip(xn[:,numpy.newaxis] + numpy.array([-1, 0, -1, 0]), 0, nx-2)
+
+	corners = []
+	for dy, dx in [(0, 0), (0, 1), (1, 0), (1, 1)]:
+		corner_longitudes = longitudes[y+dy, x+dx]
+		corner_longitudes = corner_longitudes + 360.0 * numpy.round((target_longitudes - corner_longitudes) / 360.0)
+		corners.append((corner_longitudes, latitudes[y+dy, x+dx]))
+	(x00, y00), (x01, y01), (x10, y10), (x11, y11) = corners
+
+	s = numpy.full(y.shape, 0.5)
+	t = numpy.full(y.shape, 0.5)
+
+	with numpy.errstate(divide='ignore', invalid='ignore'):
+		for iteration in range(iterations):
+			fx = (1-s)*(1-t)*x00 + s*(1-t)*x01 + (1-s)*t*x10 + s*t*x11 - target_longitudes
+			fy = (1-s)*(1-t)*y00 + s*(1-t)*y01 + (1-s)*t*y10 + s*t*y11 - target_latitudes
+
+			dxds = (1-t)*(x01 - x00) + t*(x11 - x10)
+			dyds = (1-t)*(y01 - y00) + t*(y11 - y10)
+			dxdt = (1-s)*(x10 - x00) + s*(x11 - x01)
+			dydt = (1-s)*(y10 - y00) + s*(y11 - y01)
+
+			determinant = dxds*dydt - dxdt*dyds
+			s = s - (fx*dydt - fy*dxdt) / determinant
+			t = t - (dxds*fy - dyds*fx) / determinant
+
+		tolerance = 1e-6
+		inside = (s >= -tolerance) & (s <= 1 + tolerance) & (t >= -tolerance) & (t <= 1 + tolerance)
+
+	# Pick the first candidate cell containing each target
+	rows = numpy.arange(len(y))
+	cell = inside.argmax(axis=1)
+	found = inside[rows, cell]
+
+	return _bilinear(y[rows, cell], x[rows, cell], numpy.clip(t[rows, cell], 0, 1), numpy.clip(s[rows, cell], 0, 1), found)
+
+
+def _bilinear(y, x, ty, tx, valid, wrap=None):
+	"""
+	Build bilinear PointWeights from lower cell indices and fractional positions within the cells.  With wrap set
+	the upper x index is taken modulo wrap (the number of columns of a periodic grid).
+	"""
+
+	y = numpy.where(valid, y, 0)
+	x = numpy.where(valid, x, 0)
+	ty = numpy.where(valid, ty, 0.0)
+	tx = numpy.where(valid, tx, 0.0)
+
+	x1 = x + 1
+	if wrap:
+		x1 = numpy.mod(x1, wrap)
+
+	indices = (numpy.column_stack((y, y, y+1, y+1)), numpy.column_stack((x, x1, x, x1)))
+	weights = numpy.column_stack(((1-ty)*(1-tx), (1-ty)*tx, ty*(1-tx), ty*tx))
+	weights[numpy.logical_not(valid)] = 0.0
+
+	return PointWeights(indices, weights)
+
+
+def inverse_distance(index, target_latitudes, target_longitudes, neighbours=4, power=2, max_distance=numpy.inf):
+	"""
+	Inverse distance weighted PointWeights over the nearest neighbours found through a spatial index.  Targets
+	coinciding with a grid point take that grid point value.  Neighbours further than max_distance are ignored.
+	"""
+
+	closest, distances = index.query(target_latitudes, target_longitudes, max_distance=max_distance, k=neighbours)
+
+	if neighbours == 1:
+		closest = tuple([c[:,numpy.newaxis] for c in closest])
+		distances = distances[:,numpy.newaxis]
+
+	with numpy.errstate(divide='ignore'):
+		weights = 1.0 / distances**power
+
+	exact = distances == 0
+	coincident = exact.any(axis=1)
+	weights[coincident] = exact[coincident]
+	weights[numpy.logical_not(numpy.isfinite(distances))] = 0.0
+
+	return PointWeights(closest, weights)
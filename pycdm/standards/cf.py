@@ -1,18 +1,146 @@
+"""
+Rule engine for the CF conventions.  The coordinate rules in cf.json are compiled once into lookup tables
+mapping units, standard_name, axis and positive attribute values onto coordinates (time, latitude, longitude
+and level) so that classifying a variable is a handful of dictionary lookups.
+"""
+import os
+import re
 import json
-import netCDF4
 
-standard = json.loads(open('cf.json').read())
+# Attributes that identify a coordinate, in order of precedence
+ATTRIBUTES = ['standard_name', 'units', 'axis', 'positive']
 
-def cf_time(units):
+# Special units rule values that match a whole class of parsed units rather than a single units string
+UNITS_CLASSES = {'udunits_time': 'time'}
 
-	try:
-		netCDF4.num2date(0, units)
-	except:
-		return False
+# Time units understood by netCDF4.num2date
+TIME_UNITS = {'microseconds':'microseconds', 'microsecond':'microseconds', 
+	'milliseconds':'milliseconds', 'millisecond':'milliseconds', 
+	'seconds':'seconds', 'second':'seconds', 'secs':'seconds', 'sec':'seconds', 's':'seconds',
+	'minutes':'minutes', 'minute':'minutes', 'mins':'minutes', 'min':'minutes',
+	'hours':'hours', 'hour':'hours', 'hrs':'hours', 'hr':'hours', 'h':'hours',
+	'days':'days', 'day':'days', 'd':'days'}
+
+_time_units_pattern = re.compile(r'^\s*(\w+)\s+since\s+([+-]?\d{1,4}-\d{1,2}(-\d{1,2})?([ T].*)?)$')
+
+
+def load(filename=None):
+	"""
+	Load the CF standard coordinate rules, by default from the cf.json file alongside this module
+	"""
+	
+	if not filename:
+		filename = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cf.json')
+	
+	return json.loads(open(filename).read())
+
+
+def compile_rules(standard):
+	"""
+	Compile a standard (as loaded by load) into a dict of lookup tables, one per attribute in ATTRIBUTES, mapping 
+	normalised attribute values to coordinate names.  Units classes (such as udunits_time) are compiled into a 
+	separate 'units_class' table mapping the parsed units class to the coordinate name.
+	"""
+	
+	tables = dict([(attribute, {}) for attribute in ATTRIBUTES])
+	tables['units_class'] = {}
+	
+	for coordinate, rules in standard.items():
+		for attribute in ATTRIBUTES:
+			
+			values = rules.get(attribute, [])
+			if isinstance(values, basestring):
+				values = [values]
+			
+			for value in values:
+				if attribute == 'units' and value in UNITS_CLASSES:
+					tables['units_class'][UNITS_CLASSES[value]] = coordinate
+				else:
+					tables[attribute][_normalise(attribute, value)] = coordinate
+	
+	return tables
+
+
+def _normalise(attribute, value):
+	"""
+	Normalise an attribute value for lookup, axis and positive values are case insensitive
+	"""
+	
+	value = value.strip()
+	
+	if attribute == 'axis':
+		return value.upper()
+	elif attribute in ['positive', 'standard_name']:
+		return value.lower()
 	else:
-		return True
+		return value
+
+
+_units_cache = {}
+
+def parse_units(units):
+	"""
+	Parse a units string into a (class, unit, reference) tuple.  For time units such as 'days since 1900-01-01' 
+	the class is 'time', unit is the normalised time unit and reference the reference date string, otherwise 
+	the class and reference are None and unit is the stripped units string.  Results are memoised.
+	
+	>>> parse_units('hours since 2012-01-01 00:00:00')
+	('time', 'hours', '2012-01-01 00:00:00')
+	>>> parse_units('degrees_north')
+	(None, 'degrees_north', None)
+	"""
+	
+	if units not in _units_cache:
+		
+		result = (None, units.strip(), None)
+		
+		match = _time_units_pattern.match(units)
+		if match and match.group(1).lower() in TIME_UNITS:
+			result = ('time', TIME_UNITS[match.group(1).lower()], match.group(2).strip())
+		
+		_units_cache[units] = result
+	
+	return _units_cache[units]
+
+
+RULES = compile_rules(load())
+
+
+def classify(attributes, rules=RULES):
+	"""
+	Returns the coordinate (time, latitude, longitude, level) described by a dict of variable attributes or None.  
+	Attributes are tried in the order of ATTRIBUTES so a standard_name takes precedence over units and so on.
+	
+	>>> classify({'units':'degrees_north'})
+	u'latitude'
+	>>> classify({'units':'days since 1900-01-01'})
+	u'time'
+	>>> classify({'units':'m', 'positive':'up'})
+	u'level'
+	"""
+	
+	for attribute in ATTRIBUTES:
+		
+		value = attributes.get(attribute)
+		if not isinstance(value, basestring):
+			continue
+		
+		if attribute == 'units':
+			units_class, unit, reference = parse_units(value)
+			if units_class in rules['units_class']:
+				return rules['units_class'][units_class]
+			value = unit
+		
+		coordinate = rules[attribute].get(_normalise(attribute, value))
+		if coordinate:
+			return coordinate
+	
+	return None
 
-variable = {'units':'days since 1900-01-01'}
 
-for key, config in standard:
-	print config
\ No newline at end of file
+def classify_variable(variable, rules=RULES):
+	"""
+	Classify a pycdm Variable through its attributes, see classify
+	"""
+	
+	return classify(dict([(attribute, variable.get_attribute(attribute)) for attribute in ATTRIBUTES]), rules=rules)
@@ -1,159 +1,497 @@
 import numpy as np
 import netCDF4
-import datetime
-import calendar
+
+from standards import cf
+from reducefunctions import grouped_reduce, statistic_name
+
+# Lengths of the time units understood by netCDF4 in microseconds
+TIME_UNIT_MICROSECONDS = {'microseconds':1, 'milliseconds':1000, 'seconds':1000000, 'minutes':60000000, 
+	'hours':3600000000, 'days':86400000000}
+
+# Month lengths and days before each month in a common (non leap) year
+MONTH_LENGTHS = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31], dtype=np.int64)
+DAYS_BEFORE_MONTH = np.concatenate(([0], np.cumsum(MONTH_LENGTHS)[:-1]))
+
+# Calendar names understood, grouped by how leap years work
+GREGORIAN_CALENDARS = ['standard', 'gregorian', 'proleptic_gregorian']
+JULIAN_CALENDARS = ['julian']
+NOLEAP_CALENDARS = ['365_day', 'noleap', 'no_leap']
+ALL_LEAP_CALENDARS = ['366_day', 'all_leap']
+DAY360_CALENDARS = ['360_day']
+
+# Groupings of times understood by CalendarIndex.groups
+GROUPINGS = ['month', 'season', 'doy']
+SEASONS = ['DJF', 'MAM', 'JJA', 'SON']
+
+DAY_MICROSECONDS = 86400000000
+HOUR_MICROSECONDS = 3600000000
+
+def _calendar(cal):
+	
+	if not cal:
+		return 'standard'
+	
+	cal = cal.lower()
+	
+	if cal not in GREGORIAN_CALENDARS + JULIAN_CALENDARS + NOLEAP_CALENDARS + ALL_LEAP_CALENDARS + DAY360_CALENDARS:
+		raise ValueError('unsupported calendar {}'.format(cal))
+	
+	return cal
+
+def is_leap(years, cal='standard'):
+	"""
+	Vectorised test for leap years in the given calendar
+	
+	>>> is_leap([1900, 2000, 2001, 2004]), is_leap([1900, 2000, 2001, 2004], 'julian')
+	(array([False,  True, False,  True]), array([ True,  True, False,  True]))
+	"""
+	
+	cal = _calendar(cal)
+	years = np.asarray(years, dtype=np.int64)
+	
+	if cal in GREGORIAN_CALENDARS:
+		return ((years % 4 == 0) & (years % 100 != 0)) | (years % 400 == 0)
+	elif cal in JULIAN_CALENDARS:
+		return years % 4 == 0
+	elif cal in ALL_LEAP_CALENDARS:
+		return np.ones(years.shape, dtype=bool)
+	else:
+		return np.zeros(years.shape, dtype=bool)
+
+def month_lengths(years, months, cal='standard'):
+	"""
+	Vectorised days_in_month, months beyond 12 roll into the following years
+	"""
+	
+	cal = _calendar(cal)
+	years = np.asarray(years, dtype=np.int64) + (np.asarray(months, dtype=np.int64) - 1) // 12
+	months = 1 + (np.asarray(months, dtype=np.int64) - 1) % 12
+	
+	if cal in DAY360_CALENDARS:
+		return np.full(months.shape, 30, dtype=np.int64)
+	
+	return MONTH_LENGTHS[months - 1] + ((months == 2) & is_leap(years, cal))
 
 def days_in_month(year, month, cal='standard'):
+	"""
+	Number of days in a month of the given calendar
+	
+	>>> [days_in_month(1900, 2, cal) for cal in ['standard', 'julian', 'noleap', 'all_leap', '360_day']]
+	[28, 29, 28, 29, 30]
+	>>> days_in_month(2011, 14)
+	29
+	"""
 	
 	# We modulo the month to 12 for convenience
-	year += (month-1)/12
-	month = 1 + (month-1) % 12
+	return int(month_lengths(year, month, cal))
 
-	#print "days_in_month: ", year, month
+def _days_before_year(years, cal):
+	
+	if cal in DAY360_CALENDARS:
+		return 360 * years
+	elif cal in NOLEAP_CALENDARS:
+		return 365 * years
+	elif cal in ALL_LEAP_CALENDARS:
+		return 366 * years
+	elif cal in JULIAN_CALENDARS:
+		return 365 * years + (years + 3) // 4
+	else:
+		return 365 * years + (years + 3) // 4 - (years + 99) // 100 + (years + 399) // 400
 
-	if cal in ['standard', 'gregorian']:
-		return calendar.monthrange(year, month)[1]
+def _days_before_month(years, months, cal):
+	
+	if cal in DAY360_CALENDARS:
+		return 30 * (months - 1)
+	
+	return DAYS_BEFORE_MONTH[months - 1] + ((months > 2) & is_leap(years, cal))
+
+def calendar_ordinals(years, months, days=1, hours=0, cal='standard'):
+	"""
+	Vectorised conversion of date parts to microseconds since the start of year 0 of the calendar.  Differences between
+	ordinals are elapsed times, so they can be compared with time coordinate values of any calendar.  The standard 
+	calendar is taken to be proleptic gregorian.
+	
+	>>> starts = calendar_ordinals(2000, [1, 2, 3, 13], cal='noleap')
+	>>> list(np.diff(starts) // DAY_MICROSECONDS)
+	[31, 28, 306]
+	>>> import datetime
+	>>> dates = [datetime.datetime(1999, 12, 31, 18), datetime.datetime(2000, 3, 1, 6)]
+	>>> elapsed = netCDF4.date2num(dates, 'hours since 1999-12-31 18:00:00', calendar='standard')
+	>>> (date_ordinals(dates) - date_ordinals(dates[:1])) / float(HOUR_MICROSECONDS) == elapsed
+	array([ True,  True])
+	"""
+	
+	cal = _calendar(cal)
+	years = np.asarray(years, dtype=np.int64) + (np.asarray(months, dtype=np.int64) - 1) // 12
+	months = 1 + (np.asarray(months, dtype=np.int64) - 1) % 12
+	
+	days = _days_before_year(years, cal) + _days_before_month(years, months, cal) + np.asarray(days, dtype=np.int64) - 1
+	
+	return days * DAY_MICROSECONDS + np.asarray(hours, dtype=np.int64) * HOUR_MICROSECONDS
+
+def date_ordinals(dates, cal='standard'):
+	"""
+	Calendar ordinals (see calendar_ordinals) of a sequence of datetime like objects (python datetimes or netcdftime/cftime 
+	instances)
+	"""
+	
+	dates = list(dates)
+	parts = [np.array([getattr(date, part) for date in dates], dtype=np.int64) for part in ['year', 'month', 'day', 'hour', 'minute', 'second', 'microsecond']]
+	
+	return calendar_ordinals(parts[0], parts[1], parts[2], parts[3], cal) + parts[4] * 60000000 + parts[5] * 1000000 + parts[6]
+
+def decode_ordinals(ordinals, cal='standard'):
+	"""
+	Vectorised conversion of calendar ordinals back to a dict of year, month, day, hour and doy (day of year, from 1) arrays
+	
+	>>> for cal in ['standard', 'julian', 'noleap', 'all_leap', '360_day']:
+	...     years, months, days = np.meshgrid(np.arange(1896, 1905), np.arange(1, 13), [1, 28, 30], indexing='ij')
+	...     keep = days <= month_lengths(years, months, cal)
+	...     decoded = decode_ordinals(calendar_ordinals(years[keep], months[keep], days[keep], 23, cal), cal)
+	...     print cal, (decoded['year'] == years[keep]).all(), (decoded['month'] == months[keep]).all(), (decoded['day'] == days[keep]).all()
+	standard True True True
+	julian True True True
+	noleap True True True
+	all_leap True True True
+	360_day True True True
+	"""
+	
+	cal = _calendar(cal)
+	ordinals = np.asarray(ordinals, dtype=np.int64)
+	
+	days = ordinals // DAY_MICROSECONDS
+	hours = (ordinals % DAY_MICROSECONDS) // HOUR_MICROSECONDS
+	
+	# Estimate the year and correct it
+	if cal in DAY360_CALENDARS:
+		years = days // 360
+	elif cal in NOLEAP_CALENDARS:
+		years = days // 365
+	elif cal in ALL_LEAP_CALENDARS:
+		years = days // 366
+	else:
+		years = (days / (365.25 if cal in JULIAN_CALENDARS else 365.2425)).astype(np.int64)
+		years = np.where(_days_before_year(years, cal) > days, years - 1, years)
+		years = np.where(_days_before_year(years + 1, cal) <= days, years + 1, years)
+	
+	doy = days - _days_before_year(years, cal)
+	
+	if cal in DAY360_CALENDARS:
+		months = doy // 30 + 1
+	else:
+		leap = is_leap(years, cal)
+		months = np.searchsorted(DAYS_BEFORE_MONTH, doy, side='right')
+		leap_months = np.searchsorted(DAYS_BEFORE_MONTH + (np.arange(12) >= 2), doy, side='right')
+		months = np.where(leap, leap_months, months)
+	
+	return {'year': years, 'month': months, 'day': doy - _days_before_month(years, months, cal) + 1, 'hour': hours, 'doy': doy + 1}
+
+
+class CalendarIndex(object):
+	"""
+	Decoded dates of a time coordinate in its calendar.  Times are mapped onto integer microsecond calendar ordinals 
+	(see calendar_ordinals) which are used to locate dates and windows by sorted search, and year, month, day, hour and doy 
+	(day of year) integer arrays and the datetimes themselves are decoded on first use.  Indexing a CalendarIndex gives 
+	the index of a subset of the times, sharing the decoded arrays.
+	
+	>>> units = 'hours since 1999-11-30 12:00:00'
+	>>> for cal in ['standard', 'noleap', '360_day']:
+	...     index = CalendarIndex(np.arange(0, 20000, 7.5), units, cal)
+	...     dates = netCDF4.num2date(index.times, units, calendar=cal)
+	...     print cal, all([(getattr(index, part) == [getattr(date, part) for date in dates]).all() for part in ['year', 'month', 'day', 'hour']]),
+	...     print (index.doy == [date.timetuple()[7] for date in dates]).all(), (index.date2num(dates[::5]) == index.times[::5]).all()
+	standard True True True
+	noleap True True True
+	360_day True True True
+	>>> index = CalendarIndex([0, 24, 48, 72], 'hours since 2000-02-28 00:00:00', '360_day')
+	>>> index.between(netCDF4.num2date(24, index.units, calendar='360_day'))
+	array([1, 2, 3])
+	>>> index.day, index[1:].day, index[1:].month
+	(array([28, 29, 30,  1]), array([29, 30,  1]), array([2, 2, 3]))
+	"""
+	
+	def __init__(self, times, units, calendar='standard'):
+		
+		self.times = np.asarray(times, dtype=np.float64)
+		self.units = units
+		self.calendar = _calendar(calendar)
+		
+		units_class, unit, reference = cf.parse_units(units)
+		if units_class != 'time':
+			raise ValueError('{} are not time units'.format(units))
 		
-	if cal in ['360_day']:
-		return 30
+		self.unit_microseconds = TIME_UNIT_MICROSECONDS[unit]
 		
-	if cal in ['365_day', 'no_leap']:
-		days = calendar.monthrange(year, month)[1]
-		if calendar.isleap(year) and month == 2:
-			return 28
+		# Anchor on the first time and work with elapsed times from there
+		if len(self.times):
+			first = netCDF4.num2date(self.times[0], units, calendar=self.calendar)
+			offsets = np.round((self.times - self.times[0]) * self.unit_microseconds).astype(np.int64)
+			self.ordinals = date_ordinals([first], self.calendar)[0] + offsets
+		else:
+			self.ordinals = np.zeros(0, dtype=np.int64)
+		
+		self._parent = None
+		self._key = None
+		self._decoded = {}
+	
+	def __len__(self):
+		return len(self.times)
+	
+	def __getitem__(self, key):
+		
+		index = object.__new__(self.__class__)
+		index.times = self.times[key]
+		index.units = self.units
+		index.calendar = self.calendar
+		index.unit_microseconds = self.unit_microseconds
+		index.ordinals = self.ordinals[key]
+		index._parent = self
+		index._key = key
+		index._decoded = {}
+		
+		return index
+	
+	def _get(self, name):
+		
+		if name not in self._decoded:
+			if self._parent is not None:
+				self._decoded[name] = getattr(self._parent, name)[self._key]
+			elif name == 'dates':
+				self._decoded[name] = np.asarray(netCDF4.num2date(self.times, self.units, calendar=self.calendar), dtype=object).reshape(self.times.shape)
+			else:
+				self._decoded.update(decode_ordinals(self.ordinals, self.calendar))
+		
+		return self._decoded[name]
+	
+	@property
+	def dates(self):
+		return self._get('dates')
+	
+	@property
+	def year(self):
+		return self._get('year')
+	
+	@property
+	def month(self):
+		return self._get('month')
+	
+	@property
+	def day(self):
+		return self._get('day')
+	
+	@property
+	def hour(self):
+		return self._get('hour')
+	
+	@property
+	def doy(self):
+		return self._get('doy')
+	
+	def groups(self, grouping='month'):
+		"""
+		Returns a (labels, groups) tuple for one of the GROUPINGS where labels is an array of the group (from 0) of each 
+		time and groups is an array naming the groups: months 1 to 12 for 'month', SEASONS for 'season' (December is 
+		grouped with the January and February following it) and days of the year from 1 for 'doy' (up to 360, 365 or 366 
+		depending on the calendar)
+		"""
+		
+		if grouping == 'month':
+			return self.month - 1, np.arange(1, 13)
+		elif grouping == 'season':
+			return (self.month % 12) // 3, np.array(SEASONS)
+		elif grouping == 'doy':
+			if self.calendar in DAY360_CALENDARS:
+				days = 360
+			elif self.calendar in NOLEAP_CALENDARS:
+				days = 365
+			else:
+				days = 366
+			return self.doy - 1, np.arange(1, days + 1)
+		else:
+			raise ValueError('unknown grouping {}, expected one of {}'.format(grouping, ', '.join(GROUPINGS)))
+	
+	def date2num(self, dates):
+		"""
+		Convert datetime like objects to time coordinate values
+		"""
+		
+		return self.times[0] + (date_ordinals(dates, self.calendar) - self.ordinals[0]) / float(self.unit_microseconds)
+	
+	def between(self, start=None, end=None):
+		"""
+		Returns the array of indices of the times from start to end inclusive, either can be None for no limit
+		"""
+		
+		first, last = 0, len(self.ordinals)
+		
+		if start is not None:
+			first = np.searchsorted(self.ordinals, date_ordinals([start], self.calendar)[0], side='left')
+		if end is not None:
+			last = np.searchsorted(self.ordinals, date_ordinals([end], self.calendar)[0], side='right')
+		
+		return np.arange(first, max(first, last))
+	
+	def __repr__(self):
+		return "<CDM %s: %d times, %s calendar>" % (self.__class__.__name__, len(self.times), self.calendar)
 
-def time_slices(times, time_units, origin={}, length='1 month', after=None, before=None):
+def time_slices(times, time_units, origin={}, length='1 month', after=None, before=None, calendar='standard', index=None):
+	"""
+	Returns a list of slices into the times array, one for each window of the given length starting at each of the 
+	dates/times described by origin.  origin is a list of dicts (or a single dict) with optional year (or list of years), 
+	month, day and hour keys, years default to all the years in times, months to all months, days to the days of each 
+	month (except the last) and hours to all hours.  Windows that start before after or end after before (defaulting to 
+	the first and last times) are skipped.  Origins that aren't valid dates in the calendar (such as day 31 in a month of
+	30 days) raise ValueError, as datetime does.
+	
+	Window boundaries are generated as calendar ordinal arrays and located in the (monotonic) times with a single sorted 
+	search.  A CalendarIndex of the times can be passed as index, otherwise one is created for the given calendar.  The
+	slices stop at the last time at or before the end of each window.
+	
+	>>> units = 'hours since 2001-01-01 00:00:00'
+	>>> times = np.arange(0, 90*24, 6.0)
+	>>> slices = time_slices(times, units, {'day':1, 'hour':0}, '1 month')
+	>>> slices
+	[slice(0, 124, None), slice(124, 236, None)]
+	>>> dates = netCDF4.num2date(times, units)
+	>>> [(str(dates[s.start]), str(dates[s.stop])) for s in slices]
+	[('2001-01-01 00:00:00', '2001-02-01 00:00:00'), ('2001-02-01 00:00:00', '2001-03-01 00:00:00')]
+	
+	Months are 30 days long in the 360_day calendar
+	
+	>>> slices = time_slices(np.arange(0, 360.0), 'days since 2001-01-01', {'day':1, 'hour':0}, '1 month', calendar='360_day')
+	>>> len(slices), set([s.stop - s.start for s in slices])
+	(11, set([30]))
+	
+	>>> time_slices(times, units, {'day':31, 'hour':0}, '1 day')
+	Traceback (most recent call last):
+	...
+	ValueError: day is out of range for month
+	"""
 	
 	length_parts = length.split()
 	length_val = int(length_parts[0])
 	length_units = length_parts[1]
-
-	print "time_slices ", length_val, length_units
-
-	real_times = netCDF4.num2date(times, time_units)
-
+	
+	if index is None:
+		index = CalendarIndex(times, time_units, calendar)
+	
+	cal = index.calendar
+	times_us = index.ordinals
+	
 	# Set before and after to start and end times if not specified
 	if not after:
-		after = real_times[0]
+		after_us = times_us[0]
+	else:
+		after_us = date_ordinals([after], cal)[0]
+		
 	if not before:
-		before = real_times[-1]
-
-	#print "time_slices, after {} and before {}".format(after, before)
-
-	all_years = np.arange(real_times[0].year, real_times[-1].year+1)
+		before_us = times_us[-1]
+	else:
+		before_us = date_ordinals([before], cal)[0]
+	
+	first, last = decode_ordinals(times_us[[0, -1]], cal)['year']
+	
+	years = np.arange(first, last+1)
+	months = np.arange(1,13)
+	days = None
+	hours = np.arange(0,24)
+	
+	if isinstance(origin, dict):
+		origin = [origin]
 	
 	for s in origin:
 		if 'year' not in s.keys():
-			years = all_years
-			print years
+			years = np.arange(first, last+1)
+		elif type(s['year']) == list:
+			years = np.asarray(s['year'])
 		else:
-			if type(s['year']) == list:
-				years = s['year']
-			else:
-				years = [s['year']]
+			years = np.asarray([s['year']])
 			
 		if 'month' not in s.keys():
 			months = np.arange(1,13)
 		else:
-			months = [s['month']]
+			months = np.asarray([s['month']])
 		
 		if 'day' not in s.keys():
-			days = np.nan
+			days = None
 		else:
-			days = [s['day']]
+			days = np.asarray([s['day']])
 			
 		if 'hour' not in s.keys():
 			hours = np.arange(0,24)
 		else:
-			hours = [s['hour']]
-
-	slices = []
-
-	#print 'years: ', years
-	#print 'months: ', months
+			hours = np.asarray([s['hour']])
 
-	for year in years:
-		for month in months:
-			
-			if np.isnan(days):
-				tmp_days = range(1,days_in_month(year, month))
-			else:
-				tmp_days = days
-		
-			#print "tmp_days = ",tmp_days
-	
-			for day in tmp_days:
-				for hour in hours:
-				
-					this_start = datetime.datetime(year, month, day, hour)
-					
-					# Calculate end date based on length units and value
-					if length_units == 'year':
-						end_year = year + length_val
-					else:
-						end_year = year
-						
-					if length_units == 'month':
-						end_month = month + length_val
-					else:
-						end_month = month
-						
-					if length_units == 'day':
-						end_day = day + length_val
-					else:
-						end_day = day
-
-					# Now modulo the end day and end month
-					while end_day > days_in_month(end_year, end_month):
-						end_day = end_day - days_in_month(end_year, end_month)
-						end_month += 1
-						if end_month > 12:
-							end_month = end_month - 12
-							end_year = end_year + 1
-					
-					if end_month > 12:
-						end_month = end_month - 12
-						end_year = end_year + 1
-					
-
-					#end_day = min(days_in_month(end_year, end_month), day)
-					this_end = datetime.datetime(end_year, end_month, end_day, hour)
-					
-					# Check if are completely before or after the time range
-					if this_start < after or this_end > before:
-#						print this_start, after
-#						print this_end, before
-						continue
-
-					start_value = netCDF4.date2num(this_start, time_units)
-					end_value = netCDF4.date2num(this_end, time_units)
-					
-					# Crop origin_value and end_value to the time range
-					#if start_value <= times[0]:
-					if start_value <= times[0]:
-						start_index = 0
-					else:
-						start_index = np.where(times >= start_value)[0][0]
-					
-					if end_value >= times[-1]:
-						end_index = len(times)-1
-					else:
-						end_index = np.where(times <= end_value)[0][-1]
-					
-					#print netCDF4.date2num(this_origin, time_units), netCDF4.date2num(this_end, time_units)
-					#print origin_index, end_index
-					#print "from file: ", netCDF4.num2date(times[start_index], time_units), netCDF4.num2date(times[end_index], time_units)
-					
-					slices.append(slice(start_index, end_index))
-	
-	return slices
+	if ((months < 1) | (months > 12)).any():
+		raise ValueError('month must be in 1..12')
+	
+	if ((hours < 0) | (hours > 23)).any():
+		raise ValueError('hour must be in 0..23')
+	
+	# All year/month combinations
+	start_years = np.repeat(years, len(months))
+	start_months = np.tile(months, len(years))
+	
+	# Days default to 1 up to (but not including) the last day of each month
+	if days is None:
+		counts = month_lengths(start_years, start_months, cal) - 1
+		start_years = np.repeat(start_years, counts)
+		start_months = np.repeat(start_months, counts)
+		offsets = np.cumsum(counts) - counts
+		start_days = np.arange(counts.sum()) - np.repeat(offsets, counts) + 1
+	else:
+		start_years = np.repeat(start_years, len(days))
+		start_months = np.repeat(start_months, len(days))
+		start_days = np.tile(days, len(start_years) // max(1, len(days)))
+		
+		if ((start_days < 1) | (start_days > month_lengths(start_years, start_months, cal))).any():
+			raise ValueError('day is out of range for month')
+	
+	start_years = np.repeat(start_years, len(hours))
+	start_months = np.repeat(start_months, len(hours))
+	start_days = np.repeat(start_days, len(hours))
+	start_hours = np.tile(hours, len(start_days) // max(1, len(hours)))
+	
+	# Calculate end dates based on length units and value
+	end_years = start_years + (length_val if length_units == 'year' else 0)
+	end_months = start_months + (length_val if length_units == 'month' else 0)
+	end_days = start_days + (length_val if length_units == 'day' else 0)
+	
+	# Now modulo the end day and end month
+	while True:
+		lengths = month_lengths(end_years, end_months, cal)
+		over = end_days > lengths
+		if not over.any():
+			break
+		end_days = np.where(over, end_days - lengths, end_days)
+		end_months = np.where(over, end_months + 1, end_months)
+		wrap = over & (end_months > 12)
+		end_months = np.where(wrap, end_months - 12, end_months)
+		end_years = np.where(wrap, end_years + 1, end_years)
+	
+	wrap = end_months > 12
+	end_months = np.where(wrap, end_months - 12, end_months)
+	end_years = np.where(wrap, end_years + 1, end_years)
+	
+	starts = calendar_ordinals(start_years, start_months, start_days, start_hours, cal)
+	ends = calendar_ordinals(end_years, end_months, end_days, start_hours, cal)
+	
+	# Skip windows that are completely before or after the time range
+	keep = (starts >= after_us) & (ends <= before_us)
+	starts, ends = starts[keep], ends[keep]
+	
+	# Crop to the time range, start at the first time at or after the window start and end at the last time at or before
+	# the window end
+	start_indices = np.where(starts <= times_us[0], 0, np.searchsorted(times_us, starts, side='left'))
+	end_indices = np.where(ends >= times_us[-1], len(times) - 1, np.searchsorted(times_us, ends, side='right') - 1)
+	
+	return [slice(start_index, end_index) for start_index, end_index in zip(start_indices.tolist(), end_indices.tolist())]
 
 def time_aggregation(field, func, start={}, length='1 month', mask_less=np.nan, mask_greater=np.nan):
 	
 	print "global range ", np.ma.max(field.variable[:]), np.ma.min(field.variable[:])
 	
-	times = field.times
-	slices = time_slices(times, field.time_variable.getAttribute('units'), start, length)
+	slices = field.time_slices(start, length)
 	
 	shape = field.variable.shape
 	
@@ -165,45 +503,40 @@ def time_aggregation(field, func, start={}, length='1 month', mask_less=np.nan,
 	
 	source = field.variable[:]
 	result = np.ma.empty(new_shape, dtype=np.float32)
-
-	result_selection = []
-	source_selection = []
-	for d in shape:
-		source_selection.append(slice(None))
-		result_selection.append(slice(None))
 	
-	for i in range(len(slices)):
-		source_selection[time_dim] = slices[i]
-		result_selection[time_dim] = i
-		#print source_selection, result_selection
-		#print field.variable[source_selection].shape
-		
-#		tmp = np.ma.masked_array(field.variable[source_selection])
-		tmp = source[source_selection]
-		#print type(tmp)
-		#print np.ma.min(tmp), np.ma.max(tmp)
-		
-		if not np.isnan(mask_less):
-			tmp = np.ma.masked_less(tmp, mask_less)
+	# Common reductions are done for all slices in one pass
+	statistic = statistic_name(func)
+	if statistic:
+		result[:] = grouped_reduce(source, slices, statistic, axis=time_dim, mask_less=mask_less, mask_greater=mask_greater)
 
-		if not np.isnan(mask_greater):
-			tmp = np.ma.masked_greater(tmp, mask_greater)
+	else:
+		result_selection = []
+		source_selection = []
+		for d in shape:
+			source_selection.append(slice(None))
+			result_selection.append(slice(None))
 		
-		
-		result[tuple(result_selection)] = func(tmp, axis=time_dim)
-		#print i, source[source_selection][:,77], result[tuple(result_selection)][77]
+		for i in range(len(slices)):
+			source_selection[time_dim] = slices[i]
+			result_selection[time_dim] = i
+			
+			tmp = source[tuple(source_selection)]
+			
+			if not np.isnan(mask_less):
+				tmp = np.ma.masked_less(tmp, mask_less)
 
+			if not np.isnan(mask_greater):
+				tmp = np.ma.masked_greater(tmp, mask_greater)
+			
+			result[tuple(result_selection)] = func(tmp, axis=time_dim)
 		
-	result_times = [times[s.stop-1] for s in slices]
-
-	return result, netCDF4.num2date(result_times, field.timevar.getAttribute('units'))
+	return result, field.calendar_index().dates[[s.stop-1 for s in slices]]
 	
 def time_subset(field, start={}, length='1 month', mask_less=np.nan, mask_greater=np.nan):
 	
 	print "global range ", np.ma.max(field.variable[:]), np.ma.min(field.variable[:])
 	
-	times = field.times()
-	slices = time_slices(times, field.timevar.getAttribute('units'), start, length)
+	slices = field.time_slices(start, length)
 	
 	indices = []
 	for s in slices:
@@ -227,5 +560,5 @@ def time_subset(field, start={}, length='1 month', mask_less=np.nan, mask_greate
 	source_selection[time_dim] = indices
 	#print "source selection: ", source_selection
 	
-	return source[source_selection], netCDF4.num2date(times[indices], field.timevar.getAttribute('units'))
+	return source[source_selection], field.calendar_index().dates[indices]
 	
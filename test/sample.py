@@ -0,0 +1,235 @@
+"""
+Small synthetic netCDF files for the tests, written to a temporary directory so the tests don't depend on the
+sample data files
+"""
+import os
+import tempfile
+
+import numpy
+import netCDF4
+
+
+def grid_file(directory=None, ntimes=48, nlats=10, nlons=12, calendar='standard', units='hours since 2012-01-01 00:00:00', step=6.0):
+	"""
+	Write a GridSeries file holding a random 'pr' variable (time, lat, lon) with a few masked values and return its path
+	"""
+	
+	directory = directory or tempfile.mkdtemp()
+	path = os.path.join(directory, 'grid_{}_{}.nc'.format(calendar, ntimes))
+	
+	ds = netCDF4.Dataset(path, 'w')
+	ds.createDimension('time', ntimes)
+	ds.createDimension('lat', nlats)
+	ds.createDimension('lon', nlons)
+	
+	time = ds.createVariable('time', 'f8', ('time',))
+	time.units = units
+	time.calendar = calendar
+	time[:] = numpy.arange(ntimes) * step
+	
+	lat = ds.createVariable('lat', 'f4', ('lat',))
+	lat.units = 'degrees_north'
+	lat[:] = numpy.linspace(-35, -20, nlats)
+	
+	lon = ds.createVariable('lon', 'f4', ('lon',))
+	lon.units = 'degrees_east'
+	lon[:] = numpy.linspace(15, 35, nlons)
+	
+	values = numpy.random.RandomState(0).gamma(0.5, 2.0, (ntimes, nlats, nlons)).astype(numpy.float32)
+	values[::7, 2, 3] = -999.0
+	
+	pr = ds.createVariable('pr', 'f4', ('time', 'lat', 'lon'), fill_value=-999.0)
+	pr.units = 'kg m-2 s-1'
+	pr[:] = values
+	
+	ds.close()
+	
+	return path
+
+
+def global_file(directory=None, nlats=19, nlons=144, west=0.0):
+	"""
+	Write a global rectilinear Grid file holding a 'tas' variable (lat, lon) that varies linearly with latitude and 
+	as the sine of longitude, starting at the west longitude, and return its path
+	"""
+	
+	directory = directory or tempfile.mkdtemp()
+	path = os.path.join(directory, 'global_{}.nc'.format(int(west)))
+	
+	ds = netCDF4.Dataset(path, 'w')
+	ds.createDimension('lat', nlats)
+	ds.createDimension('lon', nlons)
+	
+	lat = ds.createVariable('lat', 'f8', ('lat',))
+	lat.units = 'degrees_north'
+	lat[:] = numpy.linspace(-90, 90, nlats)
+	
+	lon = ds.createVariable('lon', 'f8', ('lon',))
+	lon.units = 'degrees_east'
+	lon[:] = west + numpy.arange(nlons) * 360.0 / nlons
+	
+	tas = ds.createVariable('tas', 'f8', ('lat', 'lon'))
+	tas.units = 'K'
+	tas[:] = lat[:][:,numpy.newaxis] + 10 * numpy.sin(numpy.radians(lon[:]))[numpy.newaxis,:]
+	
+	ds.close()
+	
+	return path
+
+
+def station_file(directory=None, ntimes=4, latitudes=(-30.0, -25.0, -20.0), longitudes=(20.0, 25.0, 30.0)):
+	"""
+	Write a point feature file holding a 'tas' variable (time, station) with latitude and longitude auxiliary coordinates
+	and return its path
+	"""
+	
+	directory = directory or tempfile.mkdtemp()
+	path = os.path.join(directory, 'stations_{}.nc'.format(len(latitudes)))
+	
+	ds = netCDF4.Dataset(path, 'w')
+	ds.createDimension('time', ntimes)
+	ds.createDimension('station', len(latitudes))
+	
+	time = ds.createVariable('time', 'f8', ('time',))
+	time.units = 'days since 2000-01-01 00:00:00'
+	time[:] = numpy.arange(ntimes)
+	
+	lat = ds.createVariable('lat', 'f8', ('station',))
+	lat.standard_name = 'latitude'
+	lat.units = 'degrees_north'
+	lat[:] = latitudes
+	
+	lon = ds.createVariable('lon', 'f8', ('station',))
+	lon.standard_name = 'longitude'
+	lon.units = 'degrees_east'
+	lon[:] = longitudes
+	
+	tas = ds.createVariable('tas', 'f8', ('time', 'station'))
+	tas.units = 'K'
+	tas.coordinates = 'lat lon'
+	tas[:] = numpy.arange(ntimes * len(latitudes), dtype=numpy.float64).reshape(ntimes, len(latitudes))
+	
+	ds.close()
+	
+	return path
+
+
+def rotated_pole_file(directory=None, ntimes=3, nrlats=5, nrlons=6):
+	"""
+	Write a CORDEX style rotated pole file holding a 'tas' variable (time, rlat, rlon) with 2D latitude and longitude 
+	auxiliary coordinates and a scalar 2 m height coordinate and return its path
+	"""
+	
+	directory = directory or tempfile.mkdtemp()
+	path = os.path.join(directory, 'rotated_pole.nc')
+	
+	ds = netCDF4.Dataset(path, 'w')
+	ds.createDimension('time', ntimes)
+	ds.createDimension('rlat', nrlats)
+	ds.createDimension('rlon', nrlons)
+	
+	time = ds.createVariable('time', 'f8', ('time',))
+	time.standard_name = 'time'
+	time.units = 'days since 1949-12-01 00:00:00'
+	time.calendar = 'standard'
+	time[:] = numpy.arange(ntimes) + 0.5
+	
+	rlat = ds.createVariable('rlat', 'f8', ('rlat',))
+	rlat.standard_name = 'grid_latitude'
+	rlat.units = 'degrees'
+	rlat.axis = 'Y'
+	rlat[:] = numpy.linspace(-10, 10, nrlats)
+	
+	rlon = ds.createVariable('rlon', 'f8', ('rlon',))
+	rlon.standard_name = 'grid_longitude'
+	rlon.units = 'degrees'
+	rlon.axis = 'X'
+	rlon[:] = numpy.linspace(-12, 12, nrlons)
+	
+	ys, xs = numpy.meshgrid(rlat[:], rlon[:], indexing='ij')
+	
+	lat = ds.createVariable('lat', 'f8', ('rlat', 'rlon'))
+	lat.standard_name = 'latitude'
+	lat.units = 'degrees_north'
+	lat[:] = 50 + ys + 0.1 * xs
+	
+	lon = ds.createVariable('lon', 'f8', ('rlat', 'rlon'))
+	lon.standard_name = 'longitude'
+	lon.units = 'degrees_east'
+	lon[:] = 10 + xs - 0.1 * ys
+	
+	height = ds.createVariable('height', 'f8')
+	height.standard_name = 'height'
+	height.units = 'm'
+	height.axis = 'Z'
+	height.positive = 'up'
+	height.assignValue(2.0)
+	
+	tas = ds.createVariable('tas', 'f4', ('time', 'rlat', 'rlon'))
+	tas.standard_name = 'air_temperature'
+	tas.units = 'K'
+	tas.coordinates = 'lon lat height'
+	tas[:] = 280.0
+	
+	ds.close()
+	
+	return path
+
+
+def pressure_file(directory=None, ntimes=2, nlevels=4, nlats=3, nlons=4):
+	"""
+	Write a pressure level file holding a 'ta' variable (time, plev, lat, lon) with a scalar 2 m height auxiliary coordinate,
+	and a 'ua850' variable (time, lat, lon) with a scalar pressure auxiliary coordinate, and return its path
+	"""
+	
+	directory = directory or tempfile.mkdtemp()
+	path = os.path.join(directory, 'pressure.nc')
+	
+	ds = netCDF4.Dataset(path, 'w')
+	ds.createDimension('time', ntimes)
+	ds.createDimension('plev', nlevels)
+	ds.createDimension('lat', nlats)
+	ds.createDimension('lon', nlons)
+	
+	time = ds.createVariable('time', 'f8', ('time',))
+	time.units = 'hours since 2000-01-01 00:00:00'
+	time[:] = numpy.arange(ntimes) * 6.0
+	
+	plev = ds.createVariable('plev', 'f8', ('plev',))
+	plev.standard_name = 'air_pressure'
+	plev.units = 'Pa'
+	plev.axis = 'Z'
+	plev.positive = 'down'
+	plev[:] = numpy.linspace(100000, 25000, nlevels)
+	
+	lat = ds.createVariable('lat', 'f8', ('lat',))
+	lat.units = 'degrees_north'
+	lat[:] = numpy.linspace(-10, 10, nlats)
+	
+	lon = ds.createVariable('lon', 'f8', ('lon',))
+	lon.units = 'degrees_east'
+	lon[:] = numpy.linspace(0, 30, nlons)
+	
+	height = ds.createVariable('height', 'f8')
+	height.standard_name = 'height'
+	height.units = 'm'
+	height.assignValue(2.0)
+	
+	p850 = ds.createVariable('p850', 'f8')
+	p850.standard_name = 'air_pressure'
+	p850.units = 'Pa'
+	p850.assignValue(85000.0)
+	
+	ta = ds.createVariable('ta', 'f4', ('time', 'plev', 'lat', 'lon'))
+	ta.units = 'K'
+	ta.coordinates = 'height'
+	ta[:] = 250.0
+	
+	ua850 = ds.createVariable('ua850', 'f4', ('time', 'lat', 'lon'))
+	ua850.units = 'm s-1'
+	ua850.coordinates = 'p850'
+	ua850[:] = 5.0
+	
+	ds.close()
+	
+	return path
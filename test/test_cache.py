@@ -0,0 +1,112 @@
+import unittest
+
+import numpy
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import pycdm
+from pycdm.model.cache import LRUCache
+from pycdm.model import field
+
+import sample
+
+
+class LRUCacheTest(unittest.TestCase):
+	
+	def test_item_eviction(self):
+		
+		cache = LRUCache(max_items=2)
+		cache['a'] = 1
+		cache['b'] = 2
+		cache['a']
+		cache['c'] = 3
+		
+		self.assertEqual(sorted(cache._entries.keys()), ['a', 'c'])
+	
+	def test_byte_budget(self):
+		
+		cache = LRUCache(max_bytes=2000)
+		for key in range(10):
+			cache[key] = numpy.zeros(100)
+			self.assertTrue(cache.nbytes <= 2000)
+		
+		self.assertEqual(sorted(cache._entries.keys()), [8, 9])
+		
+		# Values bigger than the whole budget aren't cached
+		cache['big'] = numpy.zeros(1000)
+		self.assertFalse('big' in cache)
+	
+	def test_container_sizes(self):
+		
+		small = {'features': [{'id': i, 'coordinates': [[1.0, 2.0]]} for i in range(10)]}
+		large = {'features': [{'id': i, 'coordinates': [[1.0, 2.0]]} for i in range(1000)]}
+		
+		self.assertTrue(LRUCache.sizeof(small) > 0)
+		self.assertTrue(LRUCache.sizeof(large) > 50 * LRUCache.sizeof(small))
+		
+		cache = LRUCache(max_bytes=LRUCache.sizeof(large) + LRUCache.sizeof(small))
+		cache['large'] = large
+		cache['small'] = small
+		cache['other'] = dict(small)
+		self.assertFalse('large' in cache)
+		self.assertTrue(cache.nbytes <= cache.max_bytes)
+
+
+class FeatureCacheTest(unittest.TestCase):
+	
+	@classmethod
+	def setUpClass(cls):
+		cls.ds = pycdm.open(sample.grid_file())
+		cls.field = pycdm.Field(cls.ds.root.variables['pr'])
+	
+	def test_feature_budget(self):
+		
+		cache = self.field.group.feature_cache
+		cache.clear()
+		
+		size = LRUCache.sizeof(self.field.view[0:1].features(propnames=['value']))
+		cache.max_bytes = int(2.5 * size)
+		
+		try:
+			for t in range(5):
+				self.field.view[t:t+1].features(propnames=['value'])
+				self.assertTrue(cache.nbytes <= cache.max_bytes)
+			self.assertEqual(len(cache), 2)
+		finally:
+			cache.max_bytes = pycdm.model.group.FEATURE_CACHE_SIZE
+			cache.clear()
+	
+	def test_hits_are_shared(self):
+		
+		view = self.field.view[0:1]
+		view.group.feature_cache.clear()
+		first = view.features(propnames=['value'])
+		
+		builds = []
+		def build(*args, **kwargs):
+			builds.append(kwargs)
+			raise AssertionError('feature collection rebuilt')
+		
+		def deepcopy(*args, **kwargs):
+			raise AssertionError('feature collection copied')
+		
+		view._build_features = build
+		original = field.copy.deepcopy
+		field.copy.deepcopy = deepcopy
+		try:
+			second = view.features(propnames=['value'])
+		finally:
+			field.copy.deepcopy = original
+		
+		self.assertTrue(second is first)
+		self.assertEqual(builds, [])
+	
+	def test_features_size_estimate(self):
+		
+		collection = self.field.view[0:2].features(propnames=['a', 'b'])
+		estimate = field._features_nbytes(collection)
+		
+		self.assertTrue(0.9 * LRUCache.sizeof(collection) < estimate < 1.1 * LRUCache.sizeof(collection))
+
+if __name__ == '__main__':
+	unittest.main()
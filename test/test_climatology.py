@@ -0,0 +1,132 @@
+import unittest
+
+import numpy
+import netCDF4
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import pycdm
+from pycdm.model.error import CDMError
+
+import sample
+
+
+CALENDARS = ['standard', '360_day', 'noleap']
+STATISTICS = ['mean', 'std', 'min', 'max', 'count', 'sum']
+NUMPY = {'mean': numpy.ma.mean, 'std': numpy.ma.std, 'min': numpy.ma.min, 'max': numpy.ma.max, 'count': numpy.ma.count, 'sum': numpy.ma.sum}
+
+
+def labels(field, group, span=slice(None)):
+	"""
+	Group labels of the field times (or a span of them) worked out from netCDF4.num2date dates
+	"""
+
+	time = field.group.variables['time']
+	calendar = time.attributes['calendar']
+	dates = netCDF4.num2date(time[:][span], time.attributes['units'], calendar=calendar)
+
+	if group == 'month':
+		return numpy.array([date.month - 1 for date in dates]), 12
+	elif group == 'season':
+		return numpy.array([(date.month % 12) // 3 for date in dates]), 4
+	else:
+		return numpy.array([date.timetuple()[7] - 1 for date in dates]), {'360_day': 360, 'noleap': 365}.get(calendar, 366)
+
+
+def reference(data, group_labels, ngroups, statistic):
+	"""
+	Plain numpy group by, groups without any values are masked (or zero for counts)
+	"""
+
+	result = numpy.ma.masked_all((ngroups,) + data.shape[1:])
+
+	for label in range(ngroups):
+		values = data[group_labels == label]
+		if len(values):
+			result[label] = NUMPY[statistic](values, axis=0)
+		elif statistic == 'count':
+			result[label] = 0
+
+	return result
+
+
+class ClimatologyTest(unittest.TestCase):
+
+	@classmethod
+	def setUpClass(cls):
+
+		cls.fields = {}
+		for calendar in CALENDARS:
+			path = sample.grid_file(ntimes=250, nlats=3, nlons=4, calendar=calendar, units='days since 1999-12-01 00:00:00', step=4.5)
+			cls.fields[calendar] = pycdm.Field(pycdm.open(path).root.variables['pr'])
+
+	def assertMatches(self, result, expected, message):
+
+		self.assertEqual(result.shape, expected.shape, message)
+		self.assertTrue((numpy.ma.getmaskarray(result) == numpy.ma.getmaskarray(expected)).all(), message)
+		self.assertTrue(numpy.allclose(result.filled(0), expected.filled(0), rtol=1e-5, atol=1e-5), message)
+
+	def test_climatology(self):
+
+		for calendar, field in self.fields.items():
+			data = numpy.ma.asarray(field[:])
+
+			for group in ['month', 'season', 'doy']:
+				group_labels, ngroups = labels(field, group)
+
+				for block_size in [None, 17]:
+					result, groups = field.climatology(STATISTICS, group, block_size=block_size)
+					self.assertEqual(len(groups), ngroups)
+
+					for statistic in STATISTICS:
+						expected = reference(data, group_labels, ngroups, statistic)
+						self.assertMatches(result[statistic], expected, (calendar, group, block_size, statistic))
+
+	def test_masking(self):
+
+		for calendar, field in self.fields.items():
+			data = numpy.ma.masked_greater(numpy.ma.masked_less(numpy.ma.asarray(field[:]), 0.2), 2.0)
+			group_labels, ngroups = labels(field, 'season')
+
+			for block_size in [None, 30]:
+				result = field.climatology('mean', 'season', mask_less=0.2, mask_greater=2.0, block_size=block_size)[0]
+				self.assertMatches(result, reference(data, group_labels, ngroups, 'mean'), (calendar, block_size))
+
+				anomalies = field.anomalies('season', mask_less=0.2, mask_greater=2.0, block_size=block_size)
+				expected = data - reference(data, group_labels, ngroups, 'mean')[group_labels]
+				self.assertMatches(anomalies, expected, (calendar, block_size))
+
+	def test_anomalies(self):
+
+		for calendar, field in self.fields.items():
+			data = numpy.ma.asarray(field[:])
+
+			for group in ['month', 'season', 'doy']:
+				group_labels, ngroups = labels(field, group)
+				expected = data - reference(data, group_labels, ngroups, 'mean')[group_labels]
+
+				for block_size in [None, 17]:
+					self.assertMatches(field.anomalies(group, block_size=block_size), expected, (calendar, group, block_size))
+
+					pieces = [(span, anomalies) for span, anomalies in field.iteranomalies(group, block_size=block_size)]
+					self.assertEqual([span for span, anomalies in pieces], list(field._time_blocks(block_size)))
+
+	def test_given_climatology(self):
+
+		for calendar, field in self.fields.items():
+
+			# The climatology of the first year applied to the whole field
+			base = field.view[0:82]
+			climatology = base.climatology('mean', 'month')[0]
+			group_labels, ngroups = labels(field, 'month')
+
+			expected = numpy.ma.asarray(field[:]) - reference(numpy.ma.asarray(base[:]), labels(base, 'month', slice(0, 82))[0], ngroups, 'mean')[group_labels]
+
+			for block_size in [None, 17]:
+				self.assertMatches(field.anomalies('month', climatology=climatology, block_size=block_size), expected, (calendar, block_size))
+
+			self.assertRaises(CDMError, field.anomalies, 'season', climatology=climatology)
+
+
+if __name__ == '__main__':
+	unittest.main()
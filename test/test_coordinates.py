@@ -0,0 +1,60 @@
+import unittest
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import pycdm
+from pycdm.standards import cf
+
+import sample
+
+
+class ClassifyTest(unittest.TestCase):
+	
+	def test_classify(self):
+		
+		self.assertEqual(cf.classify({'standard_name': 'grid_latitude', 'units': 'degrees', 'axis': 'Y'}), None)
+		self.assertEqual(cf.classify({'standard_name': 'latitude', 'units': 'degrees_north'}), 'latitude')
+		self.assertEqual(cf.classify({'units': 'degrees_east'}), 'longitude')
+		self.assertEqual(cf.classify({'units': 'days since 1949-12-01 00:00:00'}), 'time')
+		self.assertEqual(cf.classify({'standard_name': 'height', 'units': 'm', 'axis': 'Z', 'positive': 'up'}), 'level')
+		self.assertEqual(cf.classify({'standard_name': 'air_pressure', 'units': 'Pa'}), 'level')
+		self.assertEqual(cf.classify({'units': 'hPa'}), 'level')
+		self.assertEqual(cf.classify({'units': 'K'}), None)
+
+
+class CoordinatesMapTest(unittest.TestCase):
+	
+	def test_rotated_pole(self):
+		
+		ds = pycdm.open(sample.rotated_pole_file())
+		mapping = pycdm.Field(ds.root.variables['tas']).coordinates_mapping
+		
+		self.assertEqual(sorted(mapping.keys()), ['height', 'latitude', 'longitude', 'rlat', 'rlon', 'time'])
+		self.assertEqual(mapping['time'], {'variable': 'time', 'map': [0]})
+		self.assertEqual(mapping['rlat'], {'variable': 'rlat', 'map': [1]})
+		self.assertEqual(mapping['rlon'], {'variable': 'rlon', 'map': [2]})
+		self.assertEqual((mapping['latitude']['variable'], mapping['latitude']['map']), ('lat', [1, 2]))
+		self.assertEqual((mapping['longitude']['variable'], mapping['longitude']['map']), ('lon', [1, 2]))
+		self.assertEqual((mapping['height']['variable'], mapping['height']['map']), ('height', []))
+	
+	def test_pressure_levels(self):
+		
+		ds = pycdm.open(sample.pressure_file())
+		
+		field = pycdm.Field(ds.root.variables['ta'])
+		mapping = field.coordinates_mapping
+		
+		self.assertEqual(sorted(mapping.keys()), ['height', 'latitude', 'level', 'longitude', 'time'])
+		self.assertEqual(mapping['level'], {'variable': 'plev', 'map': [1]})
+		self.assertEqual((mapping['height']['variable'], mapping['height']['map']), ('height', []))
+		self.assertEqual(mapping['latitude'], {'variable': 'lat', 'map': [2]})
+		self.assertEqual(field.time_dim, 0)
+		
+		# A scalar pressure is still a level
+		mapping = pycdm.Field(ds.root.variables['ua850']).coordinates_mapping
+		self.assertEqual(sorted(mapping.keys()), ['latitude', 'level', 'longitude', 'time'])
+		self.assertEqual((mapping['level']['variable'], mapping['level']['map']), ('p850', []))
+
+
+if __name__ == '__main__':
+	unittest.main()
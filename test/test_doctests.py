@@ -0,0 +1,18 @@
+import doctest
+import unittest
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pycdm import timefunctions, reducefunctions
+
+
+def load_tests(loader, tests, ignore):
+	
+	for module in [timefunctions, reducefunctions]:
+		tests.addTests(doctest.DocTestSuite(module))
+	
+	return tests
+
+
+if __name__ == '__main__':
+	unittest.main()
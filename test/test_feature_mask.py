@@ -0,0 +1,50 @@
+import gc
+import unittest
+import weakref
+
+import numpy
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import pycdm
+
+import sample
+
+
+class FeatureMaskTest(unittest.TestCase):
+	
+	def setUp(self):
+		self.ds = pycdm.open(sample.grid_file())
+		self.field = pycdm.Field(self.ds.root.variables['pr']).view[0:1]
+	
+	def mask(self):
+		ds = pycdm.open(sample.grid_file())
+		return pycdm.Field(ds.root.variables['pr']).view[0:1]
+	
+	def test_mask_values(self):
+		
+		mask = self.mask()
+		keep = self.field._feature_mask(mask)
+		
+		expected = ~numpy.ma.filled(numpy.ma.asarray(mask[0]) < 0.5, False)
+		self.assertTrue((keep == expected).all())
+	
+	def test_stale_entries(self):
+		
+		mask = self.mask()
+		keep = self.field._feature_mask(mask)
+		
+		# Entries for a variable that has gone away (whose id may be reused) are not returned
+		cache = self.field.group.coordinate_cache
+		stale = pycdm.model.variable.Variable('pr')
+		for key in list(cache._entries.keys()):
+			if key[0] == 'mask':
+				cache[key] = (weakref.ref(stale), numpy.zeros(keep.shape, dtype=bool))
+		del stale
+		gc.collect()
+		
+		self.assertTrue((self.field._feature_mask(mask) == keep).all())
+
+
+if __name__ == '__main__':
+	unittest.main()
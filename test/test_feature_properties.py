@@ -0,0 +1,49 @@
+import unittest
+
+import numpy
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import pycdm
+
+import sample
+
+
+class FeaturePropertiesTest(unittest.TestCase):
+	
+	@classmethod
+	def setUpClass(cls):
+		cls.ds = pycdm.open(sample.grid_file())
+		cls.field = pycdm.Field(cls.ds.root.variables['pr'])
+		cls.data = cls.ds.root.variables['pr'][:]
+	
+	def check(self, field, data, propnames, series):
+		
+		nx = data.shape[2]
+		
+		for (y, x), properties in field._feature_properties(propnames=propnames, series=series):
+			self.assertEqual(properties['id'], x + y * nx)
+			
+			expected = numpy.ma.filled(data[:,y,x].astype(object), None).tolist()
+			for i, name in enumerate(propnames or []):
+				self.assertEqual(properties[name], expected[i])
+			if series:
+				self.assertEqual(properties['values'], expected)
+	
+	def test_propnames(self):
+		self.check(self.field, self.data, ['first', 'second', 'third'], False)
+	
+	def test_series(self):
+		self.check(self.field, self.data, ['first'], True)
+	
+	def test_view(self):
+		self.check(self.field.view[5:9, 2:6, 1:], self.data[5:9, 2:6, 1:], ['a', 'b'], False)
+	
+	def test_leading_components(self):
+		values = self.field.view[3:, :, :]._feature_values(components=2)
+		self.assertEqual(values.shape, (self.data.shape[1] * self.data.shape[2], 2))
+		self.assertTrue(numpy.ma.allequal(values, self.data[3:5].reshape((2, -1)).transpose()))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+
+import numpy
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pycdm import featurefunctions
+
+
+class EncodeFeaturesTest(unittest.TestCase):
+	
+	def test_round_trip(self):
+		
+		coordinates = numpy.array([[18.5, -34.0], [28.0, -26.1], [31.0, -29.8]])
+		values = numpy.ma.array([[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]], mask=[[False, False], [True, False], [False, False]])
+		names = numpy.array(['Cape Town', 'Johannesburg', 'Durban'])
+		vlen = numpy.array([u'Kaapstad', None, u'eThekwini'], dtype=object)
+		
+		columns = [('value', values), ('name', names), ('alias', vlen)]
+		data = ''.join(featurefunctions.encode_features(featurefunctions.POINT, coordinates, [], [0, 1, 2], columns))
+		
+		self.assertEqual(len(data) % 8, 0)
+		
+		decoded = featurefunctions.decode_features(data)
+		self.assertTrue(numpy.allclose(decoded['coordinates'], coordinates))
+		self.assertEqual(list(decoded['ids']), [0, 1, 2])
+		
+		decoded_columns = dict(decoded['columns'])
+		self.assertTrue(numpy.isnan(decoded_columns['value'][1, 0]))
+		self.assertEqual(decoded_columns['value'][2, 1], 6.0)
+		self.assertEqual(decoded_columns['name'], [u'Cape Town', u'Johannesburg', u'Durban'])
+		self.assertEqual(decoded_columns['alias'], [u'Kaapstad', u'', u'eThekwini'])
+
+
+if __name__ == '__main__':
+	unittest.main()
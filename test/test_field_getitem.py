@@ -0,0 +1,60 @@
+import unittest
+
+import numpy
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import pycdm
+
+import sample
+
+
+class FieldGetItemTest(unittest.TestCase):
+	"""
+	Field[...] on a view should give the same values and shape as numpy indexing of the subset of the whole variable
+	"""
+	
+	@classmethod
+	def setUpClass(cls):
+		cls.ds = pycdm.open(sample.grid_file())
+		cls.field = pycdm.Field(cls.ds.root.variables['pr'])
+		cls.data = cls.ds.root.variables['pr'][:]
+	
+	subsets = [(slice(None), slice(None), slice(None)), (slice(2, 30, 3), slice(1, 9), slice(None, None, -1))]
+	
+	keys = [
+		(0, slice(None), slice(None)),
+		(slice(None), 2, slice(1, 5)),
+		(-1, -2, -3),
+		([0, 1], slice(None), [2, 3]),
+		(0, slice(None), [2, 3]),
+		([0, 1], [2, 3], slice(None)),
+		([1, 0], [3, 2], [4, 5]),
+		(slice(None), [0, 2], 1),
+		(numpy.array([True, False] * 3 + [False]*4), slice(None), [5]),
+		(slice(None, None, 2), [1, -1], slice(None)),
+		(Ellipsis, [0, 4, 2]),
+		([[0, 1], [1, 0]], 0, [[2, 3], [3, 2]]),
+	]
+	
+	def test_numpy_semantics(self):
+		
+		for subset in self.subsets:
+			view = self.field.view[subset]
+			expected_subset = self.data[subset]
+			
+			for key in self.keys:
+				try:
+					expected = expected_subset[key]
+				except IndexError:
+					continue
+				
+				result = view[key]
+				
+				self.assertEqual(numpy.shape(result), numpy.shape(expected), (subset, key))
+				self.assertTrue(numpy.ma.allequal(result, expected), (subset, key))
+				self.assertTrue((numpy.ma.getmaskarray(result) == numpy.ma.getmaskarray(expected)).all(), (subset, key))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+
+import numpy
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import pycdm
+from pycdm.model.variable import Variable
+from pycdm.model.cache import LRUCache
+
+import sample
+
+
+def replace(group, name, data, **attributes):
+	"""
+	Replace a group variable with an in memory copy holding data, with any attributes given changed
+	"""
+
+	variable = group.variables[name]
+	values = dict(variable.attributes)
+	values.update(attributes)
+
+	group.variables[name] = Variable(variable.name, group=group, dimensions=variable.dimensions, attributes=values, data=data)
+	return group.variables[name]
+
+
+class GroupCachesTest(unittest.TestCase):
+
+	def setUp(self):
+		self.ds = pycdm.open(sample.grid_file(ntimes=8, nlats=4, nlons=5))
+		self.group = self.ds.root
+
+	def test_reuse(self):
+
+		first = pycdm.Field(self.group.variables['pr'])
+		second = pycdm.Field(self.group.variables['pr'])
+
+		self.assertTrue(first.spatial_index() is second.spatial_index())
+		self.assertTrue(first.calendar_index(full=True) is second.calendar_index(full=True))
+		self.assertTrue(first.read_coordinates(first.latitude_variable) is second.read_coordinates(second.latitude_variable))
+		self.assertTrue(first.cell_bounds()[0] is second.cell_bounds()[0])
+		self.assertTrue(first.interpolation_weights([-30.0], [20.0]) is second.interpolation_weights([-30.0], [20.0]))
+
+		self.assertTrue(isinstance(self.group._spatial_indices, LRUCache))
+		self.assertEqual(len(self.group._spatial_indices), 1)
+		self.assertTrue(self.group._spatial_indices.nbytes >= first.spatial_index().points.nbytes)
+
+	def test_spatial_index_budget(self):
+
+		field = pycdm.Field(self.group.variables['pr'])
+		self.group._spatial_indices.max_bytes = 1
+
+		index = field.spatial_index()
+		self.assertEqual(len(self.group._spatial_indices), 0)
+		self.assertEqual(field.reversemap(latitude=-35.0, longitude=15.0)[1:], (slice(0, 1), slice(0, 1)))
+		self.assertEqual(index.shape, (4, 5))
+
+	def test_replaced_coordinates(self):
+
+		field = pycdm.Field(self.group.variables['pr'])
+		old_dates = field.calendar_index().dates
+		old_index = field.spatial_index()
+		old_bounds = field.cell_bounds()[0]
+		field.features()
+		self.assertEqual(self.group.coordinate_type(field.time_variable), 'time')
+
+		latitudes = numpy.linspace(0, 15, 4)
+		replace(self.group, 'lat', latitudes)
+		replace(self.group, 'time', numpy.arange(8) * 24.0, units='hours since 2000-06-01 00:00:00')
+
+		field = pycdm.Field(self.group.variables['pr'])
+
+		self.assertTrue((field.read_coordinates(field.latitude_variable) == latitudes).all())
+		self.assertFalse(field.spatial_index() is old_index)
+		self.assertTrue((field.cell_bounds()[0][1:-1,0] == [2.5, 7.5, 12.5]).all())
+		self.assertFalse(field.cell_bounds()[0] is old_bounds)
+
+		dates = field.calendar_index().dates
+		self.assertEqual((old_dates[1].month, dates[1].month, dates[1].day), (1, 6, 2))
+
+	def test_replaced_coordinate_type(self):
+
+		self.assertEqual(self.group.coordinate_type(self.group.variables['lon']), 'longitude')
+
+		# The new longitude units no longer classify it as a longitude
+		replace(self.group, 'lon', numpy.linspace(15, 35, 5), units='m')
+
+		self.assertEqual(self.group.coordinate_type(self.group.variables['lon']), None)
+		self.assertEqual(pycdm.Field(self.group.variables['pr']).longitude_variable, None)
+
+	def test_replaced_variable(self):
+
+		before = self.group.variable_fields['pr'].features(propnames=['value'])
+		self.assertTrue(self.group.variable_fields['pr'].features(propnames=['value']) is before)
+
+		replace(self.group, 'pr', numpy.ma.ones((8, 4, 5)))
+		after = self.group.variable_fields['pr'].features(propnames=['value'])
+
+		self.assertFalse(after is before)
+		self.assertEqual(set([feature['properties']['value'] for feature in after['features']]), set([1.0]))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+
+import numpy
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import pycdm
+from pycdm.spatialfunctions import bilinear_curvilinear, nearest_brute_force, SpatialIndex
+
+import sample
+
+
+def expected(lats, lons, step):
+	"""
+	Bilinear interpolation of the sample global field, linear in latitude and linear in longitude between grid columns
+	"""
+	
+	lons = numpy.mod(lons, 360.0)
+	west = numpy.floor(lons / step) * step
+	fraction = (lons - west) / step
+	
+	return lats + 10 * ((1 - fraction) * numpy.sin(numpy.radians(west)) + fraction * numpy.sin(numpy.radians(west + step)))
+
+
+class InterpolationTest(unittest.TestCase):
+	
+	def test_wrap(self):
+		
+		for west in [0.0, -180.0]:
+			ds = pycdm.open(sample.global_file(west=west))
+			field = pycdm.Field(ds.root.variables['tas'])
+			step = 360.0 / 144
+			
+			lats = numpy.array([10.0, -45.0, 0.0, 30.0, 60.0])
+			lons = numpy.array([358.75, -1.0, 179.0, 181.5, 1.0])
+			
+			result = field.extract_points(lats, lons)
+			
+			self.assertFalse(numpy.ma.getmaskarray(result).any(), west)
+			self.assertTrue(numpy.allclose(result, expected(lats, lons, step)), (west, result, expected(lats, lons, step)))
+	
+	def test_curvilinear_dateline(self):
+		
+		# A small rotated grid with -180/180 longitudes crossing the dateline
+		ys, xs = numpy.meshgrid(numpy.arange(6.0), numpy.arange(8.0), indexing='ij')
+		latitudes = -10 + 2 * ys + 0.1 * xs
+		longitudes = 172 + 2 * xs + 0.1 * ys
+		longitudes = numpy.where(longitudes > 180, longitudes - 360, longitudes)
+		
+		targets_lat = numpy.array([-5.0, -2.0])
+		targets_lon = numpy.array([179.5, -179.0])
+		
+		weights = bilinear_curvilinear(latitudes, longitudes, SpatialIndex(latitudes, longitudes), targets_lat, targets_lon)
+		
+		self.assertTrue((weights.weights.sum(axis=1) > 0.999).all())
+		unwrapped = numpy.where(longitudes < 0, longitudes + 360, longitudes)
+		self.assertTrue(numpy.allclose(weights.apply(unwrapped), numpy.mod(targets_lon, 360)))
+		self.assertTrue(numpy.allclose(weights.apply(latitudes), targets_lat))
+	
+	def test_weights_cache_budget(self):
+		
+		ds = pycdm.open(sample.global_file())
+		field = pycdm.Field(ds.root.variables['tas'])
+		cache = field.group._interpolation_weights
+		
+		size = field.interpolation_weights(numpy.zeros(100), numpy.arange(100.0)).nbytes
+		cache.max_bytes = 3 * size
+		
+		for offset in range(10):
+			field.interpolation_weights(numpy.zeros(100) + offset, numpy.arange(100.0))
+			self.assertTrue(cache.nbytes <= cache.max_bytes)
+		
+		self.assertEqual(len(cache), 3)
+	
+	def test_fewer_points_than_neighbours(self):
+		
+		ds = pycdm.open(sample.station_file())
+		field = pycdm.Field(ds.root.variables['tas'])
+		
+		result = field.extract_points([-25.0, -21.0], [25.0, 29.0], method='idw', neighbours=4)
+		
+		self.assertEqual(result.shape, (4, 2))
+		self.assertTrue(numpy.allclose(result[:,0], ds.root.variables['tas'][:][:,1]))
+		self.assertTrue(((result[:,1] > result[:,0]) & (result[:,1] < ds.root.variables['tas'][:][:,2])).all())
+	
+	def test_missing_neighbours(self):
+		
+		latitudes, longitudes = numpy.array([0.0, 1.0, 2.0]), numpy.array([0.0, 0.0, 0.0])
+		
+		for greatcircle in [False, True]:
+			index = SpatialIndex(latitudes, longitudes, greatcircle=greatcircle)
+			brute = SpatialIndex(latitudes, longitudes, greatcircle=greatcircle)
+			brute._tree = None
+			
+			for search in [index, brute]:
+				(rows,), distances = search.query(numpy.array([0.1, 1.8]), numpy.array([0.0, 0.0]), k=5)
+				self.assertEqual(distances.shape, (2, 5))
+				self.assertEqual(rows[0,:3].tolist(), [0, 1, 2])
+				self.assertEqual(rows[1,:3].tolist(), [2, 1, 0])
+				self.assertTrue(numpy.isinf(distances[:,3:]).all())
+				self.assertTrue(numpy.isfinite(distances[:,:3]).all())
+		
+		nearest, distances = nearest_brute_force(numpy.array([[0.0, 0.0], [3.0, 4.0]]), numpy.array([[0.0, 0.0]]), k=3)
+		self.assertEqual(nearest.tolist(), [[0, 1, 2]])
+		self.assertEqual(distances.tolist(), [[0.0, 5.0, numpy.inf]])
+
+
+if __name__ == '__main__':
+	unittest.main()
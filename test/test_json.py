@@ -0,0 +1,47 @@
+import json
+import unittest
+
+import numpy
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import pycdm
+
+import sample
+
+
+class IterJSONTest(unittest.TestCase):
+	
+	@classmethod
+	def setUpClass(cls):
+		cls.ds = pycdm.open(sample.grid_file())
+		cls.field = pycdm.Field(cls.ds.root.variables['pr']).view[0:2, 0:4, 0:5]
+	
+	def test_matches_json_dumps(self):
+		
+		text = ''.join(self.field.iterjson(propnames=['first', 'second']))
+		expected = json.dumps(self.field.features(propnames=['first', 'second']))
+		
+		self.assertEqual(json.loads(text), json.loads(expected))
+	
+	def test_non_finite_coordinates(self):
+		
+		# Curvilinear grids often have missing corners on their edges
+		corner_lats, corner_lons = self.field.cell_bounds()
+		corner_lats, corner_lons = corner_lats.copy(), corner_lons.copy()
+		corner_lats[0, 0] = numpy.nan
+		corner_lons[-1, -1] = numpy.inf
+		
+		field = self.field.view[...]
+		field.cell_bounds = lambda: (corner_lats, corner_lons)
+		
+		text = ''.join(field.iterjson())
+		self.assertFalse('nan' in text or 'inf' in text)
+		
+		features = json.loads(text)['features']
+		self.assertTrue(numpy.isnan(features[0]['geometry']['coordinates'][0][0][1]))
+		self.assertEqual(features[-1]['geometry']['coordinates'][0][2][0], numpy.inf)
+
+
+if __name__ == '__main__':
+	unittest.main()
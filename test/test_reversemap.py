@@ -0,0 +1,137 @@
+import unittest
+import datetime
+
+import numpy
+import netCDF4
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import pycdm
+from pycdm.spatialfunctions import nearest_brute_force, EARTH_RADIUS
+
+import sample
+
+
+def greatcircle(latitudes, longitudes, latitude, longitude):
+	"""
+	Haversine distances in kilometres from each of latitudes and longitudes to a single point
+	"""
+
+	latitudes, longitudes = numpy.radians(latitudes), numpy.radians(longitudes)
+	latitude, longitude = numpy.radians(latitude), numpy.radians(longitude)
+
+	a = numpy.sin((latitudes - latitude) / 2)**2 + numpy.cos(latitudes) * numpy.cos(latitude) * numpy.sin((longitudes - longitude) / 2)**2
+	return 2 * EARTH_RADIUS * numpy.arcsin(numpy.sqrt(a))
+
+
+class ReversemapTest(unittest.TestCase):
+
+	def test_curvilinear(self):
+
+		ds = pycdm.open(sample.rotated_pole_file(nrlats=30, nrlons=40))
+		field = pycdm.Field(ds.root.variables['tas'])
+
+		latitudes = ds.root.variables['lat'][:]
+		longitudes = ds.root.variables['lon'][:]
+
+		random = numpy.random.RandomState(1)
+		targets_lat = random.uniform(latitudes.min(), latitudes.max(), 500)
+		targets_lon = random.uniform(longitudes.min(), longitudes.max(), 500)
+
+		flat, distances = nearest_brute_force(numpy.column_stack((latitudes.ravel(), longitudes.ravel())), numpy.column_stack((targets_lat, targets_lon)))
+		rows, columns = numpy.unravel_index(flat, latitudes.shape)
+
+		indices = field.reversemap_batch(latitude=targets_lat, longitude=targets_lon)
+		self.assertTrue(numpy.ma.getmaskarray(indices[:,0]).all())
+		self.assertEqual(indices[:,1].tolist(), rows.tolist())
+		self.assertEqual(indices[:,2].tolist(), columns.tolist())
+
+		# The brute force fallback without scipy gives the same result
+		field.spatial_index()._tree = None
+		indices = field.reversemap_batch(latitude=targets_lat, longitude=targets_lon)
+		self.assertEqual(indices[:,1].tolist(), rows.tolist())
+		self.assertEqual(indices[:,2].tolist(), columns.tolist())
+
+		self.assertEqual(field.reversemap(latitude=targets_lat[0], longitude=targets_lon[0]), (slice(None), slice(rows[0], rows[0]+1), slice(columns[0], columns[0]+1)))
+
+	def test_decreasing(self):
+
+		ds = pycdm.open(sample.pressure_file(nlevels=6))
+		field = pycdm.Field(ds.root.variables['ta'])
+		levels = ds.root.variables['plev'][:]
+
+		# Includes values beyond either end and midway between levels
+		targets = numpy.concatenate(([110000.0, 10000.0], levels, (levels[1:] + levels[:-1]) / 2, numpy.linspace(5000, 120000, 50)))
+		expected = numpy.abs(levels[numpy.newaxis,:] - targets[:,numpy.newaxis]).argmin(axis=1)
+
+		indices = field.reversemap_batch(level=targets)
+		self.assertEqual(indices[:,1].tolist(), expected.tolist())
+		self.assertTrue(numpy.ma.getmaskarray(indices[:,[0, 2, 3]]).all())
+
+	def test_min_distance(self):
+
+		ds = pycdm.open(sample.grid_file(ntimes=8))
+		field = pycdm.Field(ds.root.variables['pr'])
+		latitudes = ds.root.variables['lat'][:].astype(numpy.float64)
+
+		step = latitudes[1] - latitudes[0]
+		self.assertEqual(field.reversemap(latitude=latitudes[3] + 0.4 * step, min_distance=0.5 * step)[1], slice(3, 4))
+		self.assertEqual(field.reversemap(latitude=latitudes[3] + 0.4 * step, min_distance=0.3 * step)[1], slice(-1, -1))
+		self.assertEqual(field.reversemap(latitude=-50.0)[1], slice(0, 1))
+		self.assertEqual(field.reversemap(latitude=-50.0, min_distance=1.0)[1], slice(-1, -1))
+
+		# min_distance=0 needs an exact match
+		indices = field.reversemap_batch(latitude=[latitudes[3], latitudes[3] + 1e-6, latitudes[0]], min_distance=0)
+		self.assertEqual(indices[:,1].tolist(), [3, -1, 0])
+
+	def test_datetimes(self):
+
+		for calendar in ['standard', '360_day']:
+			ds = pycdm.open(sample.grid_file(ntimes=40, calendar=calendar))
+			field = pycdm.Field(ds.root.variables['pr'])
+			time = ds.root.variables['time']
+
+			dates = netCDF4.num2date(time[:], time.attributes['units'], calendar=calendar)
+			indices = field.reversemap_batch(time=dates[[3, 17, 39]])
+			self.assertEqual(indices[:,0].tolist(), [3, 17, 39])
+
+			# Dates between time steps go to the nearest
+			self.assertEqual(field.reversemap(time=netCDF4.num2date(time[10] + 2.0, time.attributes['units'], calendar=calendar))[0], slice(10, 11))
+			self.assertEqual(field.reversemap(time=netCDF4.num2date(time[10] + 4.0, time.attributes['units'], calendar=calendar))[0], slice(11, 12))
+
+		ds = pycdm.open(sample.grid_file(ntimes=40))
+		field = pycdm.Field(ds.root.variables['pr'])
+		self.assertEqual(field.reversemap(time=datetime.datetime(2012, 1, 2, 6))[0], slice(5, 6))
+
+	def test_greatcircle(self):
+
+		ds = pycdm.open(sample.global_file())
+		field = pycdm.Field(ds.root.variables['tas'])
+
+		latitudes, longitudes = numpy.meshgrid(ds.root.variables['lat'][:], ds.root.variables['lon'][:], indexing='ij')
+
+		# Across the dateline and near the poles
+		targets_lat = numpy.array([0.0, 0.0, 3.0, 84.0, 86.0, -89.0, 89.9, -86.0, 60.0])
+		targets_lon = numpy.array([-179.9, 179.9, -181.0, 100.0, -170.0, 45.0, 200.0, 359.0, -1.2])
+
+		indices = field.reversemap_batch(latitude=targets_lat, longitude=targets_lon, method='greatcircle')
+
+		for point in range(len(targets_lat)):
+			distances = greatcircle(latitudes, longitudes, targets_lat[point], targets_lon[point])
+			found = distances[indices[point,0], indices[point,1]]
+			self.assertTrue(abs(found - distances.min()) < 1e-6, (point, indices[point], found, distances.min()))
+
+		# Planar nearest wrongly picks the far side of the grid for -179.9, great circles find 180
+		self.assertEqual(indices[0,1], 72)
+		self.assertEqual(field.reversemap(latitude=0.0, longitude=-179.9)[1], slice(0, 1))
+		self.assertEqual(field.reversemap(latitude=0.0, longitude=-179.9, method='greatcircle')[1], slice(72, 73))
+
+		# min_distance is in kilometres
+		self.assertEqual(field.reversemap(latitude=2.0, longitude=1.0, method='greatcircle', min_distance=300.0), (slice(9, 10), slice(0, 1)))
+		self.assertEqual(field.reversemap(latitude=2.0, longitude=1.0, method='greatcircle', min_distance=200.0), (slice(-1, -1), slice(-1, -1)))
+
+		self.assertRaises(pycdm.model.error.CDMError, field.reversemap, latitude=5.0, method='greatcircle')
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+
+import numpy
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import pycdm
+from pycdm.slicefunctions import slice_length
+
+import sample
+
+
+class RecordingVariable(object):
+	"""
+	Wraps a variable and records the length of the time dimension of every read
+	"""
+	
+	def __init__(self, variable):
+		self._variable = variable
+		self.reads = []
+	
+	def __getattr__(self, name):
+		return getattr(self._variable, name)
+	
+	def __getitem__(self, key):
+		self.reads.append(slice_length(key[0], self._variable.shape[0]) if isinstance(key[0], slice) else 1)
+		return self._variable[key]
+
+
+class TimeAggregationTest(unittest.TestCase):
+	
+	@classmethod
+	def setUpClass(cls):
+		cls.ds = pycdm.open(sample.grid_file(ntimes=120))
+		cls.field = pycdm.Field(cls.ds.root.variables['pr'])
+	
+	def assertSame(self, a, b):
+		self.assertTrue((numpy.ma.getmaskarray(a) == numpy.ma.getmaskarray(b)).all())
+		self.assertTrue(numpy.allclose(numpy.ma.filled(a, 0), numpy.ma.filled(b, 0), rtol=1e-5, atol=1e-6))
+	
+	def test_long_windows_stay_in_blocks(self):
+		
+		# Daily windows of 6 hourly data are longer than the blocks
+		for statistic in ['sum', 'mean', 'std', 'min', 'max', 'count']:
+			expected, times = self.field.time_aggregation(statistic, start={'hour':0}, length='2 day', mask_less=0.2)
+			
+			view = self.field.view[...]
+			view.variable = RecordingVariable(self.field.variable)
+			result, result_times = view.time_aggregation(statistic, start={'hour':0}, length='2 day', mask_less=0.2, block_size=3)
+			
+			self.assertTrue(max(view.variable.reads) <= 3, statistic)
+			self.assertSame(result, expected)
+			self.assertEqual(list(result_times), list(times))
+	
+	def test_workers(self):
+		
+		# Tiled results are assembled from the same per tile reductions so are exactly the serial results
+		for func in ['mean', numpy.ma.max, ['sum', 'std', 'count']]:
+			expected, times = self.field.time_aggregation(func, start={'hour':0}, length='1 day', block_size=10)
+			
+			for executor in ['process', 'thread']:
+				result, result_times = self.field.time_aggregation(func, start={'hour':0}, length='1 day', block_size=10, workers=2, executor=executor)
+				
+				self.assertEqual(list(result_times), list(times))
+				
+				if isinstance(func, list):
+					pairs = [(result[name], expected[name]) for name in func]
+				else:
+					pairs = [(result, expected)]
+				
+				for a, b in pairs:
+					self.assertTrue((numpy.ma.getmaskarray(a) == numpy.ma.getmaskarray(b)).all(), (func, executor))
+					self.assertTrue((numpy.ma.filled(a, 0) == numpy.ma.filled(b, 0)).all(), (func, executor))
+	
+	def test_executor(self):
+		
+		self.assertRaises(ValueError, self.field.time_aggregation, 'mean', workers=2, executor='threads')
+		self.assertRaises(ValueError, self.field.time_aggregation, 'mean', executor=None)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,173 @@
+import unittest
+
+import numpy
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import pycdm
+from pycdm.model.variable import Variable
+
+import sample
+
+
+class ViewTest(unittest.TestCase):
+
+	def setUp(self):
+		self.ds = pycdm.open(sample.grid_file(ntimes=48, nlats=10, nlons=12))
+		self.field = pycdm.Field(self.ds.root.variables['pr'])
+		self.values = numpy.ma.asarray(self.ds.root.variables['pr'][:])
+
+	def test_shared(self):
+
+		view = self.field.view[4:20, 2:7, 3:9]
+
+		self.assertEqual(view.shape, (16, 5, 6))
+		self.assertTrue(view.parent is self.field)
+		self.assertTrue(view.variable is self.field.variable)
+		self.assertTrue(view.coordinates_mapping is self.field.coordinates_mapping)
+		self.assertEqual(self.field.shape, (48, 10, 12))
+		self.assertTrue((view[:] == self.values[4:20, 2:7, 3:9]).all())
+
+		# Integer indices keep their dimension
+		self.assertEqual(self.field.view[3, :, 5].shape, (1, 10, 1))
+
+	def test_no_copy(self):
+
+		# Views read through to the variable rather than holding a copy of its values
+		group = self.ds.root
+		variable = group.variables['pr']
+		data = numpy.ma.array(self.values, dtype=numpy.float64, copy=True)
+		group.variables['pr'] = Variable(variable.name, group=group, dimensions=variable.dimensions, attributes=dict(variable.attributes), data=data)
+
+		field = pycdm.Field(group.variables['pr'])
+		view = field.view[10:20, 1:4]
+		before = view[0, 0, 0]
+
+		data[10, 1, 0] = before + 100
+		self.assertEqual(view[0, 0, 0], before + 100)
+
+	def test_subset(self):
+
+		latitudes = self.ds.root.variables['lat'][:]
+		view = self.field.subset(latitude=(float(latitudes[2]), float(latitudes[6])))
+
+		self.assertTrue(view.parent is self.field)
+		self.assertEqual(view.shape, (48, 5, 12))
+		self.assertEqual(self.field.shape, (48, 10, 12))
+		self.assertTrue((view[:] == self.values[:, 2:7]).all())
+		self.assertTrue((view.latitudes[:,0] == latitudes[2:7]).all())
+
+		# Subsets of views are views of the view
+		nested = view.subset(longitude=(20.0, 30.0))
+		self.assertTrue(nested.parent is view)
+		self.assertEqual(view.shape, (48, 5, 12))
+
+	def test_view_of_view(self):
+
+		view = self.field.view[5:40:2, 1:9, 2:11].view[1:12:3, ::2, -3]
+		expected = self.values[5:40:2, 1:9, 2:11][1:12:3, ::2, -3:][:, :, 0:1]
+
+		self.assertEqual(view.shape, expected.shape)
+		self.assertTrue((view[:] == expected).all())
+
+		for key in [(slice(None, None, -1), 1, [0]), (numpy.array([0, 3, 2]), slice(1, 3), 0), (Ellipsis, 0), (-1,), (slice(None), [0, 2, 3], [0, 0, 0])]:
+			self.assertTrue((numpy.ma.asarray(view[key]) == expected[key]).all(), key)
+			self.assertEqual(numpy.shape(view[key]), numpy.shape(expected[key]), key)
+
+		self.assertTrue((view.latitudes[:,0] == self.ds.root.variables['lat'][:][1:9][::2]).all())
+
+
+class CellBoundsTest(unittest.TestCase):
+
+	def test_regular(self):
+
+		ds = pycdm.open(sample.grid_file(ntimes=2, nlats=10, nlons=12))
+		field = pycdm.Field(ds.root.variables['pr'])
+
+		latitudes = ds.root.variables['lat'][:].astype(numpy.float64)
+		longitudes = ds.root.variables['lon'][:].astype(numpy.float64)
+		lat_edges = numpy.concatenate(([1.5 * latitudes[0] - 0.5 * latitudes[1]], (latitudes[1:] + latitudes[:-1]) / 2, [1.5 * latitudes[-1] - 0.5 * latitudes[-2]]))
+		lon_edges = numpy.concatenate(([1.5 * longitudes[0] - 0.5 * longitudes[1]], (longitudes[1:] + longitudes[:-1]) / 2, [1.5 * longitudes[-1] - 0.5 * longitudes[-2]]))
+
+		corner_lats, corner_lons = field.cell_bounds()
+		self.assertEqual(corner_lats.shape, (11, 13))
+		self.assertTrue(numpy.allclose(corner_lats, lat_edges[:,numpy.newaxis], atol=1e-4))
+		self.assertTrue(numpy.allclose(corner_lons, lon_edges[numpy.newaxis,:], atol=1e-4))
+		self.assertFalse(corner_lats.flags.writeable)
+
+		# Views get the bounds of their subset
+		corner_lats, corner_lons = field.view[:, 2:5, 3:7].cell_bounds()
+		self.assertTrue(numpy.allclose(corner_lats, lat_edges[2:6,numpy.newaxis], atol=1e-4))
+		self.assertTrue(numpy.allclose(corner_lons, lon_edges[numpy.newaxis,3:8], atol=1e-4))
+
+	def test_curvilinear(self):
+
+		ds = pycdm.open(sample.rotated_pole_file(nrlats=5, nrlons=6))
+		field = pycdm.Field(ds.root.variables['tas'])
+
+		# The sample latitudes and longitudes are linear in the rotated coordinates so the corners are exact
+		rlat, rlon = ds.root.variables['rlat'][:], ds.root.variables['rlon'][:]
+		rlat_edges = numpy.concatenate(([1.5 * rlat[0] - 0.5 * rlat[1]], (rlat[1:] + rlat[:-1]) / 2, [1.5 * rlat[-1] - 0.5 * rlat[-2]]))
+		rlon_edges = numpy.concatenate(([1.5 * rlon[0] - 0.5 * rlon[1]], (rlon[1:] + rlon[:-1]) / 2, [1.5 * rlon[-1] - 0.5 * rlon[-2]]))
+		ys, xs = numpy.meshgrid(rlat_edges, rlon_edges, indexing='ij')
+
+		corner_lats, corner_lons = field.cell_bounds()
+		self.assertEqual(corner_lats.shape, (6, 7))
+		self.assertTrue(numpy.allclose(corner_lats, 50 + ys + 0.1 * xs))
+		self.assertTrue(numpy.allclose(corner_lons, 10 + xs - 0.1 * ys))
+
+		corner_lats, corner_lons = field.view[:, 1:4, 2:5].cell_bounds()
+		self.assertTrue(numpy.allclose(corner_lats, (50 + ys + 0.1 * xs)[1:5, 2:6]))
+		self.assertTrue(numpy.allclose(corner_lons, (10 + xs - 0.1 * ys)[1:5, 2:6]))
+
+
+class CoordinatesBatchTest(unittest.TestCase):
+
+	def check(self, field, indices):
+
+		batch = field.coordinates_batch(indices)
+
+		for row in range(len(indices)):
+			valid = [index is not numpy.ma.masked and index >= 0 for index in indices[row]]
+			single = field.coordinates(tuple([int(index) if ok else None for index, ok in zip(indices[row], valid)]))
+
+			for coordinate in field.coordinates_mapping:
+				values, units = batch[coordinate]
+				if coordinate in single:
+					self.assertEqual(values[row], single[coordinate][0], (row, coordinate))
+					self.assertEqual(units, single[coordinate][1], (row, coordinate))
+				else:
+					self.assertTrue(values[row] is numpy.ma.masked, (row, coordinate))
+
+	def test_grid(self):
+
+		ds = pycdm.open(sample.grid_file(ntimes=20, calendar='360_day'))
+		field = pycdm.Field(ds.root.variables['pr'])
+
+		random = numpy.random.RandomState(2)
+		indices = numpy.ma.column_stack((random.randint(0, 20, 30), random.randint(0, 10, 30), random.randint(0, 12, 30)))
+		indices[3, 0] = -1
+		indices[5, 1] = numpy.ma.masked
+		indices[7] = numpy.ma.masked
+
+		self.check(field, indices)
+
+		# Reverse mapped indices map back onto the coordinates
+		latitudes = ds.root.variables['lat'][:]
+		found = field.coordinates_batch(field.reversemap_batch(latitude=latitudes[[1, 4]], longitude=20.0))
+		self.assertEqual(found['latitude'][0].tolist(), latitudes[[1, 4]].tolist())
+		self.assertTrue(found['time'][0].mask.all())
+
+	def test_curvilinear(self):
+
+		ds = pycdm.open(sample.rotated_pole_file(nrlats=5, nrlons=6))
+		field = pycdm.Field(ds.root.variables['tas'])
+
+		indices = numpy.ma.array([[0, 1, 2], [2, 4, 5], [1, -1, 3], [1, 2, 0]])
+		indices[3, 2] = numpy.ma.masked
+
+		self.check(field, indices)
+
+
+if __name__ == '__main__':
+	unittest.main()